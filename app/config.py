@@ -63,6 +63,36 @@ AUTO_RUN_SEEDS = os.environ.get("AUTO_RUN_SEEDS", "false").lower() == "true"
 UPLOAD_DIR = "uploads"
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 
+# Storage das fotos: "local" (pasta uploads/) ou "s3" (bucket S3/compatível)
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "local").lower()
+S3_BUCKET = os.environ.get("S3_BUCKET", "")
+S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL") or None  # ex: http://minio:9000
+S3_REGION = os.environ.get("S3_REGION") or None
+S3_ACCESS_KEY_ID = os.environ.get("S3_ACCESS_KEY_ID") or None
+S3_SECRET_ACCESS_KEY = os.environ.get("S3_SECRET_ACCESS_KEY") or None
+S3_PUBLIC_URL = os.environ.get("S3_PUBLIC_URL") or None  # CDN/bucket público; vazio = URLs assinadas
+S3_URL_EXPIRES = int(os.environ.get("S3_URL_EXPIRES", "3600"))
+
+STORAGE_BACKENDS = ("local", "s3")
+if STORAGE_BACKEND not in STORAGE_BACKENDS:
+    raise ValueError(f"STORAGE_BACKEND must be one of {', '.join(STORAGE_BACKENDS)} (got {STORAGE_BACKEND!r})")
+if STORAGE_BACKEND == "s3" and not S3_BUCKET:
+    raise ValueError("S3_BUCKET must be set when STORAGE_BACKEND=s3")
+
+# Prefixo interno do nginx para entregar /uploads via X-Accel-Redirect (vazio = a aplicação envia o arquivo)
+UPLOADS_ACCEL_REDIRECT_PREFIX = os.environ.get("UPLOADS_ACCEL_REDIRECT_PREFIX", "")
+
+# Variantes sob demanda (/img/{pet_id}/{largura}x{altura}.{formato}) e cache em disco (LRU)
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", ".cache/images")
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_MB", "512")) * 1024 * 1024
+IMAGE_VARIANT_SIZES = {
+    tuple(int(side) for side in size.split("x"))
+    for size in os.environ.get(
+        "IMAGE_VARIANT_SIZES", "80x80,96x96,120x120,160x160,192x192,240x240,300x300,640x640"
+    ).split(",")
+    if size.strip()
+}
+
 # Request timeout
 REQUEST_TIMEOUT = 10
 
@@ -72,6 +102,37 @@ GMAIL_PASSWORD = os.environ.get("GMAIL_PASSWORD", "")
 GMAIL_SMTP_SERVER = os.environ.get("GMAIL_SMTP_SERVER", "smtp.gmail.com")
 GMAIL_SMTP_PORT = int(os.environ.get("GMAIL_SMTP_PORT", "587"))
 
+# Reuso de conexões SMTP durante uma execução (limites do provedor)
+SMTP_TIMEOUT = float(os.environ.get("SMTP_TIMEOUT", "30"))
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.environ.get("SMTP_MAX_MESSAGES_PER_CONNECTION", "100"))
+SMTP_RATE_LIMIT = float(os.environ.get("SMTP_RATE_LIMIT", "5"))  # emails por segundo; 0 = sem limite
+
+# Envio concorrente: conexões/envios simultâneos (o tempo máximo é o SMTP_TIMEOUT do socket)
+MAIL_CONCURRENCY = int(os.environ.get("MAIL_CONCURRENCY", "4"))
+
+# Fila durável de emails (email_outbox): lotes, reserva e novas tentativas com backoff
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_LEASE_SECONDS = float(os.environ.get("OUTBOX_LEASE_SECONDS", "600"))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_RETRY_BASE = float(os.environ.get("OUTBOX_RETRY_BASE", "60"))  # segundos
+OUTBOX_RETRY_MAX = float(os.environ.get("OUTBOX_RETRY_MAX", "3600"))  # segundos
+
+# Tasks agendadas: tutores processados por lote (um checkpoint por lote)
+JOB_CHUNK_SIZE = int(os.environ.get("JOB_CHUNK_SIZE", "200"))
+
+# Processamento em vários workers: shards por execução e validade da reserva de cada shard
+JOB_SHARDS = int(os.environ.get("JOB_SHARDS", "1"))
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", "300"))
+
+# Agendador em processo (lifespan): expressões cron de 5 campos, vazio = tarefa desativada
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "false").lower() in ("1", "true", "yes")
+SCHEDULER_DAILY_CRON = os.environ.get("SCHEDULER_DAILY_CRON", "0 8 * * *")
+SCHEDULER_MONTHLY_CRON = os.environ.get("SCHEDULER_MONTHLY_CRON", "0 9 1 * *")
+SCHEDULER_JANITOR_CRON = os.environ.get("SCHEDULER_JANITOR_CRON", "")
+
+# Bytecode compilado dos templates de email (vazio = pasta temporária do sistema)
+EMAIL_TEMPLATE_CACHE_DIR = os.environ.get("EMAIL_TEMPLATE_CACHE_DIR", "")
+
 # Validate Gmail configuration for notifications (only if being used)
 def validate_gmail_config():
     """Valida configuração do Gmail apenas quando necessário"""
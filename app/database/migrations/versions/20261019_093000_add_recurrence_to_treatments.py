@@ -0,0 +1,37 @@
+"""Add recurrence fields to treatments table
+
+Revision ID: 8c1d2e4f6a10
+Revises: 54f43e0efe7b
+Create Date: 2026-10-19 09:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c1d2e4f6a10'
+down_revision: Union[str, None] = '54f43e0efe7b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('treatments', sa.Column('recurrence_rule', sa.String(length=255), nullable=True))
+    op.add_column('treatments', sa.Column('series_id', sa.String(length=36), nullable=True))
+    op.create_foreign_key(
+        'fk_treatments_series_id',
+        'treatments', 'treatments',
+        ['series_id'], ['id'],
+        ondelete='SET NULL'
+    )
+    op.create_index('idx_treatments_series', 'treatments', ['series_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_treatments_series', table_name='treatments')
+    op.drop_constraint('fk_treatments_series_id', 'treatments', type_='foreignkey')
+    op.drop_column('treatments', 'series_id')
+    op.drop_column('treatments', 'recurrence_rule')
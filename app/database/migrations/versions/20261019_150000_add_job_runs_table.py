@@ -0,0 +1,43 @@
+"""Add job_runs table
+
+Revision ID: 5b8e1d4a7c92
+Revises: 3f7a9b2c5d81
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b8e1d4a7c92'
+down_revision: Union[str, None] = '3f7a9b2c5d81'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'job_runs',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('job', sa.String(length=32), nullable=False),
+        sa.Column('run_key', sa.String(length=32), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('cursor', sa.String(length=512), nullable=True),
+        sa.Column('chunks_done', sa.Integer(), nullable=False),
+        sa.Column('stats', sa.JSON(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('job', 'run_key', name='uq_job_runs_job_run_key')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('job_runs')
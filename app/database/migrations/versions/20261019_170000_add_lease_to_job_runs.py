@@ -0,0 +1,28 @@
+"""Add lease columns to job_runs
+
+Revision ID: 8c2f6a1d9e43
+Revises: 5b8e1d4a7c92
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c2f6a1d9e43'
+down_revision: Union[str, None] = '5b8e1d4a7c92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('job_runs', sa.Column('owner', sa.String(length=128), nullable=True))
+    op.add_column('job_runs', sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('job_runs', 'lease_expires_at')
+    op.drop_column('job_runs', 'owner')
@@ -10,6 +10,8 @@ from app.database.models.treatment import Treatment
 from app.database.models.vaccine import Vaccine
 from app.database.models.ectoparasite import Ectoparasite
 from app.database.models.vermifugo import Vermifugo
+from app.database.models.email_outbox import EmailOutbox
+from app.database.models.job_run import JobRun
 
 __all__ = [
     "Base",
@@ -20,5 +22,7 @@ __all__ = [
     "Vaccine",
     "Ectoparasite",
     "Vermifugo",
+    "EmailOutbox",
+    "JobRun",
 ]
 
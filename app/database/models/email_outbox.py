@@ -0,0 +1,71 @@
+"""
+Model EmailOutbox - Fila durável de emails de notificação
+"""
+
+from datetime import date, datetime
+from sqlalchemy import String, Text, Integer, Date, DateTime, Index, UniqueConstraint, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database.base import Base, TimestampMixin
+
+# Status de um email na fila
+OUTBOX_PENDING = "pending"
+OUTBOX_SENDING = "sending"
+OUTBOX_SENT = "sent"
+OUTBOX_FAILED = "failed"
+
+
+class EmailOutbox(Base, TimestampMixin):
+    """
+    Email já renderizado aguardando envio.
+    A chave (kind, recipient, reference_date, pet_set) torna o enfileiramento
+    idempotente: reexecutar um job não duplica emails.
+    """
+    __tablename__ = "email_outbox"
+    
+    # Primary Key
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    
+    # Chave de idempotência
+    kind: Mapped[str] = mapped_column(String(32), nullable=False)  # daily_reminder, monthly_report
+    recipient: Mapped[str] = mapped_column(String(255), nullable=False)
+    reference_date: Mapped[date] = mapped_column(Date, nullable=False)
+    pet_set: Mapped[str] = mapped_column(String(64), nullable=False)  # sha256 dos IDs dos pets
+    
+    # Conteúdo renderizado no enfileiramento
+    subject: Mapped[str] = mapped_column(String(255), nullable=False)
+    html_body: Mapped[str] = mapped_column(Text, nullable=False)
+    
+    # Entrega
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default=OUTBOX_PENDING)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False
+    )
+    locked_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    sent_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    
+    # Constraints
+    __table_args__ = (
+        UniqueConstraint('kind', 'recipient', 'reference_date', 'pet_set', name='uq_email_outbox_key'),
+        Index('idx_email_outbox_due', 'status', 'next_attempt_at'),
+    )
+    
+    def to_dict(self) -> dict:
+        """Converte o model para dicionário"""
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "recipient": self.recipient,
+            "reference_date": self.reference_date,
+            "subject": self.subject,
+            "html_body": self.html_body,
+            "status": self.status,
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+        }
+    
+    def __repr__(self) -> str:
+        return f"<EmailOutbox(id={self.id}, kind={self.kind}, recipient={self.recipient}, status={self.status})>"
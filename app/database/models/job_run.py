@@ -0,0 +1,72 @@
+"""
+Model JobRun - Execuções das tasks agendadas (checkpoints)
+"""
+
+from datetime import datetime
+from sqlalchemy import String, Text, Integer, DateTime, JSON, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database.base import Base, TimestampMixin
+
+# Status de uma execução
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+class JobRun(Base, TimestampMixin):
+    """
+    Uma execução de task (ex: lembretes do dia 20/10), ou um shard dela.
+    O cursor guarda o último tutor já enfileirado, para retomar após uma falha.
+    O owner e a validade da reserva (lease) impedem que dois workers processem
+    a mesma execução ao mesmo tempo.
+    """
+    __tablename__ = "job_runs"
+    
+    # Primary Key
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    
+    # Identificação: task + chave da execução (data ou mês de referência)
+    job: Mapped[str] = mapped_column(String(32), nullable=False)
+    run_key: Mapped[str] = mapped_column(String(32), nullable=False)
+    
+    # Progresso
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default=JOB_RUNNING)
+    cursor: Mapped[str | None] = mapped_column(String(512), nullable=True)
+    chunks_done: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    stats: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    
+    # Reserva do worker que está processando
+    owner: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    
+    started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    
+    # Constraints
+    __table_args__ = (
+        UniqueConstraint('job', 'run_key', name='uq_job_runs_job_run_key'),
+    )
+    
+    def to_dict(self) -> dict:
+        """Converte o model para dicionário"""
+        return {
+            "id": self.id,
+            "job": self.job,
+            "run_key": self.run_key,
+            "status": self.status,
+            "cursor": self.cursor,
+            "chunks_done": self.chunks_done,
+            "stats": dict(self.stats or {}),
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "owner": self.owner,
+            "lease_expires_at": self.lease_expires_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+    
+    def __repr__(self) -> str:
+        return f"<JobRun(id={self.id}, job={self.job}, run_key={self.run_key}, status={self.status})>"
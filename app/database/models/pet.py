@@ -2,10 +2,12 @@
 Model Pet - Representa os pets do sistema
 """
 
+from datetime import date, timedelta
 from sqlalchemy import String, Index, CheckConstraint, JSON
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from typing import Optional, Dict, Any
 from app.database.base import Base, TimestampMixin, SoftDeleteMixin
+from app.database.models.treatment import expand_treatments, RECURRENCE_HORIZON_DAYS
 
 
 class Pet(Base, TimestampMixin, SoftDeleteMixin):
@@ -23,7 +25,7 @@ class Pet(Base, TimestampMixin, SoftDeleteMixin):
     pet_type: Mapped[str] = mapped_column(String(10), nullable=False, index=True)  # 'cat' ou 'dog'
     gender: Mapped[str | None] = mapped_column(String(10), nullable=True)  # 'male' ou 'female'
     
-    # Photo - JSON com original, thumbnail e filename
+    # Photo - JSON com original, thumbnail, filename, dimensões e variantes ({formato: {largura: arquivo}})
     photo: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSON, nullable=True)
     
     # Relationships
@@ -70,10 +72,13 @@ class Pet(Base, TimestampMixin, SoftDeleteMixin):
         }
         
         if include_treatments:
-            result["treatments"] = [
-                treatment.to_dict() for treatment in self.treatments
-                if not treatment.deleted_at
-            ]
+            # Séries recorrentes viram ocorrências até o horizonte padrão
+            # (das passadas, só a última perdida)
+            today = date.today()
+            horizon = today + timedelta(days=RECURRENCE_HORIZON_DAYS)
+            result["treatments"] = expand_treatments(
+                self.treatments, None, horizon, missed_until=today - timedelta(days=1)
+            )
         
         return result
     
@@ -2,10 +2,40 @@
 Model Treatment - Representa tratamentos dos pets
 """
 
+from collections import deque
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+from dateutil.rrule import rrulestr
 from sqlalchemy import String, Boolean, ForeignKey, Index, CheckConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.database.base import Base, TimestampMixin, SoftDeleteMixin
 
+# Separador do ID de ocorrência virtual: "{series_id}@{YYYY-MM-DD}"
+OCCURRENCE_SEPARATOR = "@"
+
+# Janela futura padrão para expandir recorrências (perfil e dashboard)
+RECURRENCE_HORIZON_DAYS = 90
+
+# Limite de segurança de ocorrências geradas por série em uma janela
+MAX_OCCURRENCES_PER_WINDOW = 500
+
+# Ocorrências passadas não materializadas mantidas por série em janelas sem início
+# (perfil e expirados do relatório): só as mais recentes, não todas desde o DTSTART
+MAX_MISSED_OCCURRENCES = 1
+
+
+def make_occurrence_id(series_id: str, occurrence_date: str) -> str:
+    """Monta o ID de uma ocorrência virtual de uma série recorrente"""
+    return f"{series_id}{OCCURRENCE_SEPARATOR}{occurrence_date}"
+
+
+def parse_occurrence_id(treatment_id: str) -> Optional[tuple]:
+    """Retorna (series_id, data) se o ID for de uma ocorrência virtual"""
+    if OCCURRENCE_SEPARATOR not in treatment_id:
+        return None
+    series_id, occurrence_date = treatment_id.split(OCCURRENCE_SEPARATOR, 1)
+    return series_id, occurrence_date
+
 
 class Treatment(Base, TimestampMixin, SoftDeleteMixin):
     __tablename__ = "treatments"
@@ -30,6 +60,16 @@ class Treatment(Base, TimestampMixin, SoftDeleteMixin):
     time: Mapped[str | None] = mapped_column(String(5), nullable=True)  # HH:MM
     done: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     
+    # Recorrência (RRULE, ex: "FREQ=MONTHLY;COUNT=12"). `date` é o DTSTART da série.
+    recurrence_rule: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    
+    # Ocorrência materializada: aponta para a série que a originou
+    series_id: Mapped[str | None] = mapped_column(
+        String(36),
+        ForeignKey("treatments.id", ondelete="SET NULL"),
+        nullable=True
+    )
+    
     # Applier
     applier_type: Mapped[str] = mapped_column(String(50), nullable=False)  # Veterinarian, Tutor
     applier_name: Mapped[str | None] = mapped_column(String(255), nullable=True)
@@ -61,8 +101,64 @@ class Treatment(Base, TimestampMixin, SoftDeleteMixin):
         Index('idx_treatments_date', 'date'),
         Index('idx_treatments_pending', 'pet_id', 'done', 'date'),
         Index('idx_treatments_category', 'category'),
+        Index('idx_treatments_series', 'series_id'),
     )
     
+    @property
+    def is_recurring(self) -> bool:
+        return bool(self.recurrence_rule)
+    
+    def occurrence_dates(
+        self,
+        window_start: Optional[date],
+        window_end: date,
+        exclude: Iterable[str] = (),
+        missed_until: Optional[date] = None
+    ) -> List[str]:
+        """
+        Gera as datas (YYYY-MM-DD) da série dentro da janela [window_start, window_end].
+        Datas em `exclude` (ocorrências já materializadas) são ignoradas.
+        Sem `window_start`, das ocorrências até `missed_until` (padrão: `window_end`)
+        ficam só as MAX_MISSED_OCCURRENCES mais recentes; as materializadas contam
+        nesse limite, então uma ocorrência posterior já tratada encerra as anteriores.
+        """
+        if not self.is_recurring:
+            return []
+        
+        dtstart = datetime.strptime(self.date, "%Y-%m-%d")
+        start = datetime.combine(window_start, datetime.min.time()) if window_start else dtstart
+        end = datetime.combine(window_end, datetime.min.time())
+        if end < dtstart:
+            return []
+        
+        rule = rrulestr(self.recurrence_rule, dtstart=dtstart)
+        excluded = set(exclude)
+        missed_end = datetime.combine(missed_until or window_end, datetime.min.time()) if window_start is None else None
+        missed: deque = deque(maxlen=MAX_MISSED_OCCURRENCES)
+        
+        dates = []
+        for occurrence in rule.xafter(max(start, dtstart) - timedelta(seconds=1), inc=False):
+            if occurrence > end or len(dates) >= MAX_OCCURRENCES_PER_WINDOW:
+                break
+            occurrence_str = occurrence.strftime("%Y-%m-%d")
+            if missed_end is not None and occurrence <= missed_end:
+                missed.append(occurrence_str)
+            elif occurrence_str not in excluded:
+                dates.append(occurrence_str)
+        return [day for day in missed if day not in excluded] + dates
+    
+    def occurrence_to_dict(self, occurrence_date: str) -> dict:
+        """Converte uma ocorrência virtual da série para dicionário"""
+        data = self.to_dict()
+        data.update({
+            "_id": make_occurrence_id(self.id, occurrence_date),
+            "date": occurrence_date,
+            "done": False,
+            "series_id": self.id,
+            "is_occurrence": True,
+        })
+        return data
+    
     def to_dict(self) -> dict:
         """Converte o model para dicionário (compatível com código legado)"""
         return {
@@ -76,8 +172,58 @@ class Treatment(Base, TimestampMixin, SoftDeleteMixin):
             "applier_type": self.applier_type,
             "applier_name": self.applier_name,
             "applier_id": self.applier_id,
+            "recurrence_rule": self.recurrence_rule,
+            "series_id": self.series_id,
         }
     
     def __repr__(self) -> str:
         return f"<Treatment(id={self.id}, pet_id={self.pet_id}, name='{self.name}')>"
 
+
+def expand_treatments(
+    treatments: Iterable["Treatment"],
+    window_start: Optional[date],
+    window_end: date,
+    pending_only: bool = False,
+    missed_until: Optional[date] = None
+) -> List[Dict[str, Any]]:
+    """
+    Expande as séries recorrentes de um pet em ocorrências virtuais dentro da janela
+    (sem início, só as últimas ocorrências perdidas até `missed_until`).
+    Tratamentos simples são filtrados pela mesma janela apenas quando `pending_only`
+    for True (consultas de notificação); caso contrário são mantidos integralmente.
+    Ocorrências materializadas (inclusive removidas) substituem a ocorrência virtual.
+    """
+    treatments = list(treatments)
+    materialized: Dict[str, set] = {}
+    for treatment in treatments:
+        if treatment.series_id:
+            materialized.setdefault(treatment.series_id, set()).add(treatment.date)
+    
+    start_str = window_start.strftime("%Y-%m-%d") if window_start else None
+    end_str = window_end.strftime("%Y-%m-%d")
+    
+    results = []
+    for treatment in treatments:
+        if treatment.deleted_at:
+            continue
+        
+        if treatment.is_recurring:
+            # Série marcada como concluída não gera novas ocorrências
+            if treatment.done:
+                continue
+            for occurrence_date in treatment.occurrence_dates(
+                window_start, window_end, materialized.get(treatment.id, ()), missed_until
+            ):
+                results.append(treatment.occurrence_to_dict(occurrence_date))
+            continue
+        
+        if pending_only:
+            if treatment.done or treatment.date > end_str:
+                continue
+            if start_str and treatment.date < start_str:
+                continue
+        
+        results.append(treatment.to_dict())
+    
+    return results
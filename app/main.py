@@ -9,8 +9,13 @@ from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.responses import RedirectResponse, JSONResponse
-from .config import SESSION_SECRET_KEY, IS_PRODUCTION, FRONTEND_URL
-from .services import FileService
+from .config import SESSION_SECRET_KEY, IS_PRODUCTION, FRONTEND_URL, UPLOADS_ACCEL_REDIRECT_PREFIX
+from .services.upload_serving import UploadsStaticFiles
+from .services.upload_limit import UploadLimitMiddleware
+from .services.image_executor import image_executor
+from .services.upload_janitor import upload_janitor
+from .services.scheduler import scheduler
+from .services.variant_cache import variant_cache
 from .routes import (
     auth_router,
     dashboard_router,
@@ -19,6 +24,8 @@ from .routes import (
     treatment_router,
     info_router,
     vet_router,
+    export_router,
+    image_router,
 )
 
 
@@ -34,12 +41,23 @@ async def lifespan(app: FastAPI):
     # Inicializa o banco de dados (cria tabelas se necessário)
     await init_db()
     
-    # Limpeza de arquivos temporários na inicialização
-    FileService.cleanup_temp_images()
+    # Pool de processos para decodificação e redimensionamento de imagens
+    image_executor.start()
+    
+    # Tarefas agendadas (lembretes, relatórios e limpeza) reaproveitando o engine
+    scheduler.start()
+    
+    # Limpeza periódica de uploads órfãos e temporários (em segundo plano),
+    # a menos que o agendador já cuide dela
+    if not any(job.name == "upload_janitor" for job in scheduler.jobs):
+        upload_janitor.start()
     
     yield
     
     # Shutdown
+    await scheduler.stop()
+    await upload_janitor.stop()
+    image_executor.shutdown()
     await close_db()
 
 
@@ -90,12 +108,20 @@ def setup_middlewares(app: FastAPI):
         https_only=IS_PRODUCTION,  # True em produção, False em development/testing
     )
 
+    # Limite dos envios multipart aplicado enquanto o corpo chega (antes do parser)
+    app.add_middleware(UploadLimitMiddleware)
+
 
 def setup_static_files(app: FastAPI):
     """Configura arquivos estáticos e templates"""
     # Servindo arquivos estáticos
     app.mount("/static", StaticFiles(directory="static"), name="static")
-    app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+    # Uploads com URLs únicas: cache imutável, ETag e Range (X-Accel-Redirect opcional)
+    app.mount(
+        "/uploads",
+        UploadsStaticFiles(directory="uploads", accel_redirect_prefix=UPLOADS_ACCEL_REDIRECT_PREFIX),
+        name="uploads",
+    )
 
 
 def setup_routes(app: FastAPI):
@@ -119,7 +145,11 @@ def setup_routes(app: FastAPI):
                 "service": "pet-control-api",
                 "timestamp": datetime.now().isoformat(),
                 "version": "2.0.0",
-                "database": "connected"
+                "database": "connected",
+                "image_executor": image_executor.metrics(),
+                "upload_janitor": upload_janitor.metrics(),
+                "scheduler": scheduler.metrics(),
+                "variant_cache": variant_cache.metrics(),
             }
         except Exception as e:
             from datetime import datetime
@@ -141,6 +171,8 @@ def setup_routes(app: FastAPI):
     app.include_router(treatment_router, tags=["Treatments"])
     app.include_router(info_router, tags=["Information"])
     app.include_router(vet_router, tags=["Veterinarian"])
+    app.include_router(export_router, tags=["Export"])
+    app.include_router(image_router, tags=["Images"])
 
 
 def setup_exception_handlers(app: FastAPI):
@@ -6,6 +6,8 @@ from app.repositories.base_repository import BaseRepository
 from app.repositories.user_repository import UserRepository
 from app.repositories.pet_repository import PetRepository
 from app.repositories.info_repository import InfoRepository
+from app.repositories.email_outbox_repository import EmailOutboxRepository
+from app.repositories.job_run_repository import JobRunRepository
 
 # Aliases para compatibilidade
 ProfileRepository = UserRepository
@@ -15,5 +17,7 @@ __all__ = [
     "UserRepository",
     "PetRepository",
     "InfoRepository",
+    "EmailOutboxRepository",
+    "JobRunRepository",
     "ProfileRepository",
 ]
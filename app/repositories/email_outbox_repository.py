@@ -0,0 +1,133 @@
+"""
+Repository para a fila durável de emails (email_outbox)
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional, List
+from sqlalchemy import select, update, func, and_, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.models.email_outbox import (
+    EmailOutbox,
+    OUTBOX_PENDING,
+    OUTBOX_SENDING,
+    OUTBOX_SENT,
+    OUTBOX_FAILED,
+)
+from app.repositories.base_repository import BaseRepository
+
+# Colunas da chave de idempotência (uq_email_outbox_key)
+OUTBOX_KEY_COLUMNS = ["kind", "recipient", "reference_date", "pet_set"]
+
+
+class EmailOutboxRepository(BaseRepository[EmailOutbox]):
+    """Repository para a fila de emails"""
+    
+    def __init__(self, session: AsyncSession):
+        super().__init__(EmailOutbox, session)
+    
+    def _insert(self):
+        """INSERT com suporte a ON CONFLICT do banco em uso"""
+        dialect = self.session.bind.dialect.name if self.session.bind else "postgresql"
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        return insert(EmailOutbox)
+    
+    async def enqueue(self, records: List[Dict[str, Any]]) -> int:
+        """
+        Enfileira emails já renderizados. Registros com a mesma chave
+        (kind, recipient, reference_date, pet_set) são ignorados.
+        Retorna quantos emails novos entraram na fila.
+        """
+        if not records:
+            return 0
+        
+        now = datetime.now(timezone.utc)
+        rows = [
+            {
+                **record,
+                "status": OUTBOX_PENDING,
+                "attempts": 0,
+                "next_attempt_at": now,
+            }
+            for record in records
+        ]
+        
+        statement = self._insert().values(rows).on_conflict_do_nothing(index_elements=OUTBOX_KEY_COLUMNS)
+        result = await self.session.execute(statement)
+        await self.session.flush()
+        return max(result.rowcount or 0, 0)
+    
+    async def claim_batch(
+        self,
+        limit: int,
+        lease_seconds: float,
+        kind: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Reserva até `limit` emails prontos para envio (pendentes com tentativa
+        vencida, ou "sending" cuja reserva expirou porque o envio anterior caiu).
+        As linhas são travadas com SKIP LOCKED para que execuções simultâneas
+        não reservem o mesmo email; cada reserva conta como uma tentativa.
+        """
+        now = datetime.now(timezone.utc)
+        query = (
+            select(EmailOutbox)
+            .where(
+                or_(
+                    and_(EmailOutbox.status == OUTBOX_PENDING, EmailOutbox.next_attempt_at <= now),
+                    and_(
+                        EmailOutbox.status == OUTBOX_SENDING,
+                        EmailOutbox.locked_at < now - timedelta(seconds=lease_seconds),
+                    ),
+                )
+            )
+            .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        if kind:
+            query = query.where(EmailOutbox.kind == kind)
+        
+        result = await self.session.execute(query)
+        entries = list(result.scalars().all())
+        
+        for entry in entries:
+            entry.status = OUTBOX_SENDING
+            entry.locked_at = now
+            entry.attempts += 1
+        await self.session.flush()
+        
+        return [entry.to_dict() for entry in entries]
+    
+    async def mark_sent(self, outbox_id: int) -> None:
+        """Marca o email como enviado"""
+        await self.session.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id == outbox_id)
+            .values(status=OUTBOX_SENT, sent_at=datetime.now(timezone.utc), locked_at=None, last_error=None)
+        )
+    
+    async def mark_failed(self, outbox_id: int, error: str, retry_at: Optional[datetime]) -> None:
+        """
+        Registra a falha de envio. Com `retry_at` o email volta para a fila
+        nesse horário; sem ele, fica como falha definitiva.
+        """
+        values = {"last_error": error, "locked_at": None}
+        if retry_at is None:
+            values["status"] = OUTBOX_FAILED
+        else:
+            values["status"] = OUTBOX_PENDING
+            values["next_attempt_at"] = retry_at
+        
+        await self.session.execute(
+            update(EmailOutbox).where(EmailOutbox.id == outbox_id).values(**values)
+        )
+    
+    async def count_by_status(self, kind: Optional[str] = None) -> Dict[str, int]:
+        """Quantidade de emails na fila por status"""
+        query = select(EmailOutbox.status, func.count()).group_by(EmailOutbox.status)
+        if kind:
+            query = query.where(EmailOutbox.kind == kind)
+        
+        result = await self.session.execute(query)
+        return {status: count for status, count in result.all()}
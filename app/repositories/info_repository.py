@@ -47,6 +47,11 @@ class InfoRepository:
         vaccines = result.scalars().all()
         return [v.to_dict() for v in vaccines]
     
+    async def get_vaccine_by_id(self, vaccine_id: int) -> Optional[Dict[str, Any]]:
+        """Busca vacina por ID"""
+        vaccine = await self.session.get(Vaccine, vaccine_id)
+        return vaccine.to_dict() if vaccine else None
+
     async def get_vaccine_species(self) -> List[str]:
         """Retorna espécies disponíveis para vacinas"""
         query = select(Vaccine.especie_alvo).distinct()
@@ -0,0 +1,135 @@
+"""
+Repository para as execuções das tasks agendadas (job_runs)
+"""
+
+import copy
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional
+from sqlalchemy import select, update, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.models.job_run import JobRun, JOB_PENDING, JOB_RUNNING, JOB_COMPLETED, JOB_FAILED
+from app.repositories.base_repository import BaseRepository
+
+
+class JobRunRepository(BaseRepository[JobRun]):
+    """Repository para execuções de tasks e seus checkpoints"""
+    
+    def __init__(self, session: AsyncSession):
+        super().__init__(JobRun, session)
+    
+    async def get_run(self, job: str, run_key: str) -> Optional[Dict[str, Any]]:
+        """Busca a execução de uma task para a chave informada"""
+        run = await self.find_one(job=job, run_key=run_key)
+        return run.to_dict() if run else None
+    
+    def _insert(self):
+        """INSERT com suporte a ON CONFLICT do banco em uso"""
+        dialect = self.session.bind.dialect.name if self.session.bind else "postgresql"
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        return insert(JobRun)
+    
+    async def claim_run(
+        self,
+        job: str,
+        run_key: str,
+        owner: str,
+        lease_seconds: float,
+        restart: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Reserva a execução para `owner` por `lease_seconds`, criando-a se necessário,
+        e a retoma a partir do último checkpoint. Com `restart`, descarta o
+        checkpoint (e reprocessa mesmo uma execução concluída).
+        A reserva é um UPDATE condicional: só um worker a obtém enquanto ela for
+        válida. Retorna None se a execução já foi concluída ou está reservada
+        por outro worker.
+        """
+        now = datetime.now(timezone.utc)
+        statement = self._insert().values(
+            job=job, run_key=run_key, status=JOB_PENDING, chunks_done=0, stats={}, attempts=0, started_at=now
+        ).on_conflict_do_nothing(index_elements=["job", "run_key"])
+        await self.session.execute(statement)
+        
+        conditions = [
+            JobRun.job == job,
+            JobRun.run_key == run_key,
+            or_(JobRun.owner.is_(None), JobRun.owner == owner, JobRun.lease_expires_at < now),
+        ]
+        values = {
+            "owner": owner,
+            "lease_expires_at": now + timedelta(seconds=lease_seconds),
+            "status": JOB_RUNNING,
+            "attempts": JobRun.attempts + 1,
+            "last_error": None,
+            "finished_at": None,
+        }
+        if restart:
+            values.update(cursor=None, chunks_done=0, stats={}, started_at=now)
+        else:
+            conditions.append(JobRun.status != JOB_COMPLETED)
+        
+        result = await self.session.execute(
+            update(JobRun).where(*conditions).values(**values).execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            return None
+        
+        run = (await self.session.execute(
+            select(JobRun)
+            .where(JobRun.job == job, JobRun.run_key == run_key)
+            .execution_options(populate_existing=True)
+        )).scalar_one()
+        return run.to_dict()
+    
+    async def checkpoint(
+        self,
+        run_id: int,
+        owner: str,
+        cursor: str,
+        stats: Dict[str, Any],
+        lease_seconds: Optional[float] = None
+    ) -> bool:
+        """
+        Registra o último item processado e os totais acumulados, renovando a reserva.
+        Retorna False se `owner` perdeu a reserva (expirou e outro worker a obteve).
+        """
+        values = {
+            "cursor": cursor,
+            "chunks_done": JobRun.chunks_done + 1,
+            # Cópia: os totais continuam sendo alterados pelo chamador
+            "stats": copy.deepcopy(stats),
+        }
+        if lease_seconds is not None:
+            values["lease_expires_at"] = datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)
+        return await self._update_owned(run_id, owner, values)
+    
+    async def finish_run(
+        self,
+        run_id: int,
+        owner: str,
+        stats: Dict[str, Any],
+        error: Optional[str] = None
+    ) -> bool:
+        """
+        Marca a execução como concluída (ou com falha, mantendo o checkpoint) e libera a reserva.
+        Retorna False se `owner` perdeu a reserva.
+        """
+        return await self._update_owned(run_id, owner, {
+            "owner": None,
+            "lease_expires_at": None,
+            "status": JOB_FAILED if error else JOB_COMPLETED,
+            "stats": copy.deepcopy(stats),
+            "last_error": error,
+            "finished_at": datetime.now(timezone.utc),
+        })
+    
+    async def _update_owned(self, run_id: int, owner: str, values: Dict[str, Any]) -> bool:
+        """UPDATE condicional à reserva de `owner`"""
+        result = await self.session.execute(
+            update(JobRun)
+            .where(JobRun.id == run_id, JobRun.owner == owner)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
@@ -3,19 +3,126 @@ Repository para operações com pets usando SQLAlchemy
 """
 
 import uuid
+import hashlib
 import logging
-from typing import Dict, Any, Optional, List
-from datetime import datetime, timedelta
-from sqlalchemy import select, and_
+from typing import AsyncIterator, Dict, Any, Optional, List, Set, Tuple
+from datetime import datetime, date, timedelta
+from sqlalchemy import BigInteger, select, insert, func, and_, or_, cast, literal, text, union_all
+from sqlalchemy.dialects.postgresql import BIT
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from app.database.models.pet import Pet
 from app.database.models.pet_owner import PetOwner
-from app.database.models.treatment import Treatment
+from app.database.models.profile import Profile
+from app.database.models.treatment import Treatment, expand_treatments, parse_occurrence_id
 from app.repositories.base_repository import BaseRepository
 
 logger = logging.getLogger(__name__)
 
+# Colunas do tratamento lidas pelo relatório mensal (suficientes para Treatment.to_dict)
+TREATMENT_REPORT_COLUMNS = (
+    Treatment.id,
+    Treatment.category,
+    Treatment.name,
+    Treatment.description,
+    Treatment.date,
+    Treatment.time,
+    Treatment.done,
+    Treatment.recurrence_rule,
+    Treatment.series_id,
+    Treatment.applier_type,
+    Treatment.applier_name,
+    Treatment.applier_id,
+)
+
+
+def _monthly_report_pet(
+    rows: List[Dict[str, Any]],
+    month_start: date,
+    month_end: date,
+    expired_until: date
+) -> Dict[str, Any]:
+    """Monta os tratamentos do mês e expirados de um pet a partir das suas linhas"""
+    current: List[Dict[str, Any]] = []
+    expired: List[Dict[str, Any]] = []
+    series: List[Treatment] = []
+    materialized: Dict[str, Set[str]] = {}
+    
+    for row in rows:
+        bucket = row["bucket"]
+        if bucket == "materialized":
+            materialized.setdefault(row["treatment_series_id"], set()).add(row["treatment_date"])
+            continue
+        treatment = Treatment(**{column.key: row[f"treatment_{column.key}"] for column in TREATMENT_REPORT_COLUMNS})
+        if bucket == "series":
+            series.append(treatment)
+        elif bucket == "current":
+            current.append(treatment.to_dict())
+        else:
+            expired.append(treatment.to_dict())
+    
+    # Ocorrências virtuais das séries (as materializadas já vieram como tratamentos simples)
+    for treatment in series:
+        exclude = materialized.get(treatment.id, ())
+        current.extend(
+            treatment.occurrence_to_dict(day) for day in treatment.occurrence_dates(month_start, month_end, exclude)
+        )
+        expired.extend(
+            treatment.occurrence_to_dict(day) for day in treatment.occurrence_dates(None, expired_until, exclude)
+        )
+    
+    def by_date(treatment: Dict[str, Any]):
+        return treatment["date"], treatment["time"] or ""
+    
+    return {
+        "pet": {"id": rows[0]["pet_id"], "name": rows[0]["pet_name"], "nickname": rows[0]["pet_nickname"]},
+        "current_month_treatments": sorted(current, key=by_date),
+        "expired_treatments": sorted(expired, key=by_date),
+    }
+
+
+def _monthly_report_group(
+    rows: List[Dict[str, Any]],
+    month_start: date,
+    month_end: date,
+    expired_until: date
+) -> Dict[str, Any]:
+    """Agrupa as linhas de um tutor (ordenadas por pet) no formato do relatório mensal"""
+    first = rows[0]
+    tutor = {"id": first["tutor_id"], "name": first["tutor_name"] or "Usuário", "email": first["tutor_email"]}
+    
+    pets = []
+    start = 0
+    for index in range(1, len(rows) + 1):
+        if index == len(rows) or rows[index]["pet_id"] != rows[start]["pet_id"]:
+            pet = _monthly_report_pet(rows[start:index], month_start, month_end, expired_until)
+            if pet["current_month_treatments"] or pet["expired_treatments"]:
+                pets.append(pet)
+            start = index
+    
+    return {"key": first["tutor_key"], "tutor": tutor, "pets": pets}
+
+
+def photo_lock_key(content_hash: str) -> int:
+    """Chave estável (int64 com sinal) do advisory lock de um objeto de foto"""
+    digest = hashlib.sha256(f"pet_control:photo:{content_hash}".encode()).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+def shard_of(key: str, shards: int) -> int:
+    """Shard de um tutor: hash estável da chave (igual em qualquer processo ou máquina)"""
+    if shards <= 1:
+        return 0
+    # 60 primeiros bits do sha256: cabem em um bigint positivo (mesmo cálculo de shard_of_sql)
+    digest = hashlib.sha256(key.encode()).digest()
+    return (int.from_bytes(digest[:8], "big") >> 4) % shards
+
+
+def shard_of_sql(key: Any, shards: int) -> Any:
+    """shard_of calculado no PostgreSQL"""
+    hex_prefix = func.substr(func.encode(func.sha256(func.convert_to(key, "UTF8")), "hex"), 1, 15)
+    return func.mod(cast(cast(literal("x").concat(hex_prefix), BIT(60)), BigInteger), shards)
+
 
 class PetRepository(BaseRepository[Pet]):
     """Repository para operações com pets"""
@@ -98,9 +205,8 @@ class PetRepository(BaseRepository[Pet]):
         
         pet = Pet(**pet_data)
         self.session.add(pet)
-        await self.session.flush()
         
-        # Adicionar owners
+        # Adicionar owners (pet e owners são gravados no mesmo flush)
         for user_id in users:
             owner = PetOwner(pet_id=pet_id, profile_id=user_id)
             self.session.add(owner)
@@ -172,6 +278,75 @@ class PetRepository(BaseRepository[Pet]):
             logger.error(f"Error soft deleting pet: {e}")
             return False
     
+    async def get_pet_photo(self, pet_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Busca somente a coluna de foto do pet (verificando acesso do usuário)"""
+        query = (
+            select(Pet.photo)
+            .join(PetOwner)
+            .where(
+                Pet.id == pet_id,
+                PetOwner.profile_id == user_id,
+                PetOwner.deleted_at == None,  # noqa: E711
+                Pet.deleted_at == None  # noqa: E711
+            )
+        )
+        
+        result = await self.session.execute(query)
+        return result.scalars().first()
+    
+    async def get_active_pet_photo(self, pet_id: str) -> Optional[Dict[str, Any]]:
+        """Busca a foto de um pet ativo (sem verificação de usuário, como /uploads)"""
+        query = select(Pet.photo).where(Pet.id == pet_id, Pet.deleted_at == None)  # noqa: E711
+        result = await self.session.execute(query)
+        return result.scalars().first()
+    
+    async def get_photo_references(self) -> Tuple[Set[str], Set[str]]:
+        """
+        Fotos em uso por pets ativos.
+        Retorna (hashes dos objetos, caminhos `original` das fotos antigas sem hash).
+        """
+        query = (
+            select(Pet.photo["hash"].as_string(), Pet.photo["original"].as_string())
+            .where(Pet.deleted_at == None)  # noqa: E711
+        )
+        
+        hashes: Set[str] = set()
+        legacy_paths: Set[str] = set()
+        result = await self.session.stream(query.execution_options(yield_per=1000))
+        async for content_hash, original in result:
+            if content_hash:
+                hashes.add(content_hash)
+            elif original:
+                legacy_paths.add(original)
+        return hashes, legacy_paths
+    
+    async def count_photo_references(self, content_hash: str) -> int:
+        """Conta pets (não deletados) cuja foto aponta para o objeto `content_hash`"""
+        query = (
+            select(func.count(Pet.id))
+            .where(
+                Pet.photo["hash"].as_string() == content_hash,
+                Pet.deleted_at == None  # noqa: E711
+            )
+        )
+        
+        result = await self.session.execute(query)
+        return result.scalar_one()
+    
+    async def lock_photo_object(self, content_hash: str, shared: bool = False) -> None:
+        """
+        Advisory lock do objeto de foto `content_hash` até o fim da transação.
+        Uploads que reaproveitam (ou publicam) o objeto usam o lock compartilhado
+        até gravar o pet; a liberação usa o exclusivo em volta de contar as
+        referências e remover o objeto. Só no PostgreSQL: em outros bancos
+        (SQLite em desenvolvimento/testes, um processo) não há lock.
+        """
+        dialect = self.session.bind.dialect.name if self.session.bind else "postgresql"
+        if dialect != "postgresql":
+            return
+        function = "pg_advisory_xact_lock_shared" if shared else "pg_advisory_xact_lock"
+        await self.session.execute(text(f"SELECT {function}(:key)"), {"key": photo_lock_key(content_hash)})
+    
     async def check_nickname_exists(self, nickname: str) -> bool:
         """Verifica se nickname já existe"""
         query = select(Pet).where(Pet.nickname == nickname)
@@ -265,6 +440,7 @@ class PetRepository(BaseRepository[Pet]):
                 date=treatment_data.get("date"),
                 time=treatment_data.get("time"),
                 done=treatment_data.get("done", False),
+                recurrence_rule=treatment_data.get("recurrence_rule"),
                 applier_type=treatment_data.get("applier_type"),
                 applier_name=treatment_data.get("applier_name"),
                 applier_id=treatment_data.get("applier_id"),
@@ -277,6 +453,181 @@ class PetRepository(BaseRepository[Pet]):
             logger.error(f"Error adding treatment: {e}")
             return False
     
+    async def get_accessible_pet_ids(self, pet_ids: List[str], user_id: str) -> List[str]:
+        """Filtra, em uma única consulta, os pets aos quais o usuário tem acesso"""
+        if not pet_ids:
+            return []
+
+        query = (
+            select(Pet.id)
+            .join(PetOwner)
+            .where(
+                Pet.id.in_(pet_ids),
+                PetOwner.profile_id == user_id,
+                PetOwner.deleted_at == None,  # noqa: E711
+                Pet.deleted_at == None  # noqa: E711
+            )
+        )
+
+        result = await self.session.execute(query)
+        return list(result.scalars().unique().all())
+
+    async def bulk_add_treatments(self, treatments_data: List[Dict[str, Any]]) -> int:
+        """
+        Insere vários tratamentos em um único INSERT (sem verificação de acesso).
+        O chamador deve validar os pets antes com get_accessible_pet_ids.
+        Retorna a quantidade de tratamentos inseridos.
+        """
+        if not treatments_data:
+            return 0
+
+        rows = [
+            {
+                "id": str(uuid.uuid4()),
+                "pet_id": data["pet_id"],
+                "category": data.get("category"),
+                "name": data.get("name"),
+                "description": data.get("description"),
+                "date": data.get("date"),
+                "time": data.get("time"),
+                "done": data.get("done", False),
+                "recurrence_rule": data.get("recurrence_rule"),
+                "applier_type": data.get("applier_type"),
+                "applier_name": data.get("applier_name"),
+                "applier_id": data.get("applier_id"),
+            }
+            for data in treatments_data
+        ]
+
+        await self.session.execute(insert(Treatment), rows)
+        await self.session.flush()
+        return len(rows)
+
+    async def get_user_pet_ids(self, user_id: str) -> List[str]:
+        """Retorna os IDs dos pets (não deletados) do usuário"""
+        query = (
+            select(Pet.id)
+            .join(PetOwner)
+            .where(
+                PetOwner.profile_id == user_id,
+                PetOwner.deleted_at == None,  # noqa: E711
+                Pet.deleted_at == None  # noqa: E711
+            )
+            .order_by(Pet.name)
+        )
+        
+        result = await self.session.execute(query)
+        return list(result.scalars().unique().all())
+    
+    async def stream_treatment_history(
+        self,
+        pet_ids: List[str],
+        batch_size: int = 500
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Percorre o histórico de tratamentos dos pets com cursor no servidor,
+        buscando `batch_size` linhas por vez (memória constante).
+        Seleciona colunas em vez de entidades para não encher o identity map.
+        """
+        if not pet_ids:
+            return
+        
+        query = (
+            select(
+                Pet.id.label("pet_id"),
+                Pet.name.label("pet_name"),
+                Treatment.id,
+                Treatment.category,
+                Treatment.name,
+                Treatment.description,
+                Treatment.date,
+                Treatment.time,
+                Treatment.done,
+                Treatment.recurrence_rule,
+                Treatment.series_id,
+                Treatment.applier_type,
+                Treatment.applier_name,
+            )
+            .join(Treatment, Treatment.pet_id == Pet.id)
+            .where(
+                Pet.id.in_(pet_ids),
+                Treatment.deleted_at == None  # noqa: E711
+            )
+            .order_by(Pet.name, Pet.id, Treatment.date, Treatment.time)
+            .execution_options(yield_per=batch_size)
+        )
+        
+        result = await self.session.stream(query)
+        async for row in result.mappings():
+            yield dict(row)
+    
+    async def _get_accessible_treatment(
+        self,
+        pet_id: str,
+        user_id: str,
+        treatment_id: str
+    ) -> Optional[Treatment]:
+        """Busca tratamento do pet verificando acesso do usuário"""
+        query = (
+            select(Treatment)
+            .join(Pet)
+            .join(PetOwner)
+            .where(
+                Treatment.id == treatment_id,
+                Treatment.pet_id == pet_id,
+                PetOwner.profile_id == user_id,
+                PetOwner.deleted_at == None,  # noqa: E711
+                Pet.deleted_at == None  # noqa: E711
+            )
+        )
+        
+        result = await self.session.execute(query)
+        return result.scalar_one_or_none()
+    
+    async def _materialize_occurrence(
+        self,
+        series: Treatment,
+        occurrence_date: str,
+        treatment_data: Dict[str, Any]
+    ) -> Optional[Treatment]:
+        """
+        Cria a linha concreta de uma ocorrência de série recorrente.
+        A partir daí a série deixa de gerar a ocorrência virtual dessa data.
+        """
+        # Ocorrência já materializada: apenas atualiza a linha existente
+        query = select(Treatment).where(
+            Treatment.series_id == series.id,
+            Treatment.date == occurrence_date
+        )
+        result = await self.session.execute(query)
+        existing = result.scalars().first()
+        if existing:
+            for key, value in treatment_data.items():
+                if hasattr(existing, key):
+                    setattr(existing, key, value)
+            return existing
+        
+        day = datetime.strptime(occurrence_date, "%Y-%m-%d").date()
+        if occurrence_date not in series.occurrence_dates(day, day):
+            return None
+        
+        occurrence = Treatment(
+            id=str(uuid.uuid4()),
+            pet_id=series.pet_id,
+            series_id=series.id,
+            category=treatment_data.get("category", series.category),
+            name=treatment_data.get("name", series.name),
+            description=treatment_data.get("description", series.description),
+            date=occurrence_date,
+            time=treatment_data.get("time", series.time),
+            done=treatment_data.get("done", False),
+            applier_type=treatment_data.get("applier_type", series.applier_type),
+            applier_name=treatment_data.get("applier_name", series.applier_name),
+            applier_id=treatment_data.get("applier_id", series.applier_id),
+        )
+        self.session.add(occurrence)
+        return occurrence
+    
     async def update_treatment(
         self,
         pet_id: str,
@@ -284,24 +635,29 @@ class PetRepository(BaseRepository[Pet]):
         treatment_id: str,
         treatment_data: Dict[str, Any]
     ) -> bool:
-        """Atualiza tratamento do pet"""
+        """
+        Atualiza tratamento do pet.
+        Para ocorrências de séries recorrentes ("{series_id}@{data}") a ocorrência
+        é materializada com os dados informados (ex: marcada como concluída).
+        """
         try:
-            # Verificar acesso
-            query = (
-                select(Treatment)
-                .join(Pet)
-                .join(PetOwner)
-                .where(
-                    Treatment.id == treatment_id,
-                    Treatment.pet_id == pet_id,
-                    PetOwner.profile_id == user_id,
-                    PetOwner.deleted_at == None,  # noqa: E711
-                    Pet.deleted_at == None  # noqa: E711
-                )
-            )
+            occurrence = parse_occurrence_id(treatment_id)
+            if occurrence:
+                series_id, occurrence_date = occurrence
+                series = await self._get_accessible_treatment(pet_id, user_id, series_id)
+                if not series or not series.is_recurring:
+                    return False
+                
+                data = {k: v for k, v in treatment_data.items() if k not in ("_id", "date", "recurrence_rule")}
+                materialized = await self._materialize_occurrence(series, occurrence_date, data)
+                if not materialized:
+                    return False
+                
+                await self.session.flush()
+                return True
             
-            result = await self.session.execute(query)
-            treatment = result.scalar_one_or_none()
+            # Verificar acesso
+            treatment = await self._get_accessible_treatment(pet_id, user_id, treatment_id)
             
             if not treatment:
                 return False
@@ -318,24 +674,29 @@ class PetRepository(BaseRepository[Pet]):
             return False
     
     async def delete_treatment(self, pet_id: str, user_id: str, treatment_id: str) -> bool:
-        """Remove tratamento do pet"""
+        """
+        Remove tratamento do pet.
+        Para ocorrências de séries recorrentes, grava a ocorrência como removida
+        (soft delete) para que a série deixe de gerá-la.
+        """
         try:
-            # Verificar acesso
-            query = (
-                select(Treatment)
-                .join(Pet)
-                .join(PetOwner)
-                .where(
-                    Treatment.id == treatment_id,
-                    Treatment.pet_id == pet_id,
-                    PetOwner.profile_id == user_id,
-                    PetOwner.deleted_at == None,  # noqa: E711
-                    Pet.deleted_at == None  # noqa: E711
-                )
-            )
+            occurrence = parse_occurrence_id(treatment_id)
+            if occurrence:
+                series_id, occurrence_date = occurrence
+                series = await self._get_accessible_treatment(pet_id, user_id, series_id)
+                if not series or not series.is_recurring:
+                    return False
+                
+                materialized = await self._materialize_occurrence(series, occurrence_date, {})
+                if not materialized:
+                    return False
+                
+                materialized.soft_delete()
+                await self.session.flush()
+                return True
             
-            result = await self.session.execute(query)
-            treatment = result.scalar_one_or_none()
+            # Verificar acesso
+            treatment = await self._get_accessible_treatment(pet_id, user_id, treatment_id)
             
             if not treatment:
                 return False
@@ -347,48 +708,96 @@ class PetRepository(BaseRepository[Pet]):
             logger.error(f"Error deleting treatment: {e}")
             return False
     
+    async def get_pending_treatments_in_window(
+        self,
+        window_start: Optional[date],
+        window_end: date
+    ) -> List[Dict[str, Any]]:
+        """
+        Busca pets com tratamentos pendentes na janela [window_start, window_end].
+        Séries recorrentes iniciadas até o fim da janela são expandidas em memória,
+        apenas para o intervalo consultado. window_start=None significa sem limite inferior.
+        """
+        start_str = window_start.strftime("%Y-%m-%d") if window_start else None
+        end_str = window_end.strftime("%Y-%m-%d")
+        
+        single_filter = and_(
+            Treatment.recurrence_rule == None,  # noqa: E711
+            Treatment.done == False,  # noqa: E712
+            Treatment.date <= end_str,
+        )
+        if start_str:
+            single_filter = and_(single_filter, Treatment.date >= start_str)
+        
+        recurring_filter = and_(
+            Treatment.recurrence_rule != None,  # noqa: E711
+            Treatment.done == False,  # noqa: E712
+            Treatment.date <= end_str,
+        )
+        
+        query = (
+            select(Pet)
+            .join(Treatment)
+            .where(
+                Pet.deleted_at == None,  # noqa: E711
+                Treatment.deleted_at == None,  # noqa: E711
+                or_(single_filter, recurring_filter)
+            )
+            .options(
+                selectinload(Pet.owners),
+                selectinload(Pet.treatments)
+            )
+        )
+        
+        result = await self.session.execute(query)
+        pets = result.unique().scalars().all()
+        
+        results = []
+        for pet in pets:
+            treatments = expand_treatments(pet.treatments, window_start, window_end, pending_only=True)
+            if not treatments:
+                continue
+            results.append({
+                "_id": pet.id,
+                "name": pet.name,
+                "nickname": pet.nickname,
+                "users": [owner.profile_id for owner in pet.owners if not owner.deleted_at],
+                "treatments": treatments,
+            })
+        
+        return results
+    
     async def get_scheduled_treatments_for_date(self, target_date: str) -> List[Dict[str, Any]]:
         """
         Busca todos os tratamentos agendados para uma data específica
         target_date: data no formato "YYYY-MM-DD"
         """
         try:
-            query = (
-                select(Pet)
-                .join(Treatment)
-                .where(
-                    Pet.deleted_at == None,  # noqa: E711
-                    Treatment.date == target_date,
-                    Treatment.done == False  # noqa: E712
-                )
-                .options(
-                    selectinload(Pet.owners),
-                    selectinload(Pet.treatments)
-                )
-            )
-            
-            result = await self.session.execute(query)
-            pets = result.unique().scalars().all()
-            
-            results = []
-            for pet in pets:
-                pet_dict = {
-                    "_id": pet.id,
-                    "name": pet.name,
-                    "nickname": pet.nickname,
-                    "users": [owner.profile_id for owner in pet.owners if not owner.deleted_at],
-                    "treatments": [
-                        t.to_dict() for t in pet.treatments
-                        if t.date == target_date and not t.done
-                    ]
-                }
-                results.append(pet_dict)
-            
-            return results
+            day = datetime.strptime(target_date, "%Y-%m-%d").date()
+            return await self.get_pending_treatments_in_window(day, day)
         except Exception as e:
             logger.error(f"Error fetching scheduled treatments: {e}")
             return []
     
+    async def get_scheduled_treatments_by_date(self, start: date, end: date) -> Dict[date, List[Dict[str, Any]]]:
+        """
+        Busca os tratamentos agendados de um intervalo de datas com uma única consulta
+        e os separa por dia: {data: [pets com os tratamentos daquele dia]}.
+        Usado para recuperar dias em que as notificações não foram enviadas.
+        """
+        pets = await self.get_pending_treatments_in_window(start, end)
+        
+        by_date: Dict[date, List[Dict[str, Any]]] = {}
+        for pet in pets:
+            treatments_by_day: Dict[str, List[Dict[str, Any]]] = {}
+            for treatment in pet["treatments"]:
+                treatments_by_day.setdefault(treatment["date"], []).append(treatment)
+            for day_str, treatments in treatments_by_day.items():
+                day = datetime.strptime(day_str, "%Y-%m-%d").date()
+                by_date.setdefault(day, []).append({**pet, "treatments": treatments})
+        
+        return by_date
+    
     async def get_tomorrow_scheduled_treatments(self) -> List[Dict[str, Any]]:
         """Busca todos os tratamentos agendados para amanhã"""
         tomorrow = datetime.now() + timedelta(days=1)
@@ -399,47 +808,13 @@ class PetRepository(BaseRepository[Pet]):
         """Busca todos os tratamentos agendados para o mês atual"""
         try:
             now = datetime.now()
-            first_day = now.replace(day=1).strftime("%Y-%m-%d")
+            first_day = now.replace(day=1).date()
             if now.month == 12:
                 last_day = now.replace(year=now.year + 1, month=1, day=1) - timedelta(days=1)
             else:
                 last_day = now.replace(month=now.month + 1, day=1) - timedelta(days=1)
-            last_day_str = last_day.strftime("%Y-%m-%d")
-            
-            query = (
-                select(Pet)
-                .join(Treatment)
-                .where(
-                    Pet.deleted_at == None,  # noqa: E711
-                    Treatment.date >= first_day,
-                    Treatment.date <= last_day_str,
-                    Treatment.done == False  # noqa: E712
-                )
-                .options(
-                    selectinload(Pet.owners),
-                    selectinload(Pet.treatments)
-                )
-            )
-            
-            result = await self.session.execute(query)
-            pets = result.unique().scalars().all()
             
-            results = []
-            for pet in pets:
-                pet_dict = {
-                    "_id": pet.id,
-                    "name": pet.name,
-                    "nickname": pet.nickname,
-                    "users": [owner.profile_id for owner in pet.owners if not owner.deleted_at],
-                    "treatments": [
-                        t.to_dict() for t in pet.treatments
-                        if first_day <= t.date <= last_day_str and not t.done
-                    ]
-                }
-                if pet_dict["treatments"]:
-                    results.append(pet_dict)
-            
-            return results
+            return await self.get_pending_treatments_in_window(first_day, last_day.date())
         except Exception as e:
             logger.error(f"Error fetching current month treatments: {e}")
             return []
@@ -447,42 +822,135 @@ class PetRepository(BaseRepository[Pet]):
     async def get_expired_treatments(self) -> List[Dict[str, Any]]:
         """Busca todos os tratamentos expirados"""
         try:
-            today = datetime.now().strftime("%Y-%m-%d")
+            yesterday = (datetime.now() - timedelta(days=1)).date()
+            return await self.get_pending_treatments_in_window(None, yesterday)
+        except Exception as e:
+            logger.error(f"Error fetching expired treatments: {e}")
+            return []
+    
+    async def stream_monthly_report(
+        self,
+        month_start: date,
+        month_end: date,
+        expired_until: date,
+        after_key: Optional[str] = None,
+        tutors_per_page: int = 500,
+        shard: int = 0,
+        shards: int = 1
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Dados do relatório mensal por tutor, em ordem de chave ("email|id"), a partir de `after_key`.
+        Cada página de `tutors_per_page` tutores é lida com uma única consulta que devolve
+        linhas (tutor, pet, tratamento, bucket) já ordenadas por tutor e pet; cada tutor é
+        emitido assim que suas linhas terminam, no formato
+        {"key", "tutor", "pets": [{"pet", "current_month_treatments", "expired_treatments"}]}.
+        Buckets: "current" (pendentes do mês), "expired" (pendentes até `expired_until`),
+        "series" (séries recorrentes, expandidas aqui) e "materialized" (ocorrências
+        já gravadas, que substituem as virtuais).
+        A memória fica limitada a uma página, e o chamador pode confirmar transações entre
+        os tutores (não há cursor aberto entre as páginas).
+        Com `shards` > 1, só os tutores com shard_of(chave) == `shard`: no PostgreSQL o
+        filtro é feito na consulta das chaves; nos demais bancos, nas chaves de cada página.
+        As linhas de tratamentos são lidas apenas para os tutores do shard.
+        """
+        month_start_str = month_start.strftime("%Y-%m-%d")
+        month_end_str = month_end.strftime("%Y-%m-%d")
+        expired_until_str = expired_until.strftime("%Y-%m-%d")
+        
+        pending_single = and_(
+            Treatment.recurrence_rule == None,  # noqa: E711
+            Treatment.done == False,  # noqa: E712
+            Treatment.deleted_at == None,  # noqa: E711
+        )
+        buckets = union_all(
+            select(Treatment.id.label("treatment_id"), literal("current").label("bucket"))
+            .where(pending_single, Treatment.date >= month_start_str, Treatment.date <= month_end_str),
+            select(Treatment.id, literal("expired"))
+            .where(pending_single, Treatment.date <= expired_until_str),
+            select(Treatment.id, literal("series"))
+            .where(
+                Treatment.recurrence_rule != None,  # noqa: E711
+                Treatment.done == False,  # noqa: E712
+                Treatment.deleted_at == None,  # noqa: E711
+                Treatment.date <= max(month_end_str, expired_until_str),
+            ),
+            select(Treatment.id, literal("materialized"))
+            .where(Treatment.series_id != None),  # noqa: E711
+        ).subquery()
+        
+        # Ordem binária (igual à comparação de strings do Python, usada nos checkpoints)
+        dialect = self.session.bind.dialect.name if self.session.bind else "postgresql"
+        tutor_key = (Profile.email + literal("|") + Profile.id).self_group().collate("C" if dialect == "postgresql" else "BINARY")
+        active_owners = and_(
+            Pet.deleted_at == None,  # noqa: E711
+            PetOwner.deleted_at == None,  # noqa: E711
+            Profile.deleted_at == None,  # noqa: E711
+            Profile.email != "",
+        )
+        
+        while True:
+            # Próxima página de tutores (só as chaves)
+            keys_query = (
+                select(tutor_key.label("tutor_key"))
+                .select_from(PetOwner)
+                .join(Pet, Pet.id == PetOwner.pet_id)
+                .join(Profile, Profile.id == PetOwner.profile_id)
+                .where(active_owners)
+                .group_by(tutor_key)
+                .order_by(tutor_key)
+                .limit(tutors_per_page)
+            )
+            if after_key is not None:
+                keys_query = keys_query.where(tutor_key > after_key)
+            if shards > 1 and dialect == "postgresql":
+                keys_query = keys_query.where(shard_of_sql(tutor_key, shards) == shard)
+            page_keys = (await self.session.execute(keys_query)).scalars().all()
+            if not page_keys:
+                return
+            
+            shard_keys = page_keys
+            if shards > 1 and dialect != "postgresql":
+                shard_keys = [key for key in page_keys if shard_of(key, shards) == shard]
+            if not shard_keys:
+                after_key = page_keys[-1]
+                continue
             
             query = (
-                select(Pet)
-                .join(Treatment)
-                .where(
-                    Pet.deleted_at == None,  # noqa: E711
-                    Treatment.date < today,
-                    Treatment.done == False  # noqa: E712
-                )
-                .options(
-                    selectinload(Pet.owners),
-                    selectinload(Pet.treatments)
+                select(
+                    tutor_key.label("tutor_key"),
+                    Profile.id.label("tutor_id"),
+                    Profile.name.label("tutor_name"),
+                    Profile.email.label("tutor_email"),
+                    Pet.id.label("pet_id"),
+                    Pet.name.label("pet_name"),
+                    Pet.nickname.label("pet_nickname"),
+                    buckets.c.bucket,
+                    *(column.label(f"treatment_{column.key}") for column in TREATMENT_REPORT_COLUMNS),
                 )
+                .select_from(buckets)
+                .join(Treatment, Treatment.id == buckets.c.treatment_id)
+                .join(Pet, Pet.id == Treatment.pet_id)
+                .join(PetOwner, PetOwner.pet_id == Pet.id)
+                .join(Profile, Profile.id == PetOwner.profile_id)
+                .where(active_owners, tutor_key.in_(shard_keys))
+                .order_by(tutor_key, Pet.id, Treatment.date, Treatment.time)
             )
             
             result = await self.session.execute(query)
-            pets = result.unique().scalars().all()
-            
-            results = []
-            for pet in pets:
-                pet_dict = {
-                    "_id": pet.id,
-                    "name": pet.name,
-                    "nickname": pet.nickname,
-                    "users": [owner.profile_id for owner in pet.owners if not owner.deleted_at],
-                    "treatments": [
-                        t.to_dict() for t in pet.treatments
-                        if t.date < today and not t.done
-                    ]
-                }
-                if pet_dict["treatments"]:
-                    results.append(pet_dict)
-            
-            return results
-        except Exception as e:
-            logger.error(f"Error fetching expired treatments: {e}")
-            return []
-
+            tutor_rows: List[Dict[str, Any]] = []
+            for row in result.mappings():
+                if tutor_rows and row["tutor_key"] != tutor_rows[0]["tutor_key"]:
+                    group = _monthly_report_group(tutor_rows, month_start, month_end, expired_until)
+                    if group["pets"]:
+                        yield group
+                    tutor_rows = []
+                tutor_rows.append(dict(row))
+            
+            if tutor_rows:
+                group = _monthly_report_group(tutor_rows, month_start, month_end, expired_until)
+                if group["pets"]:
+                    yield group
+            
+            if len(page_keys) < tutors_per_page:
+                return
+            after_key = page_keys[-1]
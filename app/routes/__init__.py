@@ -5,6 +5,8 @@ from .pet_routes import router as pet_router
 from .treatment_routes import router as treatment_router
 from .info_routes import router as info_router
 from .vet_routes import router as vet_router
+from .export_routes import router as export_router
+from .image_routes import router as image_router
 
 __all__ = [
     "auth_router",
@@ -14,4 +16,6 @@ __all__ = [
     "treatment_router",
     "info_router",
     "vet_router",
+    "export_router",
+    "image_router",
 ]
@@ -7,12 +7,15 @@ from fastapi.templating import Jinja2Templates
 from starlette.responses import RedirectResponse
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.services import PetService, UserService
+from app.services import PetService, UserService, FileService
 from app.database.connection import get_db
 from .auth_routes import get_current_user_from_session
 
 # Configuração do Jinja2
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["photo_sources"] = FileService.photo_sources
+templates.env.globals["photo_url"] = FileService.photo_url
+templates.env.globals["photo_variant_url"] = FileService.photo_variant_url
 
 router = APIRouter()
 
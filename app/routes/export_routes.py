@@ -0,0 +1,78 @@
+"""
+Rotas de exportação do histórico de tratamentos
+"""
+
+from typing import AsyncIterator, List, Literal, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query
+from starlette.responses import Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.services.export_service import ExportService
+from app.database.connection import get_db, AsyncSessionLocal
+from .auth_routes import get_current_user_from_session
+
+router = APIRouter()
+
+ExportFormat = Literal["csv", "ndjson", "pdf"]
+
+
+async def _stream_history(pet_ids: List[str], export_format: str) -> AsyncIterator[bytes]:
+    """
+    Gera o arquivo em uma sessão própria: o cursor continua aberto enquanto
+    a resposta é enviada, independente do ciclo de vida de get_db.
+    """
+    async with AsyncSessionLocal() as session:
+        service = ExportService(session)
+        if export_format == "csv":
+            chunks = service.stream_csv(pet_ids)
+        else:
+            chunks = service.stream_ndjson(pet_ids)
+        async for chunk in chunks:
+            yield chunk
+
+
+async def _export_response(
+    db: AsyncSession,
+    user_id: str,
+    export_format: str,
+    pet_id: Optional[str] = None,
+    label: str = "conta",
+) -> Response:
+    service = ExportService(db)
+    pet_ids = await service.resolve_pet_ids(user_id, pet_id)
+    
+    if pet_id and not pet_ids:
+        raise HTTPException(status_code=404, detail="Pet not found.")
+    
+    filename, media_type = ExportService.build_filename(label, export_format)
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    
+    if export_format == "pdf":
+        content = await service.export_pdf(pet_ids, "Histórico de tratamentos")
+        return Response(content=content, media_type=media_type, headers=headers)
+    
+    return StreamingResponse(
+        _stream_history(pet_ids, export_format),
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+@router.get("/pets/{pet_id}/export")
+async def export_pet_history(
+    pet_id: str,
+    format: ExportFormat = Query("csv"),
+    user: dict = Depends(get_current_user_from_session),
+    db: AsyncSession = Depends(get_db),
+):
+    """Exporta o histórico de tratamentos do pet (CSV/NDJSON em stream ou PDF)"""
+    return await _export_response(db, user["id"], format, pet_id=pet_id, label=pet_id)
+
+
+@router.get("/profile/export")
+async def export_account_history(
+    format: ExportFormat = Query("csv"),
+    user: dict = Depends(get_current_user_from_session),
+    db: AsyncSession = Depends(get_db),
+):
+    """Exporta o histórico de tratamentos de todos os pets da conta do tutor"""
+    return await _export_response(db, user["id"], format)
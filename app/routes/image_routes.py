@@ -0,0 +1,72 @@
+"""
+Rotas de variantes de imagem geradas sob demanda
+"""
+
+from typing import Literal, Optional
+from fastapi import APIRouter, HTTPException, Depends, Request
+from starlette.responses import FileResponse, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import config
+from app.services.file_service import FileService, RENDER_FORMATS, PHOTO_VERSION_LENGTH
+from app.services.image_executor import ImageExecutorBusy
+from app.services.upload_serving import IMMUTABLE_CACHE_CONTROL
+from app.repositories.pet_repository import PetRepository
+from app.database.connection import get_db
+
+router = APIRouter()
+
+# URLs sem `?v=` (ou com hash antigo) apontam para "a foto atual do pet"
+REVALIDATE_CACHE_CONTROL = "public, max-age=300"
+
+MEDIA_TYPES = {"jpg": "image/jpeg", "webp": "image/webp", "avif": "image/avif"}
+
+ImageFormat = Literal["jpg", "webp", "avif"]
+
+
+@router.get("/img/{pet_id}/{width:int}x{height:int}.{fmt}")
+async def pet_photo_variant(
+    request: Request,
+    pet_id: str,
+    width: int,
+    height: int,
+    fmt: ImageFormat,
+    v: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Foto do pet redimensionada para exatamente `width`x`height` (recorte central).
+    Apenas os tamanhos de IMAGE_VARIANT_SIZES são aceitos.
+    """
+    if (width, height) not in config.IMAGE_VARIANT_SIZES or fmt not in RENDER_FORMATS:
+        raise HTTPException(status_code=404, detail="Image size not available.")
+
+    photo = await PetRepository(db).get_active_pet_photo(pet_id)
+    if not photo:
+        raise HTTPException(status_code=404, detail="Photo not found.")
+
+    content_hash = photo.get("hash")
+    headers = {}
+    if content_hash:
+        headers["etag"] = f'"{content_hash}-{width}x{height}.{fmt}"'
+        # Prefixos curtos (ex: `?v=a`) casariam com fotos futuras e fixariam a atual no cache
+        versioned = v is not None and len(v) >= PHOTO_VERSION_LENGTH and content_hash.startswith(v)
+        headers["cache-control"] = IMMUTABLE_CACHE_CONTROL if versioned else REVALIDATE_CACHE_CONTROL
+
+        # Revalidação sem tocar no cache de variantes nem no storage
+        if request.headers.get("if-none-match") == headers["etag"]:
+            return Response(status_code=304, headers=headers)
+    else:
+        headers["cache-control"] = REVALIDATE_CACHE_CONTROL
+
+    try:
+        path = await FileService.render_photo_variant(pet_id, photo, (width, height), fmt)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Photo not found.")
+    except ImageExecutorBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Servidor ocupado processando imagens. Tente novamente em instantes.",
+            headers={"Retry-After": "5"},
+        )
+
+    return FileResponse(path, media_type=MEDIA_TYPES[fmt], headers=headers)
@@ -5,17 +5,21 @@ Rotas de pets
 import requests
 from datetime import datetime
 from typing import Optional, Literal
-from fastapi import APIRouter, HTTPException, Request, Depends, Form, Query, UploadFile, File, status
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request, Depends, Form, Query, UploadFile, File, status
 from fastapi.templating import Jinja2Templates
 from starlette.responses import RedirectResponse, JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.services import PetService, FileService, UserService
+from app.services.pet_service import release_photo_in_background
 from app.schemas import PetType
 from app.database.connection import get_db
 from .auth_routes import get_current_user_from_session
 
 # Configuração do Jinja2
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["photo_sources"] = FileService.photo_sources
+templates.env.globals["photo_url"] = FileService.photo_url
+templates.env.globals["photo_variant_url"] = FileService.photo_variant_url
 
 router = APIRouter()
 
@@ -261,6 +265,7 @@ async def pet_profile_page(
 
 @router.post("/pets")
 async def create_or_update_pet_from_form(
+    background_tasks: BackgroundTasks,
     user: dict = Depends(get_current_user_from_session),
     db: AsyncSession = Depends(get_db),
     pet_id: str | None = Form(None),
@@ -280,6 +285,7 @@ async def create_or_update_pet_from_form(
 
     # Processa imagem se fornecida
     photo_data = None
+    old_photo = None
     if photo and photo.filename:
         is_valid, error_message = file_service.validate_image_file(photo)
         if not is_valid:
@@ -289,14 +295,20 @@ async def create_or_update_pet_from_form(
                 status_code=302,
             )
 
-        # Se for atualização, remove imagem antiga (implementar se necessário)
+        # Se for atualização, guarda a foto antiga para liberar após salvar a nova
         if pet_id:
-            old_pet = await pet_service.get_pet_details(pet_id, user["id"])
-            if old_pet and "photo" in old_pet:
-                file_service.delete_pet_images(pet_id)
-
-        # Salva nova imagem
-        photo_data = file_service.save_image_with_thumbnail(photo, pet_id or "temp")
+            old_photo = await pet_service.get_pet_photo(pet_id, user["id"])
+
+        # Salva nova imagem (objeto final, sem pasta temporária por pet)
+        try:
+            photo_data = await file_service.save_image_with_thumbnail(photo, reserve=pet_service.reserve_photo)
+        except HTTPException as e:
+            if e.status_code != status.HTTP_413_REQUEST_ENTITY_TOO_LARGE:
+                raise
+            return RedirectResponse(
+                url=f"/pets/form?error={e.detail}&pet_id={pet_id or ''}",
+                status_code=302,
+            )
 
     pet_data = {
         "name": name,
@@ -311,7 +323,7 @@ async def create_or_update_pet_from_form(
         pet_data["photo"] = photo_data
 
     if pet_id:
-        # Lógica de atualização
+        # Lógica de atualização (dados e foto na mesma escrita)
         success, message = await pet_service.update_pet(pet_id, pet_data, user["id"])
         
         if not success:
@@ -320,13 +332,14 @@ async def create_or_update_pet_from_form(
                 detail=message
             )
 
-        # Move arquivo da pasta temporária para a pasta correta
-        if photo_data:
-            final_photo_data = file_service.move_temp_image_to_pet_folder(photo_data, pet_id)
-            if final_photo_data:
-                await pet_service.update_pet(pet_id, {"photo": final_photo_data}, user["id"])
+        # Remove a foto anterior depois da resposta, se nenhum outro pet a utiliza. O commit
+        # é explícito: get_db só confirma depois das background tasks, e a liberação (em
+        # outra sessão) ainda veria o pet apontando para a foto antiga
+        if photo_data and old_photo and old_photo.get("hash") != photo_data.get("hash"):
+            await db.commit()
+            background_tasks.add_task(release_photo_in_background, pet_id, old_photo)
     else:
-        # Lógica de criação
+        # Lógica de criação (pet, dono e foto na mesma transação)
         success, message, new_pet_id = await pet_service.create_pet(pet_data, user["id"])
         
         if not success:
@@ -335,18 +348,13 @@ async def create_or_update_pet_from_form(
                 detail=message
             )
 
-        # Move arquivos da pasta temporária para a pasta correta
-        if photo_data and new_pet_id:
-            final_photo_data = file_service.move_temp_image_to_pet_folder(photo_data, new_pet_id)
-            if final_photo_data:
-                await pet_service.update_pet(new_pet_id, {"photo": final_photo_data}, user["id"])
-
     return RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
 
 
 @router.post("/pets/{pet_id}/delete")
 async def delete_pet_from_form(
     pet_id: str,
+    background_tasks: BackgroundTasks,
     user: dict = Depends(get_current_user_from_session),
     db: AsyncSession = Depends(get_db),
 ):
@@ -354,7 +362,6 @@ async def delete_pet_from_form(
     Realiza o soft delete de um pet.
     """
     pet_service = PetService(db)
-    file_service = FileService()
 
     # Busca o pet para verificar se tem fotos
     pet = await pet_service.get_pet_details(pet_id, user["id"])
@@ -365,10 +372,6 @@ async def delete_pet_from_form(
             detail="Pet não encontrado ou você não tem permissão para excluí-lo.",
         )
 
-    # Remove as imagens do pet
-    if pet.get("photo"):
-        file_service.delete_pet_images(pet_id)
-
     success, message = await pet_service.delete_pet(pet_id, user["id"])
     
     if not success:
@@ -377,6 +380,12 @@ async def delete_pet_from_form(
             detail=message
         )
 
+    # Remove as imagens do pet depois da resposta (fotos compartilhadas são mantidas);
+    # commit antes, para a liberação já ver o pet excluído
+    if pet.get("photo"):
+        await db.commit()
+        background_tasks.add_task(release_photo_in_background, pet_id, pet["photo"])
+
     return RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
 
 
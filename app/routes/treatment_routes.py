@@ -8,6 +8,7 @@ from fastapi.templating import Jinja2Templates
 from starlette.responses import RedirectResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.services import PetService
+from app.services.pet_service import build_recurrence_rule, RECURRENCE_FREQUENCIES
 from app.database.connection import get_db
 from .auth_routes import get_current_user_from_session
 
@@ -33,7 +34,13 @@ async def add_treatment_page(
 
     return templates.TemplateResponse(
         "treatment_form.html",
-        {"request": request, "pet": pet, "treatment": None, "user_info": user["info"]},
+        {
+            "request": request,
+            "pet": pet,
+            "treatment": None,
+            "user_info": user["info"],
+            "recurrence_frequencies": RECURRENCE_FREQUENCIES,
+        },
     )
 
 
@@ -52,9 +59,16 @@ async def create_or_update_treatment(
     applier_name: Optional[str] = Form(None),
     applier_id: Optional[str] = Form(None),
     done: bool = Form(False),
+    recurrence: Optional[str] = Form(None),
+    recurrence_until: Optional[str] = Form(None),
 ):
     """Cria ou atualiza um tratamento para o pet"""
     pet_service = PetService(db)
+    
+    try:
+        recurrence_rule = build_recurrence_rule(recurrence, recurrence_until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     treatment_data = {
         "category": category,
@@ -66,6 +80,7 @@ async def create_or_update_treatment(
         "applier_name": applier_name,
         "applier_id": applier_id,
         "done": done,
+        "recurrence_rule": recurrence_rule,
     }
 
     if treatment_id:
@@ -114,6 +129,7 @@ async def edit_treatment_page(
             "pet": pet,
             "treatment": treatment,
             "user_info": user["info"],
+            "recurrence_frequencies": RECURRENCE_FREQUENCIES,
         },
     )
 
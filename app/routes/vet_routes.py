@@ -2,12 +2,14 @@
 Rotas para veterinários
 """
 
-from fastapi import APIRouter, HTTPException, Request, Depends, Query
+from typing import List, Literal, Optional
+from fastapi import APIRouter, HTTPException, Request, Depends, Query, Form
 from fastapi.templating import Jinja2Templates
 from starlette.responses import JSONResponse
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.services import PetService
+from app.services import PetService, ProtocolService, UserService
+from app.repositories import InfoRepository
 from app.database.connection import get_db
 from .auth_routes import get_current_user_from_session
 
@@ -30,6 +32,7 @@ async def get_vet_dashboard_page(
         is_authenticated = "access_token" in request.session
         pet_service = PetService(db)
         pets_list = await pet_service.get_user_pets(user["id"])
+        vaccines = await InfoRepository(db).search_vaccines()
 
         return templates.TemplateResponse(
             "vet_dashboard.html",
@@ -39,12 +42,47 @@ async def get_vet_dashboard_page(
                 "current_year": datetime.now().year,
                 "user_info": user["info"],
                 "pets": pets_list,
+                "vaccines": vaccines,
             },
         )
     except HTTPException:
         raise
 
 
+@router.post("/vet-dashboard/protocols")
+async def apply_vaccine_protocol(
+    user: dict = Depends(get_current_user_from_session),
+    db: AsyncSession = Depends(get_db),
+    vaccine_id: int = Form(...),
+    pet_ids: List[str] = Form(...),
+    phase: Literal["filhote", "adulto"] = Form(...),
+    start_date: str = Form(...),
+    time: Optional[str] = Form(None),
+):
+    """
+    Aplica o protocolo de uma vacina a vários pets de uma vez (campanhas de vacinação).
+    Todas as doses são inseridas em uma única transação. Apenas veterinários.
+    """
+    is_vet, profile, _ = await UserService(db).validate_veterinarian(user["id"])
+    if not is_vet:
+        return JSONResponse(
+            content={"success": False, "message": "Apenas veterinários podem aplicar protocolos vacinais.", "created": 0},
+            status_code=403,
+        )
+
+    protocol_service = ProtocolService(db)
+    applier = {"id": user["id"], "name": profile.get("name") or user["info"].get("name"), "is_vet": profile["is_vet"]}
+
+    success, message, created = await protocol_service.apply_vaccine_protocol(
+        vaccine_id, pet_ids, phase, start_date, applier, time
+    )
+
+    return JSONResponse(
+        content={"success": success, "message": message, "created": created},
+        status_code=200 if success else 400,
+    )
+
+
 @router.get("/api/search-pet-by-nickname")
 async def search_pet_by_nickname(
     request: Request,
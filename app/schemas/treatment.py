@@ -13,3 +13,5 @@ class Treatment(BaseModel):
     applier_name: Optional[str] = None
     applier_id: Optional[str] = None
     done: bool = Field(default=False)
+    recurrence_rule: Optional[str] = None
+    series_id: Optional[str] = None
@@ -2,10 +2,12 @@ from .auth_service import AuthService
 from .pet_service import PetService
 from .user_service import UserService
 from .file_service import FileService
+from .protocol_service import ProtocolService
 
 __all__ = [
     "AuthService",
     "PetService", 
     "UserService",
     "FileService",
+    "ProtocolService",
 ]
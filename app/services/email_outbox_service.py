@@ -0,0 +1,152 @@
+"""
+Fila durável de emails de notificação (tabela email_outbox).
+
+Os jobs renderizam os emails e os gravam na fila antes de enviar. O envio
+(drain) reserva lotes com SKIP LOCKED, envia em paralelo pelo MailDispatcher e
+registra o resultado de cada email: falhas voltam para a fila com backoff
+exponencial até OUTBOX_MAX_ATTEMPTS. Reexecutar um job não duplica emails, pois
+a chave (tipo, destinatário, data de referência, conjunto de pets) é única.
+"""
+
+import hashlib
+import logging
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import config
+from app.repositories import EmailOutboxRepository
+from app.services.mail_dispatcher import MailDispatcher, MailJob
+from app.services.mail_transport import SMTPTransportPool, build_html_message
+
+logger = logging.getLogger(__name__)
+
+# Tipos de email na fila
+DAILY_REMINDER = "daily_reminder"
+MONTHLY_REPORT = "monthly_report"
+
+
+def pet_set_key(pet_ids: Iterable[str]) -> str:
+    """Identificador estável do conjunto de pets de um email (ordem irrelevante)"""
+    return hashlib.sha256(",".join(sorted(set(pet_ids))).encode()).hexdigest()
+
+
+def outbox_record(
+    kind: str,
+    recipient: str,
+    reference_date: date,
+    pet_ids: Iterable[str],
+    subject: str,
+    html_body: str,
+) -> Dict[str, Any]:
+    """Monta um registro para EmailOutboxService.enqueue"""
+    return {
+        "kind": kind,
+        "recipient": recipient,
+        "reference_date": reference_date,
+        "pet_set": pet_set_key(pet_ids),
+        "subject": subject,
+        "html_body": html_body,
+    }
+
+
+def retry_delay(attempts: int) -> Optional[float]:
+    """Segundos até a próxima tentativa, ou None quando as tentativas acabaram"""
+    if attempts >= config.OUTBOX_MAX_ATTEMPTS:
+        return None
+    return min(config.OUTBOX_RETRY_MAX, config.OUTBOX_RETRY_BASE * 2 ** max(attempts - 1, 0))
+
+
+class EmailOutboxService:
+    """Enfileira emails renderizados e os envia com novas tentativas"""
+
+    def __init__(self, session: AsyncSession, dispatcher: Optional[MailDispatcher] = None):
+        self.session = session
+        self.outbox_repo = EmailOutboxRepository(session)
+        self.dispatcher = dispatcher or MailDispatcher()
+        self.mail_transport: Optional[SMTPTransportPool] = None
+
+    async def enqueue(self, records: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """
+        Grava os emails na fila e confirma a transação.
+        Retorna: (novos, já_enfileirados)
+        """
+        queued = await self.outbox_repo.enqueue(records)
+        await self.session.commit()
+        return queued, len(records) - queued
+
+    def _send(self, entry: Dict[str, Any]) -> Tuple[bool, str]:
+        msg = build_html_message(entry["subject"], entry["recipient"], entry["html_body"])
+        self.mail_transport.send_message(msg)
+        return True, f"Email enviado para {entry['recipient']}"
+
+    async def _record_outcome(self, entry: Dict[str, Any], success: bool, message: str) -> Dict[str, Any]:
+        if success:
+            await self.outbox_repo.mark_sent(entry["id"])
+            return {"recipient": entry["recipient"], "success": True, "message": message}
+
+        delay = retry_delay(entry["attempts"])
+        retry_at = datetime.now(timezone.utc) + timedelta(seconds=delay) if delay is not None else None
+        await self.outbox_repo.mark_failed(entry["id"], message, retry_at)
+        if retry_at is not None:
+            message = f"{message} (tentativa {entry['attempts']}, nova tentativa às {retry_at:%H:%M:%S})"
+        else:
+            message = f"{message} (desistindo após {entry['attempts']} tentativas)"
+        return {"recipient": entry["recipient"], "success": False, "message": message, "retry_at": retry_at}
+
+    @contextmanager
+    def transport(self) -> Iterator["EmailOutboxService"]:
+        """Mantém as conexões SMTP abertas entre vários drain() (envio lote a lote)"""
+        self.mail_transport = SMTPTransportPool(self.dispatcher.concurrency)
+        try:
+            yield self
+        finally:
+            logger.info(f"SMTP: {self.mail_transport.metrics()}")
+            self.mail_transport.close()
+            self.mail_transport = None
+
+    async def drain(self, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Envia os emails prontos da fila (opcionalmente só de um tipo), lote a lote.
+        Cada lote é reservado e confirmado antes do envio, para que outra
+        execução não o reserve; o resultado é confirmado logo após o envio.
+        Retorna o resultado de cada email enviado ou que falhou nesta execução.
+        """
+        if self.mail_transport is None:
+            with self.transport():
+                return await self.drain(kind)
+
+        deliveries: List[Dict[str, Any]] = []
+        while True:
+            entries = await self.outbox_repo.claim_batch(
+                config.OUTBOX_BATCH_SIZE, config.OUTBOX_LEASE_SECONDS, kind=kind
+            )
+            await self.session.commit()
+            if not entries:
+                break
+
+            jobs = [MailJob(entry["recipient"], self._send, (entry,)) for entry in entries]
+            outcomes = await self.dispatcher.run(jobs)
+
+            for entry, (success, message) in zip(entries, outcomes):
+                deliveries.append(await self._record_outcome(entry, success, message))
+            await self.session.commit()
+
+        return deliveries
+
+    async def deliver(self, records: List[Dict[str, Any]], kind: str) -> Dict[str, Any]:
+        """
+        Enfileira os emails de uma execução e envia os prontos desse tipo
+        (inclusive novas tentativas de execuções anteriores).
+        Sem configuração de email válida, os emails ficam na fila.
+        """
+        queued, already_queued = await self.enqueue(records)
+        summary = {"queued": queued, "already_queued": already_queued, "deliveries": [], "errors": []}
+
+        is_valid, validation_message = config.validate_gmail_config()
+        if not is_valid:
+            summary["errors"].append(validation_message)
+            return summary
+
+        summary["deliveries"] = await self.drain(kind=kind)
+        return summary
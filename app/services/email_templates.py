@@ -0,0 +1,77 @@
+"""
+Renderização de emails com templates compilados compartilhados pelo processo.
+
+Um único Environment do Jinja carrega cada template uma vez por processo e grava
+o bytecode compilado em EMAIL_TEMPLATE_CACHE_DIR, para que processos novos (as
+tasks agendadas) não recompilem os templates a cada execução. O EmailRenderer
+guarda os blocos de cada pet renderizados durante um lote de tutores: um pet com
+vários tutores no lote é renderizado uma vez e só os campos do tutor mudam por
+email. Os serviços limpam os blocos ao fim de cada lote.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Hashable, Optional, Tuple
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from app import config
+
+TEMPLATE_DIR = Path(__file__).parent / "templates"
+
+
+def _bytecode_cache() -> FileSystemBytecodeCache:
+    if config.EMAIL_TEMPLATE_CACHE_DIR:
+        cache_dir = Path(config.EMAIL_TEMPLATE_CACHE_DIR)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        return FileSystemBytecodeCache(str(cache_dir))
+    # Pasta temporária do usuário do sistema
+    return FileSystemBytecodeCache()
+
+
+# Environment compartilhado; fora de desenvolvimento os arquivos não são verificados a cada uso
+email_environment = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    bytecode_cache=_bytecode_cache(),
+    auto_reload=config.IS_DEVELOPMENT,
+)
+
+
+class EmailRenderer:
+    """Renderiza emails e reaproveita blocos já renderizados durante um lote"""
+
+    def __init__(self, environment: Optional[Environment] = None):
+        self.environment = environment or email_environment
+        self._sections: Dict[Tuple[str, Hashable], str] = {}
+
+        # Métricas
+        self.sections_rendered = 0
+        self.sections_reused = 0
+
+    def clear(self) -> None:
+        """Descarta os blocos guardados (fim do lote, ou os dados podem ter mudado)"""
+        self._sections.clear()
+
+    def render(self, template_name: str, **context: Any) -> str:
+        return self.environment.get_template(template_name).render(**context)
+
+    def render_section(self, template_name: str, key: Optional[Hashable], **context: Any) -> str:
+        """
+        Renderiza um bloco identificado por `key` (ex: ID do pet) uma única vez.
+        Sem `key`, o bloco é sempre renderizado.
+        """
+        if key is None:
+            return self.render(template_name, **context)
+
+        cache_key = (template_name, key)
+        section = self._sections.get(cache_key)
+        if section is None:
+            section = self._sections[cache_key] = self.render(template_name, **context)
+            self.sections_rendered += 1
+        else:
+            self.sections_reused += 1
+        return section
+
+    def metrics(self) -> Dict[str, Any]:
+        """Métricas de reaproveitamento dos blocos"""
+        return {
+            "sections_rendered": self.sections_rendered,
+            "sections_reused": self.sections_reused,
+        }
@@ -0,0 +1,197 @@
+"""
+Service para exportação do histórico de tratamentos (CSV, NDJSON e PDF)
+"""
+
+import csv
+import io
+import json
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.repositories import PetRepository
+
+logger = logging.getLogger(__name__)
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "pdf": "application/pdf",
+}
+
+EXPORT_COLUMNS = (
+    "pet_id",
+    "pet_name",
+    "id",
+    "category",
+    "name",
+    "description",
+    "date",
+    "time",
+    "done",
+    "recurrence_rule",
+    "series_id",
+    "applier_type",
+    "applier_name",
+)
+
+# Linhas acumuladas antes de enviar um pedaço da resposta
+EXPORT_CHUNK_ROWS = 200
+
+# Layout do PDF (A4 em pontos, fonte Helvetica padrão)
+PDF_PAGE_WIDTH = 595
+PDF_PAGE_HEIGHT = 842
+PDF_MARGIN = 50
+PDF_FONT_SIZE = 9
+PDF_LINE_HEIGHT = 13
+PDF_LINES_PER_PAGE = (PDF_PAGE_HEIGHT - 2 * PDF_MARGIN) // PDF_LINE_HEIGHT - 2
+PDF_MAX_LINE_CHARS = 110
+
+
+def _pdf_escape(text: str) -> bytes:
+    """Codifica o texto em WinAnsi (cp1252) e escapa os delimitadores de string do PDF"""
+    encoded = text.encode("cp1252", errors="replace")
+    return encoded.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def build_pdf(title: str, lines: List[str]) -> bytes:
+    """
+    Gera um PDF paginado somente com texto (sem dependências externas).
+    Cada página recebe o título, o número da página e até PDF_LINES_PER_PAGE linhas.
+    Função síncrona e custosa: deve rodar fora do event loop.
+    """
+    pages = [lines[i:i + PDF_LINES_PER_PAGE] for i in range(0, len(lines), PDF_LINES_PER_PAGE)] or [[]]
+    total_pages = len(pages)
+    
+    # Objetos: 1 catálogo, 2 árvore de páginas, 3 fonte, depois (página, conteúdo) por página
+    objects: List[bytes] = [b"", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    page_refs = []
+    for number, page_lines in enumerate(pages, 1):
+        header = f"{title} - página {number}/{total_pages}"
+        stream = io.BytesIO()
+        stream.write(b"BT\n/F1 %d Tf\n%d TL\n%d %d Td\n" % (
+            PDF_FONT_SIZE, PDF_LINE_HEIGHT, PDF_MARGIN, PDF_PAGE_HEIGHT - PDF_MARGIN
+        ))
+        stream.write(b"(" + _pdf_escape(header) + b") Tj T*\nT*\n")
+        for line in page_lines:
+            stream.write(b"(" + _pdf_escape(line[:PDF_MAX_LINE_CHARS]) + b") Tj T*\n")
+        stream.write(b"ET")
+        content = stream.getvalue()
+        
+        content_number = len(objects) + 2
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % (PDF_PAGE_WIDTH, PDF_PAGE_HEIGHT, content_number)
+        )
+        page_refs.append(b"%d 0 R" % (len(objects)))
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+    
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(page_refs) + b"] /Count %d >>" % total_pages
+    
+    output = io.BytesIO()
+    output.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(output.tell())
+        output.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    
+    xref_offset = output.tell()
+    output.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        output.write(b"%010d 00000 n \n" % offset)
+    output.write(
+        b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    )
+    return output.getvalue()
+
+
+def format_pdf_line(row: Dict[str, Any]) -> str:
+    """Formata um tratamento como linha do relatório em PDF"""
+    status = "Concluído" if row.get("done") else "Pendente"
+    when = row.get("date") or ""
+    if row.get("time"):
+        when += f" {row['time']}"
+    line = f"{when} | {row.get('category')} | {row.get('name')} | {status}"
+    if row.get("applier_name"):
+        line += f" | {row['applier_name']}"
+    if row.get("recurrence_rule"):
+        line += f" | Recorrente ({row['recurrence_rule']})"
+    return line
+
+
+class ExportService:
+    """Serviço para exportar o histórico de tratamentos de um pet ou de um tutor"""
+    
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.pet_repo = PetRepository(session)
+    
+    async def resolve_pet_ids(self, user_id: str, pet_id: Optional[str] = None) -> List[str]:
+        """
+        Retorna os pets a exportar: o pet informado (se o usuário tiver acesso)
+        ou todos os pets da conta do usuário.
+        """
+        if pet_id:
+            return await self.pet_repo.get_accessible_pet_ids([pet_id], user_id)
+        return await self.pet_repo.get_user_pet_ids(user_id)
+    
+    async def stream_csv(self, pet_ids: List[str]) -> AsyncIterator[bytes]:
+        """Gera o CSV em pedaços a partir do cursor, sem carregar o histórico inteiro"""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        
+        rows = 0
+        async for row in self.pet_repo.stream_treatment_history(pet_ids):
+            writer.writerow(row)
+            rows += 1
+            if rows % EXPORT_CHUNK_ROWS == 0:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+        
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+    
+    async def stream_ndjson(self, pet_ids: List[str]) -> AsyncIterator[bytes]:
+        """Gera um objeto JSON por linha (NDJSON) a partir do cursor"""
+        chunk: List[str] = []
+        async for row in self.pet_repo.stream_treatment_history(pet_ids):
+            chunk.append(json.dumps(row, ensure_ascii=False, default=str))
+            if len(chunk) >= EXPORT_CHUNK_ROWS:
+                yield ("\n".join(chunk) + "\n").encode("utf-8")
+                chunk = []
+        
+        if chunk:
+            yield ("\n".join(chunk) + "\n").encode("utf-8")
+    
+    async def export_pdf(self, pet_ids: List[str], title: str) -> bytes:
+        """
+        Monta o PDF paginado. A consulta usa o mesmo cursor dos formatos em stream;
+        apenas as linhas de texto ficam em memória e a geração roda no threadpool.
+        """
+        lines: List[str] = []
+        current_pet = None
+        async for row in self.pet_repo.stream_treatment_history(pet_ids):
+            if row["pet_id"] != current_pet:
+                if current_pet is not None:
+                    lines.append("")
+                lines.append(f"Pet: {row['pet_name']}")
+                current_pet = row["pet_id"]
+            lines.append(format_pdf_line(row))
+        
+        if not lines:
+            lines.append("Nenhum tratamento registrado.")
+        
+        generated_at = datetime.now().strftime("%d/%m/%Y %H:%M")
+        return await run_in_threadpool(build_pdf, f"{title} ({generated_at})", lines)
+    
+    @staticmethod
+    def build_filename(label: str, export_format: str) -> Tuple[str, str]:
+        """Retorna (nome do arquivo, media type) para o download"""
+        safe_label = "".join(c if c.isalnum() or c in "-_" else "_" for c in label) or "historico"
+        date_str = datetime.now().strftime("%Y%m%d")
+        return f"historico_{safe_label}_{date_str}.{export_format}", EXPORT_MEDIA_TYPES[export_format]
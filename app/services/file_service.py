@@ -1,14 +1,27 @@
+import os
+import json
 import uuid
 import shutil
+import hashlib
+import aiofiles
 from pathlib import Path
-from PIL import Image
-import io
-from typing import Dict, Tuple, Optional
+from typing import Any, Awaitable, Callable, Dict, Tuple, Optional
 from fastapi import UploadFile, HTTPException
+from app import config
+from app.services.image_executor import image_executor, ImageExecutorBusy
+from app.services.storage import StorageBackend, LocalStorage, S3Storage
+from app.services.variant_cache import variant_cache
+from app.services.image_processing import (
+    create_image_variants,
+    render_variant,
+    available_variant_formats,
+    VARIANT_WIDTHS,
+)
 
 # File upload configuration
 UPLOAD_DIR = Path("uploads")
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+UPLOAD_CHUNK_SIZE = 256 * 1024  # 256KB lidos por vez do upload
 
 # Extensões permitidas baseadas no suporte disponível
 BASE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
@@ -16,6 +29,50 @@ ALLOWED_EXTENSIONS = BASE_EXTENSIONS
 
 THUMBNAIL_SIZE = (300, 300)
 
+# Armazenamento endereçado por conteúdo: objects/{hash[:2]}/{hash}/ no storage
+OBJECTS_DIR = "objects"
+THUMBNAIL_NAME = "thumb.jpg"
+PHOTO_MANIFEST = "photo.json"
+
+# Caracteres do hash em `?v=`; prefixos menores não garantem cache imutável
+PHOTO_VERSION_LENGTH = 16
+
+# Formatos modernos gerados para `srcset` (AVIF apenas se o Pillow suportar)
+VARIANT_FORMATS = available_variant_formats()
+
+# Formatos aceitos pelas variantes sob demanda (/img)
+RENDER_FORMATS = ("jpg",) + VARIANT_FORMATS
+
+
+_remote_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """
+    Backend de armazenamento configurado (STORAGE_BACKEND).
+    O backend local é criado a cada chamada para sempre refletir UPLOAD_DIR.
+    """
+    global _remote_storage
+    if config.STORAGE_BACKEND == "s3":
+        if _remote_storage is None:
+            _remote_storage = S3Storage(
+                bucket=config.S3_BUCKET,
+                endpoint_url=config.S3_ENDPOINT_URL,
+                region=config.S3_REGION,
+                access_key_id=config.S3_ACCESS_KEY_ID,
+                secret_access_key=config.S3_SECRET_ACCESS_KEY,
+                public_url=config.S3_PUBLIC_URL,
+                url_expires=config.S3_URL_EXPIRES,
+            )
+        return _remote_storage
+    if config.STORAGE_BACKEND == "local":
+        return LocalStorage(UPLOAD_DIR)
+    raise ValueError(f"STORAGE_BACKEND desconhecido: {config.STORAGE_BACKEND!r}")
+
+
+class FileTooLargeError(Exception):
+    """Upload excedeu MAX_FILE_SIZE durante a transferência"""
+
 
 class FileService:
     """Serviço para gerenciar arquivos e imagens"""
@@ -45,146 +102,251 @@ class FileService:
         if file_ext in [".heic", ".heif"]:
             return False, "Arquivos HEIC não são suportados. Use JPG, PNG, GIF ou WebP."
 
-        # Verifica tamanho
-        if file.size and file.size > MAX_FILE_SIZE:
+        # Verifica tamanho (bytes contados pelo parser; o corpo já foi limitado pelo
+        # UploadLimitMiddleware e a cópia em stream_upload_to_file confere de novo)
+        if file.size is not None and file.size > MAX_FILE_SIZE:
             max_size_mb = MAX_FILE_SIZE // (1024 * 1024)
             return False, f"Arquivo muito grande. Tamanho máximo: {max_size_mb}MB"
 
         return True, ""
     
     @staticmethod
-    def save_image_with_thumbnail(file: UploadFile, pet_id: str) -> Dict[str, str]:
+    async def stream_upload_to_file(
+        file: UploadFile,
+        destination: Path,
+        max_size: int = MAX_FILE_SIZE,
+    ) -> Tuple[int, str]:
         """
-        Salva a imagem original e cria uma miniatura.
-        Retorna um dicionário com os caminhos dos arquivos.
+        Copia o upload para `destination` em blocos de UPLOAD_CHUNK_SIZE,
+        calculando o SHA-256 do conteúdo durante a cópia.
+        O limite de tamanho é verificado a cada bloco e a cópia é abortada assim
+        que ultrapassado (FileTooLargeError), sem depender de `file.size`.
+        Isso limita só a cópia: o corpo recebido do cliente é limitado antes, pelo
+        UploadLimitMiddleware, enquanto chega.
+        Grava em um arquivo `.part` e renomeia ao final, então `destination`
+        nunca fica com conteúdo parcial. Retorna (bytes gravados, hash hexadecimal).
         """
-        # Gera nome único para o arquivo
+        partial_path = destination.with_name(destination.name + ".part")
+        digest = hashlib.sha256()
+        written = 0
+        try:
+            async with aiofiles.open(partial_path, "wb") as out:
+                while True:
+                    chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    written += len(chunk)
+                    if written > max_size:
+                        raise FileTooLargeError(
+                            f"Arquivo muito grande. Tamanho máximo: {max_size // (1024 * 1024)}MB"
+                        )
+                    digest.update(chunk)
+                    await out.write(chunk)
+            os.replace(partial_path, destination)
+            return written, digest.hexdigest()
+        finally:
+            if partial_path.exists():
+                partial_path.unlink()
+    
+    @staticmethod
+    def photo_object_key(content_hash: str) -> str:
+        """Chave do objeto de foto endereçado pelo hash do conteúdo"""
+        return f"{OBJECTS_DIR}/{content_hash[:2]}/{content_hash}"
+    
+    @staticmethod
+    async def save_image_with_thumbnail(
+        file: UploadFile,
+        reserve: Optional[Callable[[str], Awaitable[None]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Salva a imagem no armazenamento endereçado por conteúdo e gera miniatura
+        e variantes responsivas no ImageExecutor, fora do event loop.
+        
+        A chave do objeto é `objects/{hash[:2]}/{hash}`: a mesma foto enviada de novo
+        (ou usada por outro pet) reaproveita o objeto existente, sem reprocessar
+        nem ocupar espaço extra. O processamento acontece em uma pasta local
+        temporária, publicada no backend de armazenamento ao final.
+        `reserve(hash)` é chamado antes de consultar o objeto existente, para que
+        uma liberação concorrente da mesma foto não o remova antes do commit
+        (PetService.reserve_photo).
+        Retorna os metadados da foto (gravados em Pet.photo).
+        """
+        storage = get_storage()
         file_ext = Path(file.filename).suffix.lower()
-        unique_filename = f"{pet_id}_{uuid.uuid4().hex}{file_ext}"
-
-        # Cria diretório específico para o pet
-        pet_upload_dir = UPLOAD_DIR / pet_id
-        pet_upload_dir.mkdir(exist_ok=True)
-
-        # Caminhos dos arquivos
-        original_path = pet_upload_dir / unique_filename
-        thumbnail_path = pet_upload_dir / f"thumb_{unique_filename}"
+        temp_dir = UPLOAD_DIR / "temp"
+        temp_dir.mkdir(parents=True, exist_ok=True)
+        upload_path = temp_dir / f"{uuid.uuid4().hex}{file_ext}"
+        staging_dir = None
 
         try:
-            # Lê o arquivo
-            contents = file.file.read()
-
-            # Salva arquivo original
-            with open(original_path, "wb") as f:
-                f.write(contents)
-
-            # Processa a imagem
-            try:
-                # Abre a imagem com PIL
-                image = Image.open(io.BytesIO(contents))
-
-            except Exception as e:
-                raise Exception(f"Formato de imagem não suportado: {str(e)}")
+            # Salva o upload em blocos, sem carregar em memória, calculando o hash
+            _, content_hash = await FileService.stream_upload_to_file(file, upload_path)
+            if reserve is not None:
+                await reserve(content_hash)
 
-            # Converte para RGB se necessário
-            if image.mode in ("RGBA", "LA", "P"):
-                image = image.convert("RGB")
+            # Foto já armazenada: descarta o upload e reaproveita o objeto
+            key = FileService.photo_object_key(content_hash)
+            existing = await storage.read_json(f"{key}/{PHOTO_MANIFEST}")
+            if existing:
+                upload_path.unlink()
+                return existing
 
-            # Redimensiona mantendo proporção
-            image.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+            staging_dir = temp_dir / f".{content_hash}.{uuid.uuid4().hex}"
+            staging_dir.mkdir()
+            original_name = f"original{file_ext}"
+            os.replace(upload_path, staging_dir / original_name)
 
-            # Salva miniatura
-            image.save(thumbnail_path, "JPEG", quality=85, optimize=True)
+            processed = await image_executor.run(
+                create_image_variants,
+                str(staging_dir / original_name),
+                str(staging_dir / THUMBNAIL_NAME),
+                THUMBNAIL_SIZE,
+                VARIANT_WIDTHS,
+                VARIANT_FORMATS,
+            )
 
-            return {
-                "original": str(original_path),
-                "thumbnail": str(thumbnail_path),
-                "filename": unique_filename,
+            photo = {
+                "hash": content_hash,
+                "key": key,
+                "original": f"{key}/{original_name}",
+                "thumbnail": f"{key}/{THUMBNAIL_NAME}",
+                "filename": original_name,
+                "width": processed["width"],
+                "height": processed["height"],
+                "variants": processed["variants"],
             }
+            with open(staging_dir / PHOTO_MANIFEST, "w", encoding="utf-8") as f:
+                json.dump(photo, f)
+
+            # Se um upload concorrente da mesma foto publicou primeiro, o resultado é o mesmo
+            await storage.publish_dir(staging_dir, key)
+            staging_dir = None
+            return photo
 
+        except FileTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except ImageExecutorBusy:
+            raise HTTPException(
+                status_code=503,
+                detail="Servidor ocupado processando imagens. Tente novamente em instantes.",
+                headers={"Retry-After": "5"},
+            )
         except Exception as e:
-            # Remove arquivos em caso de erro
-            if original_path.exists():
-                original_path.unlink()
-            if thumbnail_path.exists():
-                thumbnail_path.unlink()
             raise HTTPException(
                 status_code=400, detail=f"Erro ao processar imagem: {str(e)}"
             )
+        finally:
+            # Remove arquivos parcialmente gravados em caso de erro
+            if upload_path.exists():
+                upload_path.unlink()
+            if staging_dir is not None and staging_dir.exists():
+                shutil.rmtree(staging_dir, ignore_errors=True)
     
     @staticmethod
-    def delete_pet_images(pet_id: str) -> bool:
+    async def delete_photo_object(content_hash: str) -> bool:
         """
-        Remove todas as imagens de um pet.
-        Retorna True se removeu com sucesso
+        Remove o objeto de foto (original, miniatura e variantes).
+        Deve ser chamado apenas quando nenhum pet referencia mais o hash.
         """
         try:
-            pet_upload_dir = UPLOAD_DIR / pet_id
-            if pet_upload_dir.exists():
-                shutil.rmtree(pet_upload_dir)
+            await get_storage().delete_prefix(FileService.photo_object_key(content_hash))
             return True
         except Exception as e:
-            print(f"Erro ao remover imagens do pet {pet_id}: {e}")
+            print(f"Erro ao remover objeto de foto {content_hash}: {e}")
             return False
     
     @staticmethod
-    def move_temp_image_to_pet_folder(photo_data: Dict[str, str], pet_id: str) -> Optional[Dict[str, str]]:
+    def photo_file_url(pet_id: str, photo: Dict[str, Any], name: str) -> str:
+        """URL de um arquivo da foto: objeto no storage ou pasta antiga do pet"""
+        if photo.get("key"):
+            return get_storage().url(f"{photo['key']}/{name}")
+        return f"/uploads/{pet_id}/{name}"
+    
+    @staticmethod
+    def photo_url(pet_id: str, photo: Optional[Dict[str, Any]], kind: str = "thumbnail") -> str:
+        """URL da miniatura (padrão) ou do original da foto do pet"""
+        if not photo:
+            return ""
+        if kind != "thumbnail":
+            name = photo["filename"]
+        elif photo.get("key"):
+            name = THUMBNAIL_NAME
+        else:
+            name = f"thumb_{photo['filename']}"
+        return FileService.photo_file_url(pet_id, photo, name)
+    
+    @staticmethod
+    def photo_sources(pet_id: str, photo: Optional[Dict]) -> Dict[str, str]:
         """
-        Move arquivos da pasta temporária para a pasta correta do pet
-        Retorna os novos caminhos ou None em caso de erro
+        Monta os `srcset` por formato para uso em <picture>/<source> nos templates.
+        Retorna {} para fotos antigas, que só possuem original e miniatura.
         """
-        if not photo_data or not photo_data.get("original"):
-            return None
-            
-        try:
-            temp_original_path = Path(photo_data["original"])
-            temp_thumbnail_path = Path(photo_data["thumbnail"])
-
-            if temp_original_path.exists():
-                # Cria diretório do pet
-                pet_dir = UPLOAD_DIR / pet_id
-                pet_dir.mkdir(exist_ok=True)
-
-                # Paths finais
-                final_original_path = pet_dir / temp_original_path.name
-                final_thumbnail_path = pet_dir / temp_thumbnail_path.name
-
-                # Move arquivo original
-                shutil.move(str(temp_original_path), str(final_original_path))
-
-                # Move thumbnail se existir
-                if temp_thumbnail_path.exists():
-                    shutil.move(str(temp_thumbnail_path), str(final_thumbnail_path))
-
-                # Retorna novos caminhos
-                return {
-                    "original": str(final_original_path),
-                    "thumbnail": str(final_thumbnail_path),
-                    "filename": photo_data.get("filename", temp_original_path.name)
-                }
-            
-            return None
-        except Exception as e:
-            print(f"Erro ao mover imagem: {e}")
-            return None
+        if not photo or not photo.get("variants"):
+            return {}
+        
+        sources = {}
+        for fmt, by_width in photo["variants"].items():
+            entries = sorted(by_width.items(), key=lambda item: int(item[0]))
+            sources[fmt] = ", ".join(
+                f"{FileService.photo_file_url(pet_id, photo, filename)} {width}w"
+                for width, filename in entries
+            )
+        return sources
+    
+    @staticmethod
+    def photo_variant_url(pet_id: str, photo: Optional[Dict[str, Any]], width: int, height: int, fmt: str = "jpg") -> str:
+        """
+        URL da variante sob demanda no tamanho exato renderizado (/img).
+        Fotos endereçadas por conteúdo levam `?v=` com o hash, permitindo cache imutável.
+        """
+        if not photo:
+            return ""
+        url = f"/img/{pet_id}/{width}x{height}.{fmt}"
+        if photo.get("hash"):
+            url += f"?v={photo['hash'][:PHOTO_VERSION_LENGTH]}"
+        return url
     
     @staticmethod
-    def cleanup_temp_images():
+    async def render_photo_variant(pet_id: str, photo: Dict[str, Any], size: Tuple[int, int], fmt: str) -> Path:
         """
-        Remove imagens temporárias antigas (pasta temp).
+        Caminho local da variante `size`/`fmt` da foto, gerada na primeira
+        requisição a partir do original e servida do cache em disco depois.
+        """
+        name = f"{size[0]}x{size[1]}.{fmt}"
+        if photo.get("hash"):
+            cache_key = f"{photo['hash'][:2]}/{photo['hash']}/{name}"
+        else:
+            cache_key = f"legacy/{pet_id}/{Path(photo['filename']).stem}_{name}"
+
+        async def produce(target: Path) -> None:
+            download = None
+            if photo.get("key"):
+                download = UPLOAD_DIR / "temp" / f"{uuid.uuid4().hex}{Path(photo['original']).suffix}"
+                download.parent.mkdir(parents=True, exist_ok=True)
+                source = await get_storage().fetch_file(photo["original"], download)
+            else:
+                source = UPLOAD_DIR / pet_id / Path(photo["original"]).name
+                if not source.is_file():
+                    raise FileNotFoundError(str(source))
+            try:
+                await image_executor.run(render_variant, str(source), str(target), size, fmt)
+            finally:
+                if download is not None and download.exists():
+                    download.unlink()
+
+        return await variant_cache.get_or_create(cache_key, produce)
+    
+    @staticmethod
+    def delete_pet_images(pet_id: str) -> bool:
+        """
+        Remove todas as imagens de um pet.
+        Retorna True se removeu com sucesso
         """
         try:
-            temp_dir = UPLOAD_DIR / "temp"
-            if temp_dir.exists():
-                # Remove arquivos mais antigos que 1 hora
-                import time
-
-                current_time = time.time()
-                for file_path in temp_dir.glob("*"):
-                    if file_path.is_file():
-                        file_age = current_time - file_path.stat().st_mtime
-                        if file_age > 3600:  # 1 hora em segundos
-                            file_path.unlink()
-                            print(f"Removido arquivo temporário antigo: {file_path}")
+            pet_upload_dir = UPLOAD_DIR / pet_id
+            if pet_upload_dir.exists():
+                shutil.rmtree(pet_upload_dir)
+            return True
         except Exception as e:
-            print(f"Erro ao limpar arquivos temporários: {e}")
+            print(f"Erro ao remover imagens do pet {pet_id}: {e}")
+            return False
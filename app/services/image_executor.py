@@ -0,0 +1,130 @@
+"""
+Executor de processamento de imagens em um pool de processos limitado.
+
+Decodificação, redimensionamento e codificação de imagens são operações de CPU
+que bloqueariam o event loop. O executor envia esse trabalho para processos
+separados, limita quantas tarefas podem aguardar na fila (backpressure) e
+mantém métricas de profundidade de fila e tempo de processamento.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Configuração (variáveis de ambiente)
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+IMAGE_QUEUE_SIZE = int(os.getenv("IMAGE_QUEUE_SIZE", "8"))
+IMAGE_QUEUE_TIMEOUT = float(os.getenv("IMAGE_QUEUE_TIMEOUT", "5"))
+
+
+class ImageExecutorBusy(Exception):
+    """Fila de processamento de imagens cheia"""
+
+
+class ImageExecutor:
+    """Pool de processos para tarefas de imagem com fila limitada e métricas"""
+    
+    def __init__(
+        self,
+        max_workers: int = IMAGE_WORKERS,
+        max_queue: int = IMAGE_QUEUE_SIZE,
+        queue_timeout: float = IMAGE_QUEUE_TIMEOUT,
+    ):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        
+        # Métricas
+        self._waiting = 0
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._total_seconds = 0.0
+        self._max_seconds = 0.0
+    
+    @property
+    def started(self) -> bool:
+        return self._pool is not None
+    
+    def start(self) -> None:
+        """Inicia o pool de processos (chamado no lifespan da aplicação)"""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            self._slots = None
+            logger.info(f"Image executor started with {self.max_workers} workers")
+    
+    def shutdown(self, wait: bool = True) -> None:
+        """Encerra o pool aguardando as tarefas em andamento"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=not wait)
+            self._pool = None
+            self._slots = None
+            logger.info("Image executor stopped")
+    
+    def _get_slots(self) -> asyncio.Semaphore:
+        # Criado sob demanda para pertencer ao event loop em execução
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers + self.max_queue)
+        return self._slots
+    
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Executa `func(*args)` fora do event loop.
+        Aguarda no máximo `queue_timeout` segundos por uma vaga; se a fila continuar
+        cheia, levanta ImageExecutorBusy. Sem pool iniciado (ex: testes, scripts),
+        usa o threadpool padrão do loop.
+        """
+        slots = self._get_slots()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._rejected += 1
+            raise ImageExecutorBusy("Fila de processamento de imagens cheia")
+        finally:
+            self._waiting -= 1
+        
+        self._in_flight += 1
+        started_at = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._pool, func, *args)
+            self._completed += 1
+            return result
+        except Exception:
+            self._failed += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started_at
+            self._total_seconds += elapsed
+            self._max_seconds = max(self._max_seconds, elapsed)
+            self._in_flight -= 1
+            slots.release()
+    
+    def metrics(self) -> Dict[str, Any]:
+        """Métricas de fila e tempo de processamento"""
+        finished = self._completed + self._failed
+        return {
+            "started": self.started,
+            "workers": self.max_workers,
+            "queue_capacity": self.max_queue,
+            "queue_depth": self._waiting + max(self._in_flight - self.max_workers, 0),
+            "in_flight": self._in_flight,
+            "completed": self._completed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+            "avg_processing_ms": round(self._total_seconds / finished * 1000, 2) if finished else 0.0,
+            "max_processing_ms": round(self._max_seconds * 1000, 2),
+        }
+
+
+# Instância compartilhada pela aplicação
+image_executor = ImageExecutor()
@@ -0,0 +1,165 @@
+"""
+Funções de processamento de imagens (decodificação, redimensionamento e codificação).
+
+São funções puras de módulo, sem estado da aplicação, para poderem ser
+executadas nos processos do ImageExecutor.
+"""
+
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from PIL import Image, ImageOps, features
+
+# Larguras geradas para `srcset` (nunca maiores que a imagem original)
+VARIANT_WIDTHS = (160, 320, 640, 1280)
+
+# Redução inteira (box) antes do LANCZOS enquanto a imagem for maior que 2x o destino
+REDUCING_GAP = 2.0
+
+# Parâmetros de codificação por formato
+VARIANT_SAVE_OPTIONS = {
+    "avif": {"format": "AVIF", "quality": 55, "speed": 8},
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+}
+
+
+def available_variant_formats() -> Tuple[str, ...]:
+    """Formatos modernos suportados pelo Pillow instalado (AVIF é opcional)"""
+    formats = []
+    if features.check("avif"):
+        formats.append("avif")
+    if features.check("webp"):
+        formats.append("webp")
+    return tuple(formats)
+
+
+def _open_image(
+    source_path: str,
+    decode_size: Optional[Callable[[Tuple[int, int]], Tuple[int, int]]] = None,
+) -> Tuple[Image.Image, Tuple[int, int]]:
+    """
+    Abre e decodifica a imagem. Com `decode_size` (tamanho original -> tamanho
+    mínimo necessário), JPEGs são decodificados direto em escala reduzida
+    (1/2, 1/4 ou 1/8) via `Image.draft`, sem ficar menores que o pedido.
+    Retorna a imagem e as dimensões do arquivo original.
+    """
+    try:
+        image = Image.open(source_path)
+        original_size = image.size
+        if decode_size:
+            image.draft(image.mode, decode_size(original_size))
+        image.load()
+    except Exception as e:
+        raise ValueError(f"Formato de imagem não suportado: {str(e)}")
+    return image, original_size
+
+
+def _fit_size(size: Tuple[int, int], box: Tuple[int, int]) -> Tuple[int, int]:
+    """Dimensões de `size` reduzidas proporcionalmente para caber em `box`"""
+    width, height = size
+    scale = min(box[0] / width, box[1] / height, 1.0)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _save_thumbnail(image: Image.Image, thumbnail_path: str, size: Tuple[int, int]) -> None:
+    thumb = image.convert("RGB") if image.mode != "RGB" else image.copy()
+
+    # Redimensiona mantendo proporção: redução inteira barata (reduce) até ~2x
+    # o tamanho final e LANCZOS apenas no último passo
+    thumb.thumbnail(size, Image.Resampling.LANCZOS, reducing_gap=REDUCING_GAP)
+
+    # Salva miniatura
+    thumb.save(thumbnail_path, "JPEG", quality=85, optimize=True)
+
+
+def create_thumbnail(source_path: str, thumbnail_path: str, size: Tuple[int, int]) -> Tuple[int, int]:
+    """
+    Gera a miniatura JPEG da imagem em `source_path`.
+    Retorna as dimensões (largura, altura) da imagem original.
+    """
+    image, original_size = _open_image(source_path, lambda original: _fit_size(original, size))
+    _save_thumbnail(image, thumbnail_path, size)
+    return original_size
+
+
+def create_image_variants(
+    source_path: str,
+    thumbnail_path: str,
+    thumbnail_size: Tuple[int, int],
+    widths: Iterable[int] = VARIANT_WIDTHS,
+    formats: Iterable[str] = ("webp",),
+    draft: bool = True,
+) -> Dict[str, object]:
+    """
+    Decodifica a imagem uma única vez e gera a miniatura JPEG e as variantes
+    responsivas (`{nome}_{largura}.{formato}`) na mesma pasta do original.
+    Com `draft`, JPEGs grandes são decodificados já reduzidos para perto da
+    maior saída (ver benchmark_images.py).
+    Retorna {"width", "height", "variants": {formato: {largura: nome_do_arquivo}}}.
+    """
+    widths = tuple(widths)
+
+    def decode_size(original: Tuple[int, int]) -> Tuple[int, int]:
+        # Menor resolução de decodificação que ainda atende a maior variante e a miniatura
+        largest = _fit_size(original, (max(widths), original[1]))
+        thumb = _fit_size(original, thumbnail_size)
+        return max(largest[0], thumb[0]), max(largest[1], thumb[1])
+
+    image, (width, height) = _open_image(source_path, decode_size if draft else None)
+    _save_thumbnail(image, thumbnail_path, thumbnail_size)
+
+    # Mantém transparência apenas quando existe; demais modos viram RGB
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    base = image.convert("RGBA" if has_alpha else "RGB")
+
+    source = Path(source_path)
+    target_widths = sorted({w for w in widths if w < width} | {min(max(widths), width)}, reverse=True)
+
+    variants: Dict[str, Dict[str, str]] = {fmt: {} for fmt in formats}
+    current = base
+    for target_width in target_widths:
+        target_height = max(1, round(height * target_width / width))
+        # Reduz a partir da variante anterior (maior), mais barato que partir do original
+        if current.size != (target_width, target_height):
+            current = current.resize(
+                (target_width, target_height), Image.Resampling.LANCZOS, reducing_gap=REDUCING_GAP
+            )
+        for fmt in formats:
+            options = dict(VARIANT_SAVE_OPTIONS[fmt])
+            filename = f"{source.stem}_{target_width}.{fmt}"
+            current.save(source.with_name(filename), options.pop("format"), **options)
+            variants[fmt][str(target_width)] = filename
+
+    return {"width": width, "height": height, "variants": variants}
+
+
+# Parâmetros de codificação das variantes sob demanda (/img), por extensão
+RENDER_SAVE_OPTIONS = {
+    "jpg": {"format": "JPEG", "quality": 85, "optimize": True},
+    **VARIANT_SAVE_OPTIONS,
+}
+
+
+def render_variant(source_path: str, target_path: str, size: Tuple[int, int], fmt: str) -> None:
+    """
+    Gera uma variante com exatamente `size` (recorte central, como object-fit: cover)
+    no formato `fmt` (jpg, webp ou avif). Usa decodificação reduzida para JPEGs.
+    """
+    def decode_size(original: Tuple[int, int]) -> Tuple[int, int]:
+        # Cobrir a caixa inteira: a menor escala que preenche as duas dimensões
+        scale = min(max(size[0] / original[0], size[1] / original[1]), 1.0)
+        return max(1, round(original[0] * scale)), max(1, round(original[1] * scale))
+
+    image, _ = _open_image(source_path, decode_size)
+    has_alpha = fmt != "jpg" and (
+        image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    )
+    image = image.convert("RGBA" if has_alpha else "RGB")
+
+    # Redução inteira barata até ~2x o destino; recorte e LANCZOS no passo final
+    factor = int(min(image.width / size[0], image.height / size[1]) / REDUCING_GAP)
+    if factor > 1:
+        image = image.reduce(factor)
+    image = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+
+    options = dict(RENDER_SAVE_OPTIONS[fmt])
+    image.save(target_path, options.pop("format"), **options)
@@ -0,0 +1,516 @@
+"""
+Execução assíncrona das tasks diária e mensal, em lotes e com checkpoints.
+
+Os tutores (destinatários) são processados em lotes de JOB_CHUNK_SIZE, em ordem
+estável. Cada lote é renderizado, gravado na fila de emails e registrado como
+checkpoint na mesma transação (tabela job_runs). Se a execução cair, a próxima
+execução para a mesma data de referência continua do último checkpoint. Os
+emails de cada lote são enviados logo após o checkpoint, com as conexões SMTP
+reaproveitadas entre os lotes. O progresso é emitido por lote para um callback
+opcional, e o resumo final é um dicionário serializável em JSON.
+
+Tasks com `stream` (relatório mensal) leem os tutores em fluxo, já agrupados e
+ordenados pela consulta, em vez de carregar todos os dados antes do primeiro
+lote: a memória fica limitada ao lote e os primeiros emails saem em segundos.
+
+Com JOB_SHARDS > 1, os tutores são divididos em shards pelo hash do email e cada
+shard é uma execução própria em job_runs, reservada por um worker (owner + lease
+renovada a cada lote). Vários processos ou máquinas rodando a mesma task dividem
+os shards entre si; um shard de um worker que caiu volta a ficar disponível
+quando a reserva expira. Checkpoint e conclusão só são gravados pelo dono da
+reserva: um worker cuja reserva expirou e foi assumida por outro descarta o lote
+em andamento e abandona o shard. Todos os workers devem usar o mesmo número de shards.
+"""
+
+import copy
+import logging
+import os
+import socket
+import time
+from datetime import date, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app import config
+from app.database.connection import AsyncSessionLocal
+from app.repositories import EmailOutboxRepository, JobRunRepository
+from app.repositories.pet_repository import shard_of
+from app.services.email_outbox_service import EmailOutboxService
+from app.services.monthly_report_service import MonthlyReportService
+from app.services.notification_service import NotificationService
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+
+def _records_without_totals(service: Any, tutor_groups: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[str], Dict[str, int]]:
+    records, errors = service.build_outbox_records(tutor_groups)
+    return records, errors, {}
+
+
+class JobSpec(NamedTuple):
+    """
+    Uma task agendada: serviço, busca dos dados e execução simulada (dry-run).
+    Tasks com `fetch_range` aceitam recuperação de um intervalo de datas (catch-up).
+    Tasks com `stream` leem os tutores agrupados em ordem de chave, a partir de uma
+    chave (checkpoint) e só os do shard informado (filtro na consulta), sem buscar tudo antes.
+    `build_records` renderiza um lote para a fila e devolve os totais somados às
+    estatísticas da execução; roda em uma thread, então não pode usar a sessão.
+    """
+    name: str
+    service_factory: Callable[..., Any]
+    fetch: Callable[[Any], Awaitable[Tuple[bool, List[Dict[str, Any]], str]]]
+    dry_run: Callable[[Any], Awaitable[Dict[str, Any]]]
+    fetch_range: Optional[Callable[[Any, date, date], Awaitable[Tuple[bool, Dict[date, List[Dict[str, Any]]], str]]]] = None
+    stream: Optional[Callable[[Any, Optional[str], int, int], AsyncIterator[Dict[str, Any]]]] = None
+    build_records: Callable[
+        [Any, List[Dict[str, Any]]], Tuple[List[Dict[str, Any]], List[str], Dict[str, int]]
+    ] = _records_without_totals
+
+
+DAILY_JOB = JobSpec(
+    "daily",
+    NotificationService,
+    lambda service: service.get_target_treatments_with_tutors(),
+    lambda service: service.process_daily_notifications(dry_run=True),
+    lambda service, start, end: service.get_treatments_with_tutors_by_date(start, end),
+)
+
+MONTHLY_JOB = JobSpec(
+    "monthly",
+    MonthlyReportService,
+    lambda service: service.get_monthly_treatments_with_tutors(),
+    lambda service: service.process_monthly_reports(dry_run=True),
+    stream=lambda service, after_key, shard, shards: service.iter_tutor_reports(
+        after_key=after_key, shard=shard, shards=shards
+    ),
+    build_records=lambda service, tutor_groups: service.build_outbox_records(tutor_groups),
+)
+
+JOBS = {spec.name: spec for spec in (DAILY_JOB, MONTHLY_JOB)}
+
+
+async def achunked(items: AsyncIterator[Any], size: int) -> AsyncIterator[List[Any]]:
+    chunk: List[Any] = []
+    async for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def _aiter(items: List[Any]) -> AsyncIterator[Any]:
+    for item in items:
+        yield item
+
+
+def shard_run_key(reference: str, shard: int, shards: int) -> str:
+    """Chave da execução de um shard (sem shards, a própria data de referência)"""
+    return reference if shards <= 1 else f"{reference}#{shard + 1}/{shards}"
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _accumulate(totals: Dict[str, Any], stats: Dict[str, Any]) -> None:
+    for key, value in stats.items():
+        if key == "errors":
+            totals["errors"].extend(value)
+        else:
+            totals[key] = totals.get(key, 0) + value
+
+
+class _Sender:
+    """
+    Envio da fila durante a execução: chamado após o checkpoint de cada lote e no
+    final, com as mesmas conexões SMTP. Uma falha no envio interrompe só o envio;
+    os emails continuam na fila para a próxima execução.
+    """
+
+    def __init__(self, session: AsyncSession, kind: str):
+        self.session = session
+        self.kind = kind
+        self.outbox = EmailOutboxService(session)
+        self.deliveries: List[Dict[str, Any]] = []
+        self.error: Optional[str] = None
+        self.is_valid, self.validation_message = config.validate_gmail_config()
+
+    def transport(self):
+        return self.outbox.transport()
+
+    async def send_ready(self) -> None:
+        """Envia os emails prontos da fila (inclui outros shards e execuções anteriores)"""
+        if not self.is_valid or self.error is not None:
+            return
+        try:
+            self.deliveries.extend(await self.outbox.drain(kind=self.kind))
+        except Exception as e:
+            logger.error(f"Envio da fila de emails interrompido: {e}")
+            await self.session.rollback()
+            self.error = str(e)
+
+    def apply(self, summary: Dict[str, Any]) -> None:
+        if not self.is_valid:
+            # Erros de envio valem só para esta execução (os de renderização ficam no checkpoint)
+            summary["errors"].append(self.validation_message)
+            return
+
+        summary["deliveries"] = self.deliveries
+        for delivery in self.deliveries:
+            if delivery["success"]:
+                summary["emails_sent"] += 1
+            else:
+                summary["errors"].append(delivery["message"])
+        if self.error is not None:
+            summary["success"] = False
+            summary["message"] = f"Erro no envio da fila de emails: {self.error}"
+
+
+class JobRunner:
+    """Executa tasks em lotes com checkpoints, retomando execuções interrompidas"""
+
+    def __init__(
+        self,
+        chunk_size: Optional[int] = None,
+        session_factory=AsyncSessionLocal,
+        progress: Optional[ProgressCallback] = None,
+        shards: Optional[int] = None,
+        worker_id: Optional[str] = None,
+        lease_seconds: Optional[float] = None,
+    ):
+        self.chunk_size = max(1, chunk_size or config.JOB_CHUNK_SIZE)
+        self.shards = max(1, shards or config.JOB_SHARDS)
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds or config.JOB_LEASE_SECONDS
+        self.session_factory = session_factory
+        self.progress = progress
+
+    def _emit(self, event: Dict[str, Any]) -> None:
+        logger.info(f"[{event['job']}] {event['event']}: {event}")
+        if self.progress is not None:
+            self.progress(event)
+
+    async def run(self, spec: JobSpec, dry_run: bool = False, restart: bool = False) -> Dict[str, Any]:
+        """
+        Executa a task. Em dry-run nada é gravado nem enviado (sem checkpoints).
+        Retorna o resumo no mesmo formato dos serviços, mais os dados da execução.
+        """
+        started_at = time.monotonic()
+        async with self.session_factory() as session:
+            service = spec.service_factory(session)
+            if dry_run:
+                result = await spec.dry_run(service)
+            else:
+                # Tasks em fluxo não buscam tudo antes (fetch=None)
+                fetch = None if spec.stream is not None else lambda: spec.fetch(service)
+                sender = _Sender(session, service.OUTBOX_KIND)
+                with sender.transport():
+                    result = await self._enqueue_run(spec, service, session, restart, fetch, sender.send_ready)
+                    if result["success"]:
+                        await sender.send_ready()
+                sender.apply(result)
+                if result["success"]:
+                    result["message"] = self._describe(result)
+
+        return self._finish(spec, result, started_at)
+
+    async def catch_up(self, spec: JobSpec, start: date, end: date, restart: bool = False) -> Dict[str, Any]:
+        """
+        Recupera dias perdidos: processa cada data de referência de `start` a `end`
+        com uma única busca para o intervalo. Cada data é uma execução própria em
+        job_runs (datas já concluídas são puladas); os emails são enviados a cada lote.
+        """
+        if spec.fetch_range is None:
+            raise ValueError(f"A task '{spec.name}' não suporta recuperação por intervalo de datas")
+        if end < start:
+            raise ValueError("A data final deve ser igual ou posterior à data inicial")
+
+        started_at = time.monotonic()
+        summary = {
+            "success": False,
+            "message": "",
+            "total_pets": 0,
+            "total_tutors": 0,
+            "emails_sent": 0,
+            "errors": [],
+            "deliveries": [],
+            "dry_run": False,
+            "run_key": f"{start.isoformat()}..{end.isoformat()}",
+            "chunks": 0,
+            "queued": 0,
+            "already_queued": 0,
+            "dates": [],
+        }
+
+        async with self.session_factory() as session:
+            success, data_by_date, message = await spec.fetch_range(spec.service_factory(session), start, end)
+            if not success:
+                summary["message"] = message
+                return self._finish(spec, summary, started_at)
+
+            sender = _Sender(session, spec.service_factory(session).OUTBOX_KIND)
+            with sender.transport():
+                day = start
+                while day <= end:
+                    service = spec.service_factory(session, target_date=day)
+                    day_data = data_by_date.get(day, [])
+                    result = await self._enqueue_run(
+                        spec, service, session, restart, _fetched(day_data), sender.send_ready
+                    )
+
+                    for key in ("total_pets", "total_tutors", "chunks", "queued", "already_queued"):
+                        summary[key] += result[key]
+                    summary["errors"].extend(result["errors"])
+                    summary["dates"].append({
+                        "run_key": result["run_key"],
+                        "success": result["success"],
+                        "processed": any(shard["claimed"] for shard in result["shards"]),
+                        "total_tutors": result["total_tutors"],
+                        "queued": result["queued"],
+                        "message": result["message"],
+                    })
+                    day += timedelta(days=1)
+
+                summary["success"] = all(entry["success"] for entry in summary["dates"])
+                await sender.send_ready()
+            sender.apply(summary)
+
+        processed = sum(1 for entry in summary["dates"] if entry["processed"])
+        summary["message"] = (
+            f"Recuperação de {start.strftime('%d/%m/%Y')} a {end.strftime('%d/%m/%Y')}: "
+            f"{processed}/{len(summary['dates'])} datas processadas, {summary['emails_sent']} emails enviados "
+            f"para {summary['total_tutors']} tutores"
+        )
+        failed = [entry["run_key"] for entry in summary["dates"] if not entry["success"]]
+        if failed:
+            summary["message"] += f", falha em {', '.join(failed)}"
+        if summary["errors"]:
+            summary["message"] += f", {len(summary['errors'])} erros encontrados"
+        return self._finish(spec, summary, started_at)
+
+    def _finish(self, spec: JobSpec, result: Dict[str, Any], started_at: float) -> Dict[str, Any]:
+        result["job"] = spec.name
+        result["duration_seconds"] = round(time.monotonic() - started_at, 3)
+        self._emit({
+            "event": "finished",
+            "job": spec.name,
+            "success": result["success"],
+            "emails_sent": result["emails_sent"],
+            "errors": len(result["errors"]),
+            "duration_seconds": result["duration_seconds"],
+        })
+        return result
+
+    @staticmethod
+    def _describe(summary: Dict[str, Any]) -> str:
+        if any(entry["claimed"] for entry in summary["shards"]):
+            message = (
+                f"Processamento concluído: {summary['emails_sent']} emails enviados para "
+                f"{summary['total_tutors']} tutores ({summary['total_pets']} pets)"
+            )
+        else:
+            message = (
+                f"Nenhum shard disponível para {summary['run_key']} (concluídos ou em outros workers); "
+                f"{summary['emails_sent']} emails da fila enviados"
+            )
+        if summary["errors"]:
+            message += f", {len(summary['errors'])} erros encontrados"
+        return message
+
+    async def _lease_lost(self, spec: JobSpec, session: AsyncSession, shard_entry: Dict[str, Any]) -> None:
+        """
+        A reserva expirou e outro worker assumiu o shard: descarta o lote não
+        confirmado e para de processar o shard (quem o assumiu continua do checkpoint)
+        """
+        await session.rollback()
+        shard_entry["lease_lost"] = True
+        logger.warning(f"[{spec.name}] Reserva de {shard_entry['run_key']} perdida; shard abandonado")
+        self._emit({"event": "lease_lost", "job": spec.name, "run_key": shard_entry["run_key"]})
+
+    async def _enqueue_run(
+        self,
+        spec: JobSpec,
+        service: Any,
+        session: AsyncSession,
+        restart: bool,
+        fetch: Optional[Callable[[], Awaitable[Tuple[bool, List[Dict[str, Any]], str]]]],
+        on_chunk: Callable[[], Awaitable[None]],
+    ) -> Dict[str, Any]:
+        """
+        Reserva os shards livres da data de referência do serviço e enfileira os
+        emails de cada um em lotes com checkpoint; `on_chunk` (envio) é chamado
+        após cada checkpoint. Sem `fetch`, os tutores vêm de `spec.stream`.
+        """
+        reference = service.reference_date().isoformat()
+        runs = JobRunRepository(session)
+        outbox_repo = EmailOutboxRepository(session)
+
+        # Totais dos shards processados por este worker (incluindo checkpoints anteriores)
+        totals: Dict[str, Any] = {"tutors_processed": 0, "queued": 0, "already_queued": 0, "errors": []}
+
+        summary = {
+            "success": False,
+            "message": "",
+            "total_pets": 0,
+            "total_tutors": 0,
+            "emails_sent": 0,
+            "errors": [],
+            "deliveries": [],
+            "dry_run": False,
+            "run_key": reference,
+            "resumed_from": None,
+            "chunks": 0,
+            "shards": [],
+        }
+
+        run = None
+        committed_stats: Dict[str, Any] = {}
+        tutor_groups: Optional[List[Dict[str, Any]]] = None
+
+        try:
+            for shard in range(self.shards):
+                run_key = shard_run_key(reference, shard, self.shards)
+                run = await runs.claim_run(spec.name, run_key, self.worker_id, self.lease_seconds, restart=restart)
+                await session.commit()
+                if run is None:
+                    # Concluído ou reservado por outro worker
+                    current = await runs.get_run(spec.name, run_key)
+                    summary["shards"].append({
+                        "run_key": run_key,
+                        "claimed": False,
+                        "status": current["status"],
+                        "owner": current["owner"],
+                    })
+                    continue
+
+                stats = run["stats"]
+                stats.setdefault("tutors_processed", 0)
+                stats.setdefault("queued", 0)
+                stats.setdefault("already_queued", 0)
+                stats.setdefault("errors", [])
+                committed_stats = copy.deepcopy(stats)
+
+                # Busca só quando algum shard foi obtido
+                if fetch is not None and tutor_groups is None:
+                    success, treatments_data, message = await fetch()
+                    if not success:
+                        raise RuntimeError(message)
+                    tutor_groups = service.group_pets_by_tutor(treatments_data)
+                    summary["total_pets"] = len(treatments_data)
+                    summary["total_tutors"] = len(tutor_groups)
+
+                resumed_from = run["cursor"]
+                if tutor_groups is not None:
+                    shard_groups = [group for group in tutor_groups if shard_of(group["key"], self.shards) == shard]
+                    pending = [group for group in shard_groups if resumed_from is None or group["key"] > resumed_from]
+                    source = _aiter(pending)
+                    shard_tutors, pending_tutors = len(shard_groups), len(pending)
+                    total_chunks = -(-len(pending) // self.chunk_size)
+                else:
+                    # Em fluxo os totais só são conhecidos no final
+                    source = spec.stream(service, resumed_from, shard, self.shards)
+                    shard_tutors = pending_tutors = total_chunks = None
+
+                shard_entry = {
+                    "run_key": run_key,
+                    "claimed": True,
+                    "tutors": shard_tutors,
+                    "resumed_from": resumed_from,
+                }
+                summary["shards"].append(shard_entry)
+                if self.shards == 1:
+                    summary["resumed_from"] = resumed_from
+
+                self._emit({
+                    "event": "started",
+                    "job": spec.name,
+                    "run_key": run_key,
+                    "total_tutors": shard_tutors,
+                    "pending_tutors": pending_tutors,
+                    "resumed_from": resumed_from,
+                })
+
+                index = 0
+                async for chunk in achunked(source, self.chunk_size):
+                    index += 1
+                    summary["chunks"] += 1
+                    # Renderização (Jinja, síncrona) fora do event loop
+                    records, errors, chunk_totals = await run_in_threadpool(spec.build_records, service, chunk)
+                    queued = await outbox_repo.enqueue(records)
+
+                    stats["tutors_processed"] += len(chunk)
+                    stats["pets"] = stats.get("pets", 0) + sum(len(group["pets"]) for group in chunk)
+                    stats["queued"] += queued
+                    stats["already_queued"] += len(records) - queued
+                    stats["errors"].extend(errors)
+                    for key, value in chunk_totals.items():
+                        stats[key] = stats.get(key, 0) + value
+
+                    # Fila e checkpoint (com renovação da reserva) na mesma transação
+                    if not await runs.checkpoint(
+                        run["id"], self.worker_id, chunk[-1]["key"], stats, lease_seconds=self.lease_seconds
+                    ):
+                        await self._lease_lost(spec, session, shard_entry)
+                        break
+                    await session.commit()
+                    committed_stats = copy.deepcopy(stats)
+
+                    self._emit({
+                        "event": "chunk",
+                        "job": spec.name,
+                        "run_key": run_key,
+                        "chunk": index,
+                        "chunks": total_chunks,
+                        "tutors_processed": stats["tutors_processed"],
+                        "queued": stats["queued"],
+                    })
+
+                    # Envia os emails do lote antes de ler o próximo
+                    await on_chunk()
+
+                if shard_entry.get("lease_lost"):
+                    run = None
+                    continue
+
+                if shard_entry["tutors"] is None:
+                    shard_entry["tutors"] = stats["tutors_processed"]
+                if not await runs.finish_run(run["id"], self.worker_id, stats):
+                    await self._lease_lost(spec, session, shard_entry)
+                    run = None
+                    continue
+                await session.commit()
+                run = None
+                _accumulate(totals, stats)
+
+            summary["success"] = True
+
+        except Exception as e:
+            logger.error(f"[{spec.name}] Execução {reference} interrompida: {e}")
+            await session.rollback()
+            if run is not None and await runs.finish_run(run["id"], self.worker_id, committed_stats, error=str(e)):
+                await session.commit()
+                _accumulate(totals, committed_stats)
+            summary["message"] = f"Erro na execução {reference}: {str(e)}"
+
+        summary["errors"] = totals["errors"]
+        summary["queued"] = totals["queued"]
+        summary["already_queued"] = totals["already_queued"]
+        if fetch is None:
+            # Em fluxo: tutores e pets (por tutor) dos shards processados por este worker
+            summary["total_tutors"] = totals["tutors_processed"]
+            summary["total_pets"] = totals.get("pets", 0)
+        for key in ("total_current_treatments", "total_expired_treatments"):
+            if key in totals:
+                summary[key] = totals[key]
+        return summary
+
+
+def _fetched(data: List[Dict[str, Any]]) -> Callable[[], Awaitable[Tuple[bool, List[Dict[str, Any]], str]]]:
+    """Busca já feita (recuperação por intervalo): devolve os dados do dia"""
+    async def fetch() -> Tuple[bool, List[Dict[str, Any]], str]:
+        return True, data, "Tratamentos encontrados"
+    return fetch
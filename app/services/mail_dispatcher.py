@@ -0,0 +1,54 @@
+"""
+Disparo concorrente de emails a partir de código assíncrono.
+
+Os envios usam smtplib (bloqueante), então rodam em um pool de threads próprio
+com no máximo MAIL_CONCURRENCY envios simultâneos, sem bloquear o event loop.
+O tempo máximo de cada envio é o timeout do socket SMTP (SMTP_TIMEOUT): o
+resultado de um envio é sempre aguardado, pois uma thread abandonada pode
+entregar o email depois que a fila já o marcou para nova tentativa. O resultado
+de cada mensagem volta como (sucesso, mensagem), na mesma ordem dos envios.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, NamedTuple, Optional, Sequence, Tuple
+from app import config
+
+
+class MailJob(NamedTuple):
+    """Um envio: destinatário (para relatório) e a função bloqueante que envia"""
+    recipient: str
+    send: Callable[..., Tuple[bool, str]]
+    args: Tuple[Any, ...] = ()
+
+
+class MailDispatcher:
+    """Executa envios bloqueantes em paralelo limitado"""
+
+    def __init__(self, concurrency: Optional[int] = None):
+        self.concurrency = max(1, concurrency or config.MAIL_CONCURRENCY)
+
+    async def _run_job(
+        self,
+        executor: ThreadPoolExecutor,
+        slots: asyncio.Semaphore,
+        job: MailJob,
+    ) -> Tuple[bool, str]:
+        async with slots:
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(executor, job.send, *job.args)
+            except Exception as e:
+                return False, f"Erro ao enviar email para {job.recipient}: {str(e)}"
+
+    async def run(self, jobs: Sequence[MailJob]) -> List[Tuple[bool, str]]:
+        """Envia todos os jobs e retorna os resultados na ordem recebida"""
+        if not jobs:
+            return []
+
+        slots = asyncio.Semaphore(self.concurrency)
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="mail")
+        try:
+            return await asyncio.gather(*(self._run_job(executor, slots, job) for job in jobs))
+        finally:
+            executor.shutdown(wait=False)
@@ -0,0 +1,210 @@
+"""
+Transporte SMTP com conexão reaproveitada entre vários emails.
+
+Abrir uma conexão por email custa handshake TCP + TLS + AUTH a cada mensagem.
+O SMTPTransport mantém uma sessão autenticada durante a execução, reconecta
+quando o servidor derruba a conexão, troca de conexão a cada
+SMTP_MAX_MESSAGES_PER_CONNECTION mensagens e respeita SMTP_RATE_LIMIT.
+O SMTPTransportPool distribui envios simultâneos entre algumas sessões.
+"""
+
+import logging
+import queue
+import smtplib
+import threading
+import time
+from email.message import Message
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Dict, Optional
+from app import config
+
+logger = logging.getLogger(__name__)
+
+
+def build_html_message(subject: str, to: str, html: str) -> Message:
+    """Monta o email HTML enviado pelas notificações"""
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = config.GMAIL_EMAIL
+    msg['To'] = to
+    msg.attach(MIMEText(html, 'html', 'utf-8'))
+    return msg
+
+
+def _is_connection_error(error: Exception) -> bool:
+    """Erros em que a mensagem pode ser reenviada em uma conexão nova"""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        # 421: serviço indisponível / conexão encerrada pelo servidor
+        return error.smtp_code == 421
+    # SMTPException herda de OSError; demais OSError são falhas de rede
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class SMTPTransport:
+    """Sessão SMTP autenticada reaproveitada para vários envios"""
+
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        timeout: Optional[float] = None,
+        max_messages_per_connection: Optional[int] = None,
+        rate_limit: Optional[float] = None,
+    ):
+        self.host = host or config.GMAIL_SMTP_SERVER
+        self.port = port or config.GMAIL_SMTP_PORT
+        self.username = username if username is not None else config.GMAIL_EMAIL
+        self.password = password if password is not None else config.GMAIL_PASSWORD
+        self.timeout = timeout or config.SMTP_TIMEOUT
+        self.max_messages_per_connection = max_messages_per_connection or config.SMTP_MAX_MESSAGES_PER_CONNECTION
+        rate_limit = config.SMTP_RATE_LIMIT if rate_limit is None else rate_limit
+        self.min_interval = 1.0 / rate_limit if rate_limit > 0 else 0.0
+
+        self._server: Optional[smtplib.SMTP] = None
+        self._sent_on_connection = 0
+        self._last_send = 0.0
+
+        # Métricas
+        self.connections = 0
+        self.reconnects = 0
+        self.messages_sent = 0
+
+    def __enter__(self) -> "SMTPTransport":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.starttls()
+            server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        self.connections += 1
+        self._sent_on_connection = 0
+        logger.debug(f"SMTP connection opened to {self.host}:{self.port}")
+        return server
+
+    def _discard(self) -> None:
+        """Descarta a conexão atual sem QUIT (usada após queda do servidor)"""
+        if self._server is not None:
+            try:
+                self._server.close()
+            except Exception:
+                pass
+            self._server = None
+
+    def close(self) -> None:
+        """Encerra a conexão educadamente (QUIT)"""
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            finally:
+                self._discard()
+
+    def _throttle(self) -> None:
+        if self.min_interval:
+            wait = self._last_send + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+        self._last_send = time.monotonic()
+
+    def send_message(self, msg: Message) -> None:
+        """
+        Envia a mensagem na conexão atual (abrindo uma se necessário).
+        Se o servidor derrubou a conexão, reconecta e tenta uma única vez mais.
+        """
+        self._throttle()
+        for attempt in (1, 2):
+            try:
+                if self._server is None:
+                    self._server = self._connect()
+                self._server.send_message(msg)
+                break
+            except Exception as e:
+                self._discard()
+                if attempt == 2 or not _is_connection_error(e):
+                    raise
+                self.reconnects += 1
+                logger.warning(f"SMTP connection dropped ({e}), reconnecting")
+
+        self.messages_sent += 1
+        self._sent_on_connection += 1
+        if self._sent_on_connection >= self.max_messages_per_connection:
+            # Provedores limitam mensagens por conexão: renova antes de atingir
+            self.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Métricas de uso das conexões"""
+        return {
+            "connections": self.connections,
+            "reconnects": self.reconnects,
+            "messages_sent": self.messages_sent,
+        }
+
+
+class SMTPTransportPool:
+    """
+    Algumas sessões SMTP para envios em paralelo (uma por thread de envio).
+    O limite de taxa (SMTP_RATE_LIMIT) vale para o pool inteiro.
+    """
+
+    def __init__(self, size: int, rate_limit: Optional[float] = None, **transport_options: Any):
+        rate_limit = config.SMTP_RATE_LIMIT if rate_limit is None else rate_limit
+        self.min_interval = 1.0 / rate_limit if rate_limit > 0 else 0.0
+        self._transports = [SMTPTransport(rate_limit=0, **transport_options) for _ in range(max(1, size))]
+
+        # LIFO: em execuções pequenas, reaproveita a conexão mais recente
+        self._idle: "queue.LifoQueue[SMTPTransport]" = queue.LifoQueue()
+        for transport in self._transports:
+            self._idle.put(transport)
+
+        self._throttle_lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def __enter__(self) -> "SMTPTransportPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _throttle(self) -> None:
+        if not self.min_interval:
+            return
+        with self._throttle_lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def send_message(self, msg: Message) -> None:
+        """Envia usando uma sessão livre do pool (aguarda se todas estiverem ocupadas)"""
+        self._throttle()
+        transport = self._idle.get()
+        try:
+            transport.send_message(msg)
+        finally:
+            self._idle.put(transport)
+
+    def close(self) -> None:
+        for transport in self._transports:
+            transport.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Métricas somadas das sessões"""
+        totals = {"connections": 0, "reconnects": 0, "messages_sent": 0}
+        for transport in self._transports:
+            for key, value in transport.metrics().items():
+                totals[key] += value
+        return totals
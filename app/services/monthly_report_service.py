@@ -2,39 +2,56 @@
 Serviço para relatórios mensais de tratamentos
 """
 
-import smtplib
 import logging
-from datetime import datetime
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import Dict, Any, List, Tuple
-from jinja2 import Environment, FileSystemLoader
-from pathlib import Path
+from contextlib import nullcontext
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.repositories import PetRepository, UserRepository
-from app.config import (
-    GMAIL_EMAIL, 
-    GMAIL_PASSWORD, 
-    GMAIL_SMTP_SERVER, 
-    GMAIL_SMTP_PORT,
-    validate_gmail_config
-)
+from app.repositories import PetRepository
+from app.services.mail_dispatcher import MailDispatcher, MailJob
+from app.services.email_templates import EmailRenderer
+from app.services.email_outbox_service import EmailOutboxService, MONTHLY_REPORT, outbox_record
+from app.config import JOB_CHUNK_SIZE
 
 
 class MonthlyReportService:
     """Serviço para relatórios mensais de tratamentos"""
     
+    OUTBOX_KIND = MONTHLY_REPORT
+    
     def __init__(self, session: AsyncSession):
         self.session = session
         self.pet_repo = PetRepository(session)
-        self.user_repo = UserRepository(session)
         self.logger = logging.getLogger(__name__)
         
-        # Configura Jinja2 para templates
-        template_dir = Path(__file__).parent / "templates"
-        template_dir.mkdir(exist_ok=True)
-        self.jinja_env = Environment(loader=FileSystemLoader(template_dir))
+        # Templates compilados compartilhados pelo processo; blocos por pet reaproveitados na execução
+        self.renderer = EmailRenderer()
+    
+    def report_window(self) -> Tuple[date, date, date]:
+        """Janela do relatório: (primeiro dia do mês, último dia do mês, limite dos expirados = ontem)"""
+        today = datetime.now().date()
+        month_start = today.replace(day=1)
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+        return month_start, next_month - timedelta(days=1), today - timedelta(days=1)
+    
+    async def iter_tutor_reports(
+        self,
+        after_key: Optional[str] = None,
+        shard: int = 0,
+        shards: int = 1
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Percorre os dados do relatório já agrupados por tutor, em ordem de chave
+        (a partir de `after_key`), em páginas de tutores com uma consulta cada
+        (cada tutor é emitido quando suas linhas terminam). Com `shards` > 1,
+        apenas os tutores do `shard` informado (filtrados na consulta).
+        """
+        month_start, month_end, expired_until = self.report_window()
+        async for group in self.pet_repo.stream_monthly_report(
+            month_start, month_end, expired_until, after_key=after_key, shard=shard, shards=shards
+        ):
+            yield group
     
     async def get_monthly_treatments_with_tutors(self) -> Tuple[bool, List[Dict[str, Any]], str]:
         """
@@ -42,68 +59,19 @@ class MonthlyReportService:
         Retorna: (sucesso, lista_tratamentos_com_tutores, mensagem)
         """
         try:
-            # Busca tratamentos do mês atual
-            current_month_treatments = await self.pet_repo.get_current_month_treatments()
-            
-            # Busca tratamentos expirados
-            expired_treatments = await self.pet_repo.get_expired_treatments()
+            # Uma consulta por tutor/pet/tratamento; aqui os pets são reagrupados com seus tutores
+            pets_by_id: Dict[str, Dict[str, Any]] = {}
+            async for group in self.iter_tutor_reports():
+                for pet_data in group["pets"]:
+                    pet_id = pet_data["pet"]["id"]
+                    if pet_id not in pets_by_id:
+                        pets_by_id[pet_id] = {**pet_data, "tutors": []}
+                    pets_by_id[pet_id]["tutors"].append(group["tutor"])
             
-            # Combina todos os tratamentos
-            all_treatments = {}
-            
-            # Adiciona tratamentos do mês atual
-            for pet_data in current_month_treatments:
-                pet_id = pet_data["_id"]
-                if pet_id not in all_treatments:
-                    all_treatments[pet_id] = {
-                        "_id": pet_id,
-                        "name": pet_data["name"],
-                        "nickname": pet_data["nickname"],
-                        "users": pet_data["users"],
-                        "current_month_treatments": pet_data["treatments"],
-                        "expired_treatments": []
-                    }
-                else:
-                    all_treatments[pet_id]["current_month_treatments"] = pet_data["treatments"]
-            
-            # Adiciona tratamentos expirados
-            for pet_data in expired_treatments:
-                pet_id = pet_data["_id"]
-                if pet_id not in all_treatments:
-                    all_treatments[pet_id] = {
-                        "_id": pet_id,
-                        "name": pet_data["name"],
-                        "nickname": pet_data["nickname"],
-                        "users": pet_data["users"],
-                        "current_month_treatments": [],
-                        "expired_treatments": pet_data["treatments"]
-                    }
-                else:
-                    all_treatments[pet_id]["expired_treatments"] = pet_data["treatments"]
-            
-            if not all_treatments:
+            if not pets_by_id:
                 return True, [], "Nenhum tratamento encontrado para o mês atual ou expirados."
             
-            # Para cada pet, busca dados dos tutores
-            enriched_data = []
-            
-            for pet_data in all_treatments.values():
-                # Busca emails dos tutores
-                tutors = await self.user_repo.get_user_emails_by_ids(pet_data["users"])
-                
-                # Só adiciona se houver tutores com email
-                if tutors:
-                    enriched_data.append({
-                        "pet": {
-                            "id": pet_data["_id"],
-                            "name": pet_data["name"],
-                            "nickname": pet_data["nickname"]
-                        },
-                        "current_month_treatments": pet_data["current_month_treatments"],
-                        "expired_treatments": pet_data["expired_treatments"],
-                        "tutors": tutors
-                    })
-            
+            enriched_data = list(pets_by_id.values())
             total_current = sum(len(pet["current_month_treatments"]) for pet in enriched_data)
             total_expired = sum(len(pet["expired_treatments"]) for pet in enriched_data)
             
@@ -167,6 +135,7 @@ class MonthlyReportService:
             
             # Adiciona pet consolidado
             consolidated_pets.append({
+                "pet_id": pet_data["pet"].get("id"),
                 "pet_name": pet_data["pet"]["name"],
                 "pet_nickname": pet_data["pet"]["nickname"],
                 "current_month_treatments": formatted_current,
@@ -190,89 +159,202 @@ class MonthlyReportService:
             "report_date": now.strftime("%d/%m/%Y")
         }
     
-    def send_consolidated_monthly_email(
+    def report_subject(self, consolidated_data: Dict[str, Any]) -> str:
+        """Assunto do relatório mensal consolidado"""
+        return (
+            f"📋 Relatório Mensal Consolidado - {consolidated_data['total_pets']} pets "
+            f"({consolidated_data['current_month']})"
+        )
+    
+    def render_consolidated_monthly_email(self, tutor_name: str, consolidated_data: Dict[str, Any]) -> str:
+        """
+        Renderiza o HTML do relatório mensal consolidado.
+        O bloco de cada pet é renderizado uma vez por execução; por tutor só muda o cabeçalho.
+        """
+        pet_sections = [
+            self.renderer.render_section("partials/monthly_report_pet.html", pet.get("pet_id"), pet=pet)
+            for pet in consolidated_data["pets"]
+        ]
+        return self.renderer.render(
+            "consolidated_monthly_report.html",
+            tutor_name=tutor_name,
+            pet_sections=pet_sections,
+            **consolidated_data
+        )
+    
+    def preview_consolidated_monthly_email(
         self,
         tutor_email: str,
         tutor_name: str,
-        consolidated_data: Dict[str, Any],
-        dry_run: bool = False
+        consolidated_data: Dict[str, Any]
     ) -> Tuple[bool, str]:
         """
-        Envia email consolidado de relatório mensal para um tutor (todos os pets)
+        Renderiza o relatório consolidado sem enviar (dry-run); o envio real é pela fila de emails
         """
         try:
-            # Carrega template de email mensal consolidado
-            template = self.jinja_env.get_template("consolidated_monthly_report.html")
-            
-            # Renderiza o conteúdo do email
-            html_content = template.render(
-                tutor_name=tutor_name,
-                **consolidated_data
+            self.render_consolidated_monthly_email(tutor_name, consolidated_data)
+            self.logger.info(
+                f"[DRY RUN] Relatório mensal consolidado seria enviado para {tutor_email} "
+                f"({consolidated_data['total_pets']} pets)"
             )
-            
-            # Se for dry-run, só retorna sucesso sem enviar
-            if dry_run:
-                self.logger.info(
-                    f"[DRY RUN] Relatório mensal consolidado seria enviado para {tutor_email} "
-                    f"({consolidated_data['total_pets']} pets)"
-                )
-                return True, f"[DRY RUN] Relatório consolidado preparado para {tutor_email}"
-            
-            # Valida configuração do Gmail
-            is_valid, validation_message = validate_gmail_config()
-            if not is_valid:
-                return False, validation_message
-            
-            # Cria mensagem de email
-            msg = MIMEMultipart('alternative')
-            subject = (
-                f"📋 Relatório Mensal Consolidado - {consolidated_data['total_pets']} pets "
-                f"({consolidated_data['current_month']})"
-            )
-            msg['Subject'] = subject
-            msg['From'] = GMAIL_EMAIL
-            msg['To'] = tutor_email
-            
-            # Anexa conteúdo HTML
-            html_part = MIMEText(html_content, 'html', 'utf-8')
-            msg.attach(html_part)
-            
-            # Conecta ao servidor SMTP e envia
-            with smtplib.SMTP(GMAIL_SMTP_SERVER, GMAIL_SMTP_PORT) as server:
-                server.starttls()
-                server.login(GMAIL_EMAIL, GMAIL_PASSWORD)
-                server.send_message(msg)
-            
-            self.logger.info(f"Relatório mensal consolidado enviado com sucesso para {tutor_email}")
-            return True, f"Relatório consolidado enviado para {tutor_email}"
+            return True, f"[DRY RUN] Relatório consolidado preparado para {tutor_email}"
             
         except Exception as e:
-            self.logger.error(f"Erro ao enviar relatório consolidado para {tutor_email}: {e}")
-            return False, f"Erro ao enviar relatório consolidado para {tutor_email}: {str(e)}"
+            self.logger.error(f"Erro ao preparar relatório consolidado para {tutor_email}: {e}")
+            return False, f"Erro ao preparar relatório consolidado para {tutor_email}: {str(e)}"
 
+    def reference_date(self) -> date:
+        """Data de referência da execução (primeiro dia do mês do relatório)"""
+        return datetime.now().date().replace(day=1)
+    
+    def group_pets_by_tutor(self, treatments_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Agrupa os pets por tutor.
+        Retorna [{"key": ..., "tutor": ..., "pets": [...]}] ordenado pela chave,
+        ordem estável entre execuções (usada como checkpoint pelo JobRunner).
+        """
+        tutors_pets = {}
+        
+        for pet_treatments in treatments_data:
+            for tutor in pet_treatments["tutors"]:
+                tutor_key = f"{tutor['email']}|{tutor['id']}"
+                if tutor_key not in tutors_pets:
+                    tutors_pets[tutor_key] = {
+                        "key": tutor_key,
+                        "tutor": tutor,
+                        "pets": []
+                    }
+                tutors_pets[tutor_key]["pets"].append(pet_treatments)
+        
+        return [tutors_pets[key] for key in sorted(tutors_pets)]
+    
+    def build_outbox_records(
+        self,
+        tutor_groups: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], List[str], Dict[str, int]]:
+        """
+        Renderiza o relatório consolidado de cada tutor para a fila de emails
+        Retorna: (registros, erros, totais de tratamentos)
+        """
+        reference_date = self.reference_date()
+        records = []
+        errors = []
+        totals = {"total_current_treatments": 0, "total_expired_treatments": 0}
+        
+        for group in tutor_groups:
+            tutor = group["tutor"]
+            pets_list = group["pets"]
+            
+            try:
+                consolidated_data = self.format_consolidated_report_for_email(tutor, pets_list)
+                records.append(outbox_record(
+                    self.OUTBOX_KIND,
+                    tutor["email"],
+                    reference_date,
+                    [pet_data["pet"]["id"] for pet_data in pets_list],
+                    self.report_subject(consolidated_data),
+                    self.render_consolidated_monthly_email(tutor["name"], consolidated_data)
+                ))
+                totals["total_current_treatments"] += consolidated_data["total_current_treatments"]
+                totals["total_expired_treatments"] += consolidated_data["total_expired_treatments"]
+            except Exception as e:
+                error_msg = f"Erro ao processar tutor {tutor['name']}: {str(e)}"
+                errors.append(error_msg)
+                self.logger.error(error_msg)
+        
+        # Os blocos reaproveitados valem só para o lote: memória limitada ao maior lote
+        self.renderer.clear()
+        return records, errors, totals
+    
     async def process_monthly_reports(self, dry_run: bool = False) -> Dict[str, Any]:
         """
         Processa todos os relatórios mensais de tratamentos
-        NOVA VERSÃO: Consolida por tutor (1 email por tutor com todos os seus pets)
+        Consolida por tutor (1 email por tutor com todos os seus pets), em fluxo:
+        os tutores chegam ordenados da consulta e, a cada lote de JOB_CHUNK_SIZE,
+        são formatados, renderizados e enviados (ou gravados na fila e enviados)
+        antes de ler os próximos. A memória fica limitada ao lote, não à base inteira.
         """
         self.logger.info("Iniciando processamento de relatórios mensais consolidados")
+        self.renderer.clear()
         
-        # Busca tratamentos do mês e expirados
-        success, treatments_data, message = await self.get_monthly_treatments_with_tutors()
+        total_pets = 0
+        total_tutors = 0
+        total_current = 0
+        total_expired = 0
+        errors = []
+        deliveries = []
+        queue_stats = {"queued": 0, "already_queued": 0}
+        outbox = EmailOutboxService(self.session)
         
-        if not success:
-            self.logger.error(f"Erro ao buscar tratamentos: {message}")
+        async def process_batch(tutor_groups: List[Dict[str, Any]]) -> None:
+            nonlocal total_current, total_expired
+            
+            if dry_run:
+                jobs = []
+                for group in tutor_groups:
+                    tutor = group["tutor"]
+                    try:
+                        consolidated_data = self.format_consolidated_report_for_email(tutor, group["pets"])
+                        total_current += consolidated_data["total_current_treatments"]
+                        total_expired += consolidated_data["total_expired_treatments"]
+                        jobs.append(MailJob(
+                            tutor["email"],
+                            self.preview_consolidated_monthly_email,
+                            (tutor["email"], tutor["name"], consolidated_data)
+                        ))
+                    except Exception as e:
+                        error_msg = f"Erro ao processar tutor {tutor['name']}: {str(e)}"
+                        errors.append(error_msg)
+                        self.logger.error(error_msg)
+                
+                outcomes = await MailDispatcher().run(jobs)
+                self.renderer.clear()
+                deliveries.extend(
+                    {"recipient": job.recipient, "success": success_send, "message": result_message}
+                    for job, (success_send, result_message) in zip(jobs, outcomes)
+                )
+                return
+            
+            records, build_errors, totals = self.build_outbox_records(tutor_groups)
+            errors.extend(build_errors)
+            total_current += totals["total_current_treatments"]
+            total_expired += totals["total_expired_treatments"]
+            
+            # Grava os relatórios do lote na fila durável e envia; falhas são retentadas depois
+            summary = await outbox.deliver(records, self.OUTBOX_KIND)
+            deliveries.extend(summary["deliveries"])
+            errors.extend(summary["errors"])
+            queue_stats["queued"] += summary["queued"]
+            queue_stats["already_queued"] += summary["already_queued"]
+        
+        try:
+            # Conexões SMTP abertas sob demanda e reaproveitadas entre os lotes
+            with outbox.transport() if not dry_run else nullcontext():
+                batch: List[Dict[str, Any]] = []
+                async for group in self.iter_tutor_reports():
+                    total_tutors += 1
+                    # Pets por tutor: um pet com dois tutores aparece em dois relatórios
+                    total_pets += len(group["pets"])
+                    batch.append(group)
+                    if len(batch) >= JOB_CHUNK_SIZE:
+                        await process_batch(batch)
+                        batch = []
+                if batch:
+                    await process_batch(batch)
+        except Exception as e:
+            self.logger.error(f"Erro ao processar relatórios mensais: {e}")
             return {
                 "success": False,
-                "message": message,
-                "total_pets": 0,
-                "total_tutors": 0,
-                "emails_sent": 0,
-                "errors": [],
+                "message": f"Erro ao buscar tratamentos: {str(e)}",
+                "total_pets": total_pets,
+                "total_tutors": total_tutors,
+                "emails_sent": sum(1 for delivery in deliveries if delivery["success"]),
+                "errors": errors,
+                "deliveries": deliveries,
                 "dry_run": dry_run
             }
         
-        if not treatments_data:
+        if not total_tutors:
             self.logger.info("Nenhum tratamento encontrado para relatório mensal")
             return {
                 "success": True,
@@ -284,56 +366,17 @@ class MonthlyReportService:
                 "dry_run": dry_run
             }
         
-        # NOVA LÓGICA: Agrupa pets por tutor
-        tutors_pets = {}
-        
-        for pet_treatments in treatments_data:
-            for tutor in pet_treatments["tutors"]:
-                tutor_key = f"{tutor['id']}|{tutor['email']}"
-                if tutor_key not in tutors_pets:
-                    tutors_pets[tutor_key] = {
-                        "tutor": tutor,
-                        "pets": []
-                    }
-                tutors_pets[tutor_key]["pets"].append(pet_treatments)
-        
-        # Processa cada tutor (1 email por tutor)
-        total_pets = len(treatments_data)
-        total_tutors = len(tutors_pets)
         emails_sent = 0
-        errors = []
-        total_current = 0
-        total_expired = 0
+        for delivery in deliveries:
+            if delivery["success"]:
+                emails_sent += 1
+                self.logger.info(delivery["message"])
+            else:
+                errors.append(delivery["message"])
+                self.logger.error(delivery["message"])
         
-        for tutor_key, tutor_data in tutors_pets.items():
-            try:
-                tutor = tutor_data["tutor"]
-                pets_list = tutor_data["pets"]
-                
-                # Formata dados consolidados para email
-                consolidated_data = self.format_consolidated_report_for_email(tutor, pets_list)
-                total_current += consolidated_data["total_current_treatments"]
-                total_expired += consolidated_data["total_expired_treatments"]
-                
-                # Envia 1 email consolidado para o tutor
-                success_send, result_message = self.send_consolidated_monthly_email(
-                    tutor["email"], 
-                    tutor["name"], 
-                    consolidated_data, 
-                    dry_run
-                )
-                
-                if success_send:
-                    emails_sent += 1
-                    self.logger.info(result_message)
-                else:
-                    errors.append(result_message)
-                    self.logger.error(result_message)
-            
-            except Exception as e:
-                error_msg = f"Erro ao processar tutor {tutor['name']}: {str(e)}"
-                errors.append(error_msg)
-                self.logger.error(error_msg)
+        if not dry_run:
+            self.logger.info(f"Fila de emails: {queue_stats}")
         
         # Retorna resumo da execução
         final_message = (
@@ -354,5 +397,7 @@ class MonthlyReportService:
             "total_current_treatments": total_current,
             "total_expired_treatments": total_expired,
             "errors": errors,
+            "deliveries": deliveries,
+            **({} if dry_run else queue_stats),
             "dry_run": dry_run
         }
@@ -2,39 +2,63 @@
 Serviço para envio de notificações de tratamentos
 """
 
-import smtplib
 import logging
-from datetime import datetime, timedelta
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import Dict, Any, List, Tuple
-from jinja2 import Environment, FileSystemLoader
-from pathlib import Path
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.repositories import PetRepository, UserRepository
-from app.config import (
-    GMAIL_EMAIL, 
-    GMAIL_PASSWORD, 
-    GMAIL_SMTP_SERVER, 
-    GMAIL_SMTP_PORT,
-    validate_gmail_config
-)
+from app.services.mail_dispatcher import MailDispatcher, MailJob
+from app.services.email_templates import EmailRenderer
+from app.services.email_outbox_service import EmailOutboxService, DAILY_REMINDER, outbox_record
 
 
 class NotificationService:
     """Serviço para envio de notificações de tratamentos"""
     
-    def __init__(self, session: AsyncSession):
+    OUTBOX_KIND = DAILY_REMINDER
+    
+    def __init__(self, session: AsyncSession, target_date: Optional[date] = None):
         self.session = session
+        # Dia dos tratamentos lembrados (padrão: amanhã); outro dia na recuperação de dias perdidos
+        self.target_date = target_date
         self.pet_repo = PetRepository(session)
         self.user_repo = UserRepository(session)
         self.logger = logging.getLogger(__name__)
         
-        # Configura Jinja2 para templates
-        template_dir = Path(__file__).parent / "templates"
-        template_dir.mkdir(exist_ok=True)
-        self.jinja_env = Environment(loader=FileSystemLoader(template_dir))
+        # Templates compilados compartilhados pelo processo; blocos por pet reaproveitados na execução
+        self.renderer = EmailRenderer()
+    
+    async def _get_tutors_by_id(self, pets_data: List[Dict[str, Any]]) -> Dict[str, Dict[str, str]]:
+        """Resolve os tutores (com email) de todos os pets com uma consulta IN"""
+        user_ids = sorted({user_id for pet_data in pets_data for user_id in pet_data["users"]})
+        tutors = await self.user_repo.get_user_emails_by_ids(user_ids)
+        return {tutor["id"]: tutor for tutor in tutors}
+    
+    def _with_tutors(
+        self,
+        treatments_data: List[Dict[str, Any]],
+        tutors_by_id: Dict[str, Dict[str, str]]
+    ) -> List[Dict[str, Any]]:
+        """Monta a lista de tutores de cada pet; pets sem tutores com email são ignorados"""
+        enriched_data = []
+        
+        for pet_data in treatments_data:
+            tutors = [tutors_by_id[user_id] for user_id in pet_data["users"] if user_id in tutors_by_id]
+            
+            # Só adiciona se houver tutores com email
+            if tutors:
+                enriched_data.append({
+                    "pet": {
+                        "id": pet_data["_id"],
+                        "name": pet_data["name"],
+                        "nickname": pet_data["nickname"]
+                    },
+                    "treatments": pet_data["treatments"],
+                    "tutors": tutors
+                })
+        
+        return enriched_data
     
     async def get_tomorrow_treatments_with_tutors(self) -> Tuple[bool, List[Dict[str, Any]], str]:
         """
@@ -48,24 +72,11 @@ class NotificationService:
             if not treatments_data:
                 return True, [], "Nenhum tratamento agendado para amanhã."
             
-            # Para cada pet, busca dados dos tutores
-            enriched_data = []
+            # Busca os tutores de todos os pets em uma única consulta
+            tutors_by_id = await self._get_tutors_by_id(treatments_data)
             
-            for pet_data in treatments_data:
-                # Busca emails dos tutores
-                tutors = await self.user_repo.get_user_emails_by_ids(pet_data["users"])
-                
-                # Só adiciona se houver tutores com email
-                if tutors:
-                    enriched_data.append({
-                        "pet": {
-                            "id": pet_data["_id"],
-                            "name": pet_data["name"],
-                            "nickname": pet_data["nickname"]
-                        },
-                        "treatments": pet_data["treatments"],
-                        "tutors": tutors
-                    })
+            # Para cada pet, monta a lista de tutores a partir do cache da execução
+            enriched_data = self._with_tutors(treatments_data, tutors_by_id)
             
             message = f"Encontrados {len(enriched_data)} pets com tratamentos agendados para amanhã."
             return True, enriched_data, message
@@ -74,12 +85,64 @@ class NotificationService:
             self.logger.error(f"Erro ao buscar tratamentos de amanhã: {e}")
             return False, [], f"Erro ao buscar tratamentos: {str(e)}"
     
+    async def get_target_treatments_with_tutors(self) -> Tuple[bool, List[Dict[str, Any]], str]:
+        """
+        Busca os tratamentos do dia de referência (amanhã ou `target_date`) com dados dos tutores
+        Retorna: (sucesso, lista_tratamentos_com_tutores, mensagem)
+        """
+        if self.target_date is None:
+            return await self.get_tomorrow_treatments_with_tutors()
+        
+        success, treatments_by_date, message = await self.get_treatments_with_tutors_by_date(
+            self.target_date, self.target_date
+        )
+        return success, treatments_by_date.get(self.target_date, []), message
+    
+    async def get_treatments_with_tutors_by_date(
+        self,
+        start: date,
+        end: date
+    ) -> Tuple[bool, Dict[date, List[Dict[str, Any]]], str]:
+        """
+        Busca os tratamentos de um intervalo de datas (uma consulta para o intervalo
+        e uma para os tutores), separados por dia
+        Retorna: (sucesso, {data: lista_tratamentos_com_tutores}, mensagem)
+        """
+        try:
+            treatments_by_date = await self.pet_repo.get_scheduled_treatments_by_date(start, end)
+            
+            all_pets = [pet_data for pets in treatments_by_date.values() for pet_data in pets]
+            tutors_by_id = await self._get_tutors_by_id(all_pets) if all_pets else {}
+            
+            enriched_by_date = {
+                day: self._with_tutors(pets, tutors_by_id)
+                for day, pets in treatments_by_date.items()
+            }
+            total = sum(len(pets) for pets in enriched_by_date.values())
+            message = (
+                f"Encontrados {total} pets com tratamentos agendados entre "
+                f"{start.strftime('%d/%m/%Y')} e {end.strftime('%d/%m/%Y')}."
+            )
+            return True, enriched_by_date, message
+            
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar tratamentos de {start} a {end}: {e}")
+            return False, {}, f"Erro ao buscar tratamentos: {str(e)}"
+    
+    def day_label(self) -> str:
+        """Como o dia dos tratamentos aparece no email ("amanhã", "hoje" ou a data)"""
+        days_ahead = (self.reference_date() - datetime.now().date()).days
+        if days_ahead == 1:
+            return "amanhã"
+        if days_ahead == 0:
+            return "hoje"
+        return f"em {self.reference_date().strftime('%d/%m/%Y')}"
+    
     def format_treatments_for_email(self, pet_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Formata dados de tratamentos para o template de email
         """
-        tomorrow = datetime.now() + timedelta(days=1)
-        tomorrow_formatted = tomorrow.strftime("%d/%m/%Y")
+        target_formatted = self.reference_date().strftime("%d/%m/%Y")
         
         formatted_treatments = []
         for treatment in pet_data["treatments"]:
@@ -94,74 +157,148 @@ class NotificationService:
             formatted_treatments.append(formatted_treatment)
         
         return {
+            "pet_id": pet_data["pet"].get("id"),
             "pet_name": pet_data["pet"]["name"],
             "pet_nickname": pet_data["pet"]["nickname"],
-            "date": tomorrow_formatted,
+            "date": target_formatted,
+            "when": self.day_label(),
             "treatments": formatted_treatments,
             "total_treatments": len(formatted_treatments)
         }
     
-    def send_email_notification(
+    def format_consolidated_reminder_for_email(self, pets_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Formata os tratamentos do dia de todos os pets de um tutor para um único email
+        """
+        pets = [self.format_treatments_for_email(pet_data) for pet_data in pets_list]
+        
+        return {
+            "date": self.reference_date().strftime("%d/%m/%Y"),
+            "when": self.day_label(),
+            "pets": pets,
+            "total_pets": len(pets),
+            "total_treatments": sum(pet["total_treatments"] for pet in pets)
+        }
+    
+    def email_subject(self, email_data: Dict[str, Any]) -> str:
+        """Assunto do lembrete diário"""
+        return f"🐾 Lembrete: Tratamentos agendados para {email_data['pet_name']} {email_data.get('when', 'amanhã')}"
+    
+    def reminder_subject(self, reminder_data: Dict[str, Any]) -> str:
+        """Assunto do lembrete diário consolidado"""
+        if reminder_data["total_pets"] == 1:
+            return self.email_subject(reminder_data["pets"][0])
+        return (
+            f"🐾 Lembrete: {reminder_data['total_treatments']} tratamentos agendados "
+            f"para {reminder_data['total_pets']} pets {reminder_data.get('when', 'amanhã')}"
+        )
+    
+    def render_consolidated_reminder(self, tutor_name: str, reminder_data: Dict[str, Any]) -> str:
+        """
+        Renderiza o HTML do lembrete diário consolidado.
+        O bloco de cada pet é renderizado uma vez por execução; por tutor só muda o cabeçalho.
+        """
+        pet_sections = [
+            self.renderer.render_section("partials/daily_reminder_pet.html", pet.get("pet_id"), pet=pet)
+            for pet in reminder_data["pets"]
+        ]
+        return self.renderer.render(
+            "consolidated_treatment_reminder.html",
+            tutor_name=tutor_name,
+            pet_sections=pet_sections,
+            **reminder_data
+        )
+    
+    def preview_consolidated_reminder(
         self,
         tutor_email: str,
         tutor_name: str,
-        email_data: Dict[str, Any],
-        dry_run: bool = False
+        reminder_data: Dict[str, Any]
     ) -> Tuple[bool, str]:
         """
-        Envia email de notificação para um tutor
+        Renderiza o lembrete consolidado sem enviar (dry-run); o envio real é pela fila de emails
         """
         try:
-            # Carrega template de email
-            template = self.jinja_env.get_template("treatment_reminder.html")
-            
-            # Renderiza o conteúdo do email
-            html_content = template.render(
-                tutor_name=tutor_name,
-                **email_data
+            self.render_consolidated_reminder(tutor_name, reminder_data)
+            self.logger.info(
+                f"[DRY RUN] Lembrete consolidado seria enviado para {tutor_email} "
+                f"({reminder_data['total_pets']} pets)"
             )
-            
-            # Se for dry-run, só retorna sucesso sem enviar
-            if dry_run:
-                self.logger.info(f"[DRY RUN] Email seria enviado para {tutor_email}")
-                return True, f"[DRY RUN] Email preparado para {tutor_email}"
-            
-            # Valida configuração do Gmail
-            is_valid, validation_message = validate_gmail_config()
-            if not is_valid:
-                return False, validation_message
-            
-            # Cria mensagem de email
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = f"🐾 Lembrete: Tratamentos agendados para {email_data['pet_name']} amanhã"
-            msg['From'] = GMAIL_EMAIL
-            msg['To'] = tutor_email
-            
-            # Anexa conteúdo HTML
-            html_part = MIMEText(html_content, 'html', 'utf-8')
-            msg.attach(html_part)
-            
-            # Conecta ao servidor SMTP e envia
-            with smtplib.SMTP(GMAIL_SMTP_SERVER, GMAIL_SMTP_PORT) as server:
-                server.starttls()
-                server.login(GMAIL_EMAIL, GMAIL_PASSWORD)
-                server.send_message(msg)
-            
-            self.logger.info(f"Email enviado com sucesso para {tutor_email}")
-            return True, f"Email enviado para {tutor_email}"
-            
+            return True, f"[DRY RUN] Email preparado para {tutor_email}"
+        
         except Exception as e:
-            self.logger.error(f"Erro ao enviar email para {tutor_email}: {e}")
-            return False, f"Erro ao enviar email para {tutor_email}: {str(e)}"
+            self.logger.error(f"Erro ao preparar email para {tutor_email}: {e}")
+            return False, f"Erro ao preparar email para {tutor_email}: {str(e)}"
+    
+    def reference_date(self) -> date:
+        """Data de referência da execução (dia dos tratamentos lembrados)"""
+        return self.target_date or (datetime.now() + timedelta(days=1)).date()
+    
+    def group_pets_by_tutor(self, treatments_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Agrupa os pets por tutor (o email identifica o destinatário).
+        Retorna [{"key": email, "tutor": ..., "pets": [...]}] ordenado pela chave,
+        ordem estável entre execuções (usada como checkpoint pelo JobRunner).
+        """
+        tutors_pets = {}
+        
+        for pet_treatments in treatments_data:
+            for tutor in pet_treatments["tutors"]:
+                if tutor["email"] not in tutors_pets:
+                    tutors_pets[tutor["email"]] = {
+                        "key": tutor["email"],
+                        "tutor": tutor,
+                        "pets": []
+                    }
+                tutors_pets[tutor["email"]]["pets"].append(pet_treatments)
+        
+        return [tutors_pets[email] for email in sorted(tutors_pets)]
+    
+    def build_outbox_records(
+        self,
+        tutor_groups: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        Renderiza o lembrete consolidado de cada tutor para a fila de emails
+        Retorna: (registros, erros)
+        """
+        reference_date = self.reference_date()
+        records = []
+        errors = []
+        
+        for group in tutor_groups:
+            tutor = group["tutor"]
+            pets_list = group["pets"]
+            
+            try:
+                reminder_data = self.format_consolidated_reminder_for_email(pets_list)
+                records.append(outbox_record(
+                    self.OUTBOX_KIND,
+                    tutor["email"],
+                    reference_date,
+                    [pet_data["pet"]["id"] for pet_data in pets_list],
+                    self.reminder_subject(reminder_data),
+                    self.render_consolidated_reminder(tutor["name"], reminder_data)
+                ))
+            except Exception as e:
+                error_msg = f"Erro ao processar tutor {tutor['name']}: {str(e)}"
+                errors.append(error_msg)
+                self.logger.error(error_msg)
+        
+        # Os blocos reaproveitados valem só para o lote: memória limitada ao maior lote
+        self.renderer.clear()
+        return records, errors
     
     async def process_daily_notifications(self, dry_run: bool = False) -> Dict[str, Any]:
         """
         Processa todas as notificações diárias de tratamentos
+        Consolida por tutor: 1 email por tutor com os tratamentos de todos os seus pets
         """
         self.logger.info("Iniciando processamento de notificações diárias")
+        self.renderer.clear()
         
-        # Busca tratamentos de amanhã
-        success, treatments_data, message = await self.get_tomorrow_treatments_with_tutors()
+        # Busca os tratamentos do dia de referência (o mesmo gravado nos emails da fila)
+        success, treatments_data, message = await self.get_target_treatments_with_tutors()
         
         if not success:
             self.logger.error(f"Erro ao buscar tratamentos: {message}")
@@ -169,55 +306,78 @@ class NotificationService:
                 "success": False,
                 "message": message,
                 "total_pets": 0,
+                "total_tutors": 0,
                 "emails_sent": 0,
                 "errors": [],
                 "dry_run": dry_run
             }
         
         if not treatments_data:
-            self.logger.info("Nenhum tratamento encontrado para amanhã")
+            self.logger.info(f"Nenhum tratamento encontrado para {self.day_label()}")
             return {
                 "success": True,
-                "message": "Nenhum tratamento agendado para amanhã",
+                "message": f"Nenhum tratamento agendado para {self.day_label()}",
                 "total_pets": 0,
+                "total_tutors": 0,
                 "emails_sent": 0,
                 "errors": [],
                 "dry_run": dry_run
             }
         
-        # Processa cada pet com tratamentos
+        # Agrupa pets por tutor e processa cada tutor (1 email por tutor)
+        tutor_groups = self.group_pets_by_tutor(treatments_data)
         total_pets = len(treatments_data)
+        total_tutors = len(tutor_groups)
         emails_sent = 0
         errors = []
+        jobs = []
         
-        for pet_treatments in treatments_data:
-            try:
-                # Formata dados para email
-                email_data = self.format_treatments_for_email(pet_treatments)
-                
-                # Envia email para cada tutor
-                for tutor in pet_treatments["tutors"]:
-                    success, result_message = self.send_email_notification(
-                        tutor["email"], 
-                        tutor["name"], 
-                        email_data, 
-                        dry_run
-                    )
-                    
-                    if success:
-                        emails_sent += 1
-                        self.logger.info(result_message)
-                    else:
-                        errors.append(result_message)
-                        self.logger.error(result_message)
-            
-            except Exception as e:
-                error_msg = f"Erro ao processar pet {pet_treatments['pet']['name']}: {str(e)}"
-                errors.append(error_msg)
-                self.logger.error(error_msg)
+        if dry_run:
+            for group in tutor_groups:
+                tutor = group["tutor"]
+                try:
+                    reminder_data = self.format_consolidated_reminder_for_email(group["pets"])
+                    jobs.append(MailJob(
+                        tutor["email"],
+                        self.preview_consolidated_reminder,
+                        (tutor["email"], tutor["name"], reminder_data)
+                    ))
+                except Exception as e:
+                    error_msg = f"Erro ao processar tutor {tutor['name']}: {str(e)}"
+                    errors.append(error_msg)
+                    self.logger.error(error_msg)
+        else:
+            records, build_errors = self.build_outbox_records(tutor_groups)
+            errors.extend(build_errors)
+        
+        queue_stats = {}
+        if dry_run:
+            outcomes = await MailDispatcher().run(jobs)
+            deliveries = [
+                {"recipient": job.recipient, "success": success, "message": result_message}
+                for job, (success, result_message) in zip(jobs, outcomes)
+            ]
+        else:
+            # Grava os emails na fila durável e envia; falhas são retentadas depois
+            summary = await EmailOutboxService(self.session).deliver(records, self.OUTBOX_KIND)
+            deliveries = summary["deliveries"]
+            errors.extend(summary["errors"])
+            queue_stats = {"queued": summary["queued"], "already_queued": summary["already_queued"]}
+            self.logger.info(f"Fila de emails: {queue_stats}")
+        
+        for delivery in deliveries:
+            if delivery["success"]:
+                emails_sent += 1
+                self.logger.info(delivery["message"])
+            else:
+                errors.append(delivery["message"])
+                self.logger.error(delivery["message"])
         
         # Retorna resumo da execução
-        final_message = f"Processamento concluído: {emails_sent} emails enviados para {total_pets} pets"
+        final_message = (
+            f"Processamento concluído: {emails_sent} emails enviados para "
+            f"{total_tutors} tutores ({total_pets} pets)"
+        )
         if errors:
             final_message += f", {len(errors)} erros encontrados"
         
@@ -227,7 +387,10 @@ class NotificationService:
             "success": True,
             "message": final_message,
             "total_pets": total_pets,
+            "total_tutors": total_tutors,
             "emails_sent": emails_sent,
             "errors": errors,
+            "deliveries": deliveries,
+            **queue_stats,
             "dry_run": dry_run
         }
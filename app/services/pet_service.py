@@ -6,12 +6,54 @@ import random
 import logging
 from typing import Dict, Any, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from faker import Faker
 from faker_food import FoodProvider
 from app.repositories import PetRepository, UserRepository
+from app.services.file_service import FileService
+from app.database.connection import AsyncSessionLocal
 
 logger = logging.getLogger(__name__)
 
+# Frequências de recorrência disponíveis no formulário de tratamentos (RRULE)
+RECURRENCE_FREQUENCIES = {
+    "weekly": "FREQ=WEEKLY",
+    "monthly": "FREQ=MONTHLY",
+    "quarterly": "FREQ=MONTHLY;INTERVAL=3",
+    "semiannual": "FREQ=MONTHLY;INTERVAL=6",
+    "yearly": "FREQ=YEARLY",
+}
+
+
+def build_recurrence_rule(frequency: Optional[str], until: Optional[str] = None) -> Optional[str]:
+    """
+    Monta a RRULE a partir da frequência escolhida e da data final opcional (YYYY-MM-DD).
+    Retorna None para tratamentos sem recorrência.
+    """
+    if not frequency:
+        return None
+    if frequency not in RECURRENCE_FREQUENCIES:
+        raise ValueError(f"Frequência de recorrência inválida: {frequency}")
+    
+    rule = RECURRENCE_FREQUENCIES[frequency]
+    if until:
+        rule += f";UNTIL={until.replace('-', '')}"
+    return rule
+
+
+async def release_photo_in_background(pet_id: str, photo: Optional[Dict[str, Any]]) -> None:
+    """
+    Libera a foto antiga fora do caminho da requisição (BackgroundTasks).
+    Usa uma sessão própria; a rota deve fazer commit antes de agendá-la, pois
+    get_db só confirma a transação depois que as background tasks terminam.
+    """
+    try:
+        async with AsyncSessionLocal() as session:
+            await PetService(session).release_photo(pet_id, photo)
+    except Exception as e:
+        logger.error(f"Error releasing photo of pet {pet_id}: {e}")
+
+
 # Inicializa Faker e adiciona provedor de alimentos
 fake = Faker("pt_BR")
 fake.add_provider(FoodProvider)
@@ -141,6 +183,46 @@ class PetService:
         except Exception as e:
             return False, f"Erro ao remover pet: {str(e)}"
     
+    async def get_pet_photo(self, pet_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Busca apenas a foto atual do pet (sem carregar tratamentos)"""
+        return await self.pet_repo.get_pet_photo(pet_id, user_id)
+    
+    async def reserve_photo(self, content_hash: str) -> None:
+        """
+        Impede que o objeto `content_hash` seja removido por release_photo até o
+        commit da transação atual (em que o pet passa a referenciá-lo)
+        """
+        await self.pet_repo.lock_photo_object(content_hash, shared=True)
+    
+    async def release_photo(self, pet_id: str, photo: Optional[Dict[str, Any]]) -> bool:
+        """
+        Libera a foto antiga de um pet (após troca de foto ou exclusão).
+        Objetos endereçados por conteúdo só são removidos quando nenhum outro
+        pet ainda os referencia; fotos antigas ficam na pasta do próprio pet.
+        Retorna True se arquivos foram removidos.
+        """
+        if not photo:
+            return False
+        
+        content_hash = photo.get("hash")
+        if not content_hash:
+            return await run_in_threadpool(FileService.delete_pet_images, pet_id)
+        return await self.release_photo_object(content_hash)
+    
+    async def release_photo_object(self, content_hash: str) -> bool:
+        """
+        Remove o objeto de foto `content_hash` se nenhum pet o referencia mais.
+        Protocolo único de remoção (troca/exclusão de foto e limpeza periódica).
+        Retorna True se o objeto foi removido.
+        """
+        # Exclusivo: um upload que reaproveita o objeto espera a remoção (e o publica
+        # de novo), e a remoção espera o commit de um upload que já o reaproveitou
+        await self.pet_repo.lock_photo_object(content_hash)
+        references = await self.pet_repo.count_photo_references(content_hash)
+        if references:
+            return False
+        return await FileService.delete_photo_object(content_hash)
+    
     async def grant_veterinarian_access(
         self,
         pet_id: str,
@@ -0,0 +1,185 @@
+"""
+Service para aplicação de protocolos vacinais em lote (campanhas de vacinação)
+"""
+
+import re
+import logging
+from datetime import datetime, date, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.repositories import PetRepository, InfoRepository
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_PHASES = ("filhote", "adulto")
+
+# Limite de segurança para protocolos mal descritos
+MAX_DOSES_PER_PET = 12
+
+_UNIT_DAYS = {"dia": 1, "dias": 1, "semana": 7, "semanas": 7, "mês": 30, "meses": 30}
+
+_SINGLE_DOSE_RE = re.compile(r"dose\s+única", re.IGNORECASE)
+_N_DOSES_RE = re.compile(
+    r"(\d+)\s+doses\s+com\s+intervalo\s+de\s+(\d+)(?:\s*-\s*\d+)?\s+(dias|semanas|meses)",
+    re.IGNORECASE,
+)
+_FIRST_DOSE_RE = re.compile(
+    r"primeira\s+dose\s+(?:aos|às|as)\s+(\d+)\s+(dias|semanas|meses)", re.IGNORECASE
+)
+_BOOSTERS_RE = re.compile(
+    r"reforços\s+a\s+cada\s+(\d+)(?:\s*-\s*\d+)?\s+(dias|semanas|meses)"
+    r"\s+até\s+(\d+)\s+(dias|semanas|meses)",
+    re.IGNORECASE,
+)
+
+
+def expand_schedule_offsets(schedule_text: Optional[str], phase: str) -> List[int]:
+    """
+    Converte a descrição textual de `cronograma_vacinal` em deslocamentos (em dias)
+    a partir da data da primeira aplicação.
+
+    Exemplos:
+        "Primeira dose aos 45 dias, reforços a cada 21-30 dias até 16 semanas" -> [0, 21, 42, 63]
+        "A partir de 8 semanas, 2 doses com intervalo de 2-4 semanas"          -> [0, 14]
+        "Reforço anual"                                                        -> [0, 365]
+        "Dose única a partir dos 4 meses"                                      -> [0]
+
+    Para intervalos (ex: 21-30 dias) usa o menor valor. Textos não reconhecidos
+    resultam em uma única aplicação.
+    """
+    text = schedule_text or ""
+
+    match = _N_DOSES_RE.search(text)
+    if match:
+        doses = min(int(match.group(1)), MAX_DOSES_PER_PET)
+        interval = int(match.group(2)) * _UNIT_DAYS[match.group(3).lower()]
+        return [i * interval for i in range(doses)]
+
+    match = _BOOSTERS_RE.search(text)
+    if match:
+        interval = int(match.group(1)) * _UNIT_DAYS[match.group(2).lower()]
+        limit_age = int(match.group(3)) * _UNIT_DAYS[match.group(4).lower()]
+
+        first_match = _FIRST_DOSE_RE.search(text)
+        first_age = 0
+        if first_match:
+            first_age = int(first_match.group(1)) * _UNIT_DAYS[first_match.group(2).lower()]
+
+        boosters = max((limit_age - first_age) // interval, 0) if interval else 0
+        doses = min(boosters + 1, MAX_DOSES_PER_PET)
+        return [i * interval for i in range(doses)]
+
+    if _SINGLE_DOSE_RE.search(text):
+        return [0]
+
+    lowered = text.lower()
+    if phase == "adulto":
+        # Reforço periódico: aplicação da campanha + próximo reforço já agendado
+        if "semestral" in lowered and "anual" not in lowered:
+            return [0, 182]
+        if "anual" in lowered:
+            return [0, 365]
+
+    return [0]
+
+
+class ProtocolService:
+    """Serviço para expandir protocolos vacinais em tratamentos agendados"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.pet_repo = PetRepository(session)
+        self.info_repo = InfoRepository(session)
+
+    def build_protocol_treatments(
+        self,
+        vaccine: Dict[str, Any],
+        phase: str,
+        start_date: date,
+        pet_ids: List[str],
+        applier: Dict[str, Any],
+        time: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Gera os dados de tratamento (um por dose por pet) para o protocolo da vacina.
+        O tipo do aplicador vem do perfil (`applier["is_vet"]`).
+        """
+        schedule = vaccine.get("cronograma_vacinal") or {}
+        offsets = expand_schedule_offsets(schedule.get(phase), phase)
+        total_doses = len(offsets)
+
+        treatments = []
+        for pet_id in pet_ids:
+            for dose_number, offset in enumerate(offsets, 1):
+                dose_date = start_date + timedelta(days=offset)
+                description = f"Protocolo {phase}: dose {dose_number}/{total_doses}"
+                if schedule.get(phase):
+                    description += f" ({schedule[phase]})"
+
+                treatments.append({
+                    "pet_id": pet_id,
+                    "category": "Vacinas",
+                    "name": vaccine["nome_vacina"],
+                    "description": description,
+                    "date": dose_date.strftime("%Y-%m-%d"),
+                    "time": time,
+                    "done": False,
+                    "applier_type": "Veterinarian" if applier.get("is_vet") else "Tutor",
+                    "applier_name": applier.get("name"),
+                    "applier_id": applier.get("id"),
+                })
+
+        return treatments
+
+    async def apply_vaccine_protocol(
+        self,
+        vaccine_id: int,
+        pet_ids: List[str],
+        phase: str,
+        start_date: str,
+        applier: Dict[str, Any],
+        time: Optional[str] = None,
+    ) -> Tuple[bool, str, int]:
+        """
+        Aplica o protocolo de uma vacina a vários pets em uma única transação
+        Retorna: (sucesso, mensagem, quantidade_de_tratamentos_criados)
+        """
+        if phase not in PROTOCOL_PHASES:
+            return False, "Fase do protocolo inválida.", 0
+
+        unique_pet_ids = list(dict.fromkeys(pet_ids))
+        if not unique_pet_ids:
+            return False, "Selecione ao menos um pet.", 0
+
+        try:
+            start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        except ValueError:
+            return False, "Data inicial inválida.", 0
+
+        vaccine = await self.info_repo.get_vaccine_by_id(vaccine_id)
+        if not vaccine:
+            return False, "Vacina não encontrada.", 0
+
+        accessible_ids = await self.pet_repo.get_accessible_pet_ids(unique_pet_ids, applier["id"])
+        denied = len(unique_pet_ids) - len(accessible_ids)
+        if not accessible_ids:
+            return False, "Nenhum dos pets selecionados está acessível.", 0
+
+        treatments = self.build_protocol_treatments(
+            vaccine, phase, start, accessible_ids, applier, time
+        )
+
+        try:
+            created = await self.pet_repo.bulk_add_treatments(treatments)
+        except Exception as e:
+            logger.error(f"Error applying vaccine protocol: {e}")
+            await self.session.rollback()
+            return False, f"Erro ao aplicar protocolo: {str(e)}", 0
+
+        message = (
+            f"Protocolo {vaccine['nome_vacina']} aplicado: {created} tratamentos "
+            f"agendados para {len(accessible_ids)} pets."
+        )
+        if denied:
+            message += f" {denied} pets ignorados por falta de acesso."
+        return True, message, created
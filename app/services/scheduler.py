@@ -0,0 +1,259 @@
+"""
+Agendador em processo para as tarefas periódicas (lembretes, relatórios, limpeza).
+
+Opcional (SCHEDULER_ENABLED): iniciado no lifespan da aplicação, reaproveita o
+engine e o pool de conexões já abertos em vez de um cron externo subir um novo
+interpretador a cada execução. Cada tarefa tem uma expressão cron de 5 campos
+(minuto hora dia mês dia-da-semana, horário local). Com várias instâncias da
+aplicação, um advisory lock do PostgreSQL por tarefa garante que apenas uma
+réplica execute cada disparo; as demais pulam.
+"""
+
+import asyncio
+import hashlib
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, NamedTuple, Optional, Set
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app import config
+from app.database.connection import engine as default_engine
+
+logger = logging.getLogger(__name__)
+
+# Limite de cada campo: (mínimo, máximo); domingo pode ser 0 ou 7
+CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+# O agendador acorda ao menos a cada minuto (ajustes de relógio, horário de verão)
+MAX_SLEEP = 60.0
+
+
+def _parse_cron_field(field: str, minimum: int, maximum: int) -> Set[int]:
+    values: Set[int] = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"Passo inválido: {field}")
+        if part == "*":
+            start, end = minimum, maximum
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = int(part)
+            end = maximum if step > 1 else start
+        if start < minimum or end > maximum or start > end:
+            raise ValueError(f"Valor fora do intervalo {minimum}-{maximum}: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """Expressão cron de 5 campos (suporta *, listas, intervalos e passos)"""
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Expressão cron deve ter 5 campos: '{expression}'")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            _parse_cron_field(field, minimum, maximum)
+            for field, (minimum, maximum) in zip(fields, CRON_FIELDS)
+        )
+        if 7 in self.weekdays:
+            self.weekdays = (self.weekdays - {7}) | {0}
+        # Regra do cron: com dia do mês e dia da semana restritos, basta um dos dois
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        """Próximo horário (minuto exato) estritamente depois de `moment`"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Busca por dia e depois por hora/minuto; 4 anos cobrem 29/02
+        limit = candidate + timedelta(days=366 * 4)
+        while candidate < limit:
+            if candidate.month not in self.months or not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+                continue
+            if candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+                continue
+            return candidate
+        raise ValueError(f"Expressão cron sem próxima execução: '{self.expression}'")
+
+
+class ScheduledJob(NamedTuple):
+    """
+    Tarefa agendada: nome (também a chave do lock), expressão cron e corrotina.
+    Tarefas não exclusivas rodam em todas as réplicas (ex: shards divididos entre workers).
+    """
+    name: str
+    cron: str
+    run: Callable[[], Awaitable[Any]]
+    exclusive: bool = True
+
+
+def advisory_lock_key(name: str) -> int:
+    """Chave estável (int64 com sinal) do advisory lock de uma tarefa"""
+    digest = hashlib.sha256(f"pet_control:scheduler:{name}".encode()).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+class Scheduler:
+    """Dispara tarefas assíncronas em horários cron, uma réplica por disparo"""
+
+    def __init__(self, jobs: List[ScheduledJob], engine: AsyncEngine = default_engine):
+        self.jobs = jobs
+        self.engine = engine
+        self._schedules = {job.name: CronSchedule(job.cron) for job in jobs}
+        self._next_run: Dict[str, datetime] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        # Métricas
+        self._stats: Dict[str, Dict[str, Any]] = {
+            job.name: {"runs": 0, "failures": 0, "skipped_locked": 0, "skipped_running": 0, "last_run": None}
+            for job in jobs
+        }
+
+    @property
+    def started(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        """Inicia o laço do agendador (chamado no lifespan)"""
+        if self._task is None and self.jobs:
+            now = datetime.now()
+            self._next_run = {job.name: self._schedules[job.name].next_after(now) for job in self.jobs}
+            self._task = asyncio.create_task(self._loop())
+            for job in self.jobs:
+                logger.info(f"Scheduler: '{job.name}' ({job.cron}), next run at {self._next_run[job.name]}")
+
+    async def stop(self) -> None:
+        """Cancela o laço e as tarefas em execução"""
+        tasks = [task for task in (self._task, *self._running.values()) if task is not None]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._running.clear()
+
+    async def _loop(self) -> None:
+        while True:
+            now = datetime.now()
+            for job in self.jobs:
+                if self._next_run[job.name] <= now:
+                    self._next_run[job.name] = self._schedules[job.name].next_after(now)
+                    self._dispatch(job)
+            wake_at = min(self._next_run.values())
+            await asyncio.sleep(min(MAX_SLEEP, max(0.0, (wake_at - datetime.now()).total_seconds())))
+
+    def _dispatch(self, job: ScheduledJob) -> None:
+        running = self._running.get(job.name)
+        if running is not None and not running.done():
+            # Execução anterior ainda em andamento nesta instância
+            self._stats[job.name]["skipped_running"] += 1
+            logger.warning(f"Scheduler: '{job.name}' still running, skipping this run")
+            return
+        self._running[job.name] = asyncio.create_task(self.run_job(job))
+
+    @asynccontextmanager
+    async def _job_lock(self, job: ScheduledJob) -> AsyncIterator[bool]:
+        """
+        Advisory lock de sessão no PostgreSQL, mantido durante a tarefa.
+        Em outros bancos (SQLite em desenvolvimento/testes) não há lock entre processos.
+        """
+        if not job.exclusive or self.engine.dialect.name != "postgresql":
+            yield True
+            return
+
+        key = advisory_lock_key(job.name)
+        async with self.engine.connect() as connection:
+            acquired = (await connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": key})).scalar()
+            await connection.commit()
+            try:
+                yield bool(acquired)
+            finally:
+                if acquired:
+                    await connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+                    await connection.commit()
+
+    async def run_job(self, job: ScheduledJob) -> bool:
+        """Executa a tarefa se esta réplica obtiver o lock. Retorna se executou."""
+        stats = self._stats[job.name]
+        async with self._job_lock(job) as acquired:
+            if not acquired:
+                stats["skipped_locked"] += 1
+                logger.info(f"Scheduler: '{job.name}' is running on another instance, skipping")
+                return False
+
+            started_at = datetime.now()
+            logger.info(f"Scheduler: running '{job.name}'")
+            try:
+                await job.run()
+                status = "success"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                stats["failures"] += 1
+                status = f"error: {e}"
+                logger.error(f"Scheduler: '{job.name}' failed: {e}", exc_info=True)
+
+            stats["runs"] += 1
+            stats["last_run"] = {
+                "started_at": started_at.isoformat(timespec="seconds"),
+                "duration_seconds": round((datetime.now() - started_at).total_seconds(), 3),
+                "status": status,
+            }
+            return True
+
+    def metrics(self) -> Dict[str, Any]:
+        """Próximas execuções e resultados por tarefa"""
+        return {
+            "enabled": self.started,
+            "jobs": {
+                job.name: {
+                    "cron": job.cron,
+                    "next_run": self._next_run[job.name].isoformat() if job.name in self._next_run else None,
+                    **self._stats[job.name],
+                }
+                for job in self.jobs
+            },
+        }
+
+
+def build_default_jobs() -> List[ScheduledJob]:
+    """Tarefas da aplicação com expressão cron configurada (vazia = desativada)"""
+    from app.services.job_runner import JobRunner, DAILY_JOB, MONTHLY_JOB
+    from app.services.upload_janitor import upload_janitor
+
+    # Com shards, cada réplica processa os shards que conseguir reservar
+    sharded = config.JOB_SHARDS > 1
+    candidates = (
+        ("daily_notifications", config.SCHEDULER_DAILY_CRON, lambda: JobRunner().run(DAILY_JOB), not sharded),
+        ("monthly_reports", config.SCHEDULER_MONTHLY_CRON, lambda: JobRunner().run(MONTHLY_JOB), not sharded),
+        ("upload_janitor", config.SCHEDULER_JANITOR_CRON, upload_janitor.run_once, True),
+    )
+    return [ScheduledJob(name, cron, run, exclusive) for name, cron, run, exclusive in candidates if cron.strip()]
+
+
+# Instância compartilhada pela aplicação (iniciada no lifespan se SCHEDULER_ENABLED)
+scheduler = Scheduler(build_default_jobs() if config.SCHEDULER_ENABLED else [])
@@ -0,0 +1,247 @@
+"""
+Backends de armazenamento para as fotos enviadas (sistema de arquivos local ou S3).
+
+O processamento das imagens sempre acontece em uma pasta local temporária;
+o backend apenas publica a pasta pronta sob uma chave (`objects/ab/abcd...`),
+lê o manifesto, remove objetos e gera as URLs entregues ao navegador.
+"""
+
+import json
+import logging
+import mimetypes
+import os
+import shutil
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+class StorageBackend(ABC):
+    """Interface comum dos backends de armazenamento"""
+
+    @abstractmethod
+    async def publish_dir(self, local_dir: Path, key: str) -> bool:
+        """
+        Publica o conteúdo de `local_dir` sob `key` e remove a pasta local.
+        Retorna False se o objeto já existia (publicado por outra requisição).
+        """
+
+    @abstractmethod
+    async def read_json(self, key: str) -> Optional[Dict[str, Any]]:
+        """Lê um arquivo JSON do armazenamento (None se não existir)"""
+
+    @abstractmethod
+    async def delete_prefix(self, key: str) -> None:
+        """Remove todos os arquivos sob `key`"""
+
+    @abstractmethod
+    def list_prefixes(self, prefix: str) -> Iterator[str]:
+        """Lista as chaves de objetos (pastas de segundo nível) sob `prefix`"""
+
+    @abstractmethod
+    def prefix_size(self, key: str) -> int:
+        """Total de bytes armazenados sob `key`"""
+
+    @abstractmethod
+    async def fetch_file(self, key: str, destination: Path) -> Path:
+        """
+        Caminho local para ler o arquivo `key`. Backends remotos baixam para
+        `destination`; o local devolve o próprio arquivo, sem cópia.
+        """
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        """URL pública (ou assinada) para o navegador buscar o arquivo"""
+
+
+class LocalStorage(StorageBackend):
+    """Armazenamento no sistema de arquivos local, servido em /uploads"""
+
+    def __init__(self, root: Path, base_url: str = "/uploads"):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    async def publish_dir(self, local_dir: Path, key: str) -> bool:
+        target = self.path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            # Rename atômico: a pasta só aparece completa
+            os.rename(local_dir, target)
+            return True
+        except OSError:
+            if not target.exists():
+                raise
+            shutil.rmtree(local_dir, ignore_errors=True)
+            return False
+
+    async def read_json(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self.path(key)
+        if not path.exists():
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    async def delete_prefix(self, key: str) -> None:
+        path = self.path(key)
+        if path.is_dir():
+            shutil.rmtree(path)
+        elif path.exists():
+            path.unlink()
+
+    def list_prefixes(self, prefix: str) -> Iterator[str]:
+        base = self.path(prefix)
+        if not base.is_dir():
+            return
+        for shard in base.iterdir():
+            if not shard.is_dir():
+                continue
+            for entry in shard.iterdir():
+                if entry.is_dir() and not entry.name.startswith("."):
+                    yield entry.relative_to(self.root).as_posix()
+
+    def prefix_size(self, key: str) -> int:
+        path = self.path(key)
+        if path.is_file():
+            return path.stat().st_size
+        return sum(item.stat().st_size for item in path.rglob("*") if item.is_file())
+
+    async def fetch_file(self, key: str, destination: Path) -> Path:
+        path = self.path(key)
+        if not path.is_file():
+            raise FileNotFoundError(key)
+        return path
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+
+class S3Storage(StorageBackend):
+    """
+    Armazenamento em bucket S3 ou compatível (MinIO, R2, etc.).
+
+    Uploads usam `upload_file` do boto3, que faz multipart automaticamente para
+    arquivos grandes e lê do disco em partes. As URLs são públicas (S3_PUBLIC_URL,
+    ex: CDN na frente do bucket) ou assinadas com validade de S3_URL_EXPIRES.
+    """
+
+    # O manifesto é enviado por último: sua presença indica objeto completo
+    MANIFEST_NAME = "photo.json"
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        access_key_id: Optional[str] = None,
+        secret_access_key: Optional[str] = None,
+        public_url: Optional[str] = None,
+        url_expires: int = 3600,
+        client: Any = None,
+    ):
+        self.bucket = bucket
+        self.public_url = public_url.rstrip("/") if public_url else None
+        self.url_expires = url_expires
+
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError(
+                    "STORAGE_BACKEND=s3 requer o pacote boto3 (pip install 'pet-control[s3]')"
+                )
+            client = boto3.client(
+                "s3",
+                endpoint_url=endpoint_url,
+                region_name=region,
+                aws_access_key_id=access_key_id,
+                aws_secret_access_key=secret_access_key,
+            )
+        self.client = client
+
+    def _object_exists(self, key: str) -> bool:
+        response = self.client.list_objects_v2(Bucket=self.bucket, Prefix=key, MaxKeys=1)
+        return response.get("KeyCount", 0) > 0
+
+    def _publish_dir(self, local_dir: Path, key: str) -> bool:
+        manifest_key = f"{key}/{self.MANIFEST_NAME}"
+        if self._object_exists(manifest_key):
+            shutil.rmtree(local_dir, ignore_errors=True)
+            return False
+
+        files = sorted(
+            (path for path in local_dir.iterdir() if path.is_file()),
+            key=lambda path: path.name == self.MANIFEST_NAME,
+        )
+        for path in files:
+            content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+            self.client.upload_file(
+                str(path),
+                self.bucket,
+                f"{key}/{path.name}",
+                ExtraArgs={
+                    "ContentType": content_type,
+                    # Chaves endereçadas por conteúdo nunca mudam
+                    "CacheControl": "public, max-age=31536000, immutable",
+                },
+            )
+        shutil.rmtree(local_dir, ignore_errors=True)
+        return True
+
+    async def publish_dir(self, local_dir: Path, key: str) -> bool:
+        return await run_in_threadpool(self._publish_dir, local_dir, key)
+
+    def _read_json(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=key)
+        except Exception as e:
+            if getattr(e, "response", {}).get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+        return json.loads(response["Body"].read())
+
+    async def read_json(self, key: str) -> Optional[Dict[str, Any]]:
+        return await run_in_threadpool(self._read_json, key)
+
+    def _delete_prefix(self, key: str) -> None:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{key}/"):
+            objects: List[Dict[str, str]] = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+            if objects:
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": objects})
+
+    async def delete_prefix(self, key: str) -> None:
+        await run_in_threadpool(self._delete_prefix, key)
+
+    def list_prefixes(self, prefix: str) -> Iterator[str]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{prefix}/"):
+            for item in page.get("Contents", []):
+                if item["Key"].endswith(f"/{self.MANIFEST_NAME}"):
+                    yield item["Key"].rsplit("/", 1)[0]
+
+    def prefix_size(self, key: str) -> int:
+        paginator = self.client.get_paginator("list_objects_v2")
+        return sum(
+            item.get("Size", 0)
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{key}/")
+            for item in page.get("Contents", [])
+        )
+
+    async def fetch_file(self, key: str, destination: Path) -> Path:
+        await run_in_threadpool(self.client.download_file, self.bucket, key, str(destination))
+        return destination
+
+    def url(self, key: str) -> str:
+        if self.public_url:
+            return f"{self.public_url}/{key}"
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=self.url_expires,
+        )
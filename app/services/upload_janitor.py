@@ -0,0 +1,241 @@
+"""
+Limpeza periódica da pasta de uploads e do armazenamento de fotos.
+
+Reconcilia os arquivos enviados com a coluna `pets.photo` e remove:
+- objetos endereçados por conteúdo que nenhum pet ativo referencia;
+- pastas antigas por pet (`uploads/{pet_id}/`) de pets removidos ou sem foto;
+- arquivos e pastas de preparação em `uploads/temp/` mais antigos que o limite.
+
+Roda em uma tarefa asyncio própria (nunca bloqueia o startup) e remove em lotes
+com pausa entre eles. Um objeto órfão só é removido se continuar órfão na
+execução seguinte, o que protege uploads em andamento cujo pet ainda não foi
+gravado no banco; a remoção passa pelo mesmo protocolo da troca de foto
+(lock exclusivo, recontagem das referências e só então a exclusão).
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from starlette.concurrency import run_in_threadpool
+from app.database.connection import AsyncSessionLocal
+from app.repositories.pet_repository import PetRepository
+from app.services import file_service
+from app.services.pet_service import PetService
+
+logger = logging.getLogger(__name__)
+
+# Configuração (variáveis de ambiente)
+UPLOAD_JANITOR_INTERVAL = float(os.getenv("UPLOAD_JANITOR_INTERVAL", "3600"))  # 0 desativa
+UPLOAD_JANITOR_STARTUP_DELAY = float(os.getenv("UPLOAD_JANITOR_STARTUP_DELAY", "60"))
+UPLOAD_JANITOR_BATCH_SIZE = int(os.getenv("UPLOAD_JANITOR_BATCH_SIZE", "50"))
+UPLOAD_JANITOR_BATCH_PAUSE = float(os.getenv("UPLOAD_JANITOR_BATCH_PAUSE", "1"))
+UPLOAD_TEMP_MAX_AGE = float(os.getenv("UPLOAD_TEMP_MAX_AGE", "3600"))
+
+# Pastas de uploads/ que não pertencem a um pet
+RESERVED_DIRS = {file_service.OBJECTS_DIR, "temp"}
+
+
+def _path_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(item.stat().st_size for item in path.rglob("*") if item.is_file())
+
+
+def _remove_path(path: Path) -> int:
+    """Remove arquivo ou pasta local e retorna os bytes liberados"""
+    try:
+        size = _path_size(path)
+        if path.is_dir():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+        return size
+    except FileNotFoundError:
+        return 0
+
+
+def _expired_temp_entries(upload_dir: Path, max_age: float) -> List[Path]:
+    temp_dir = upload_dir / "temp"
+    if not temp_dir.is_dir():
+        return []
+    cutoff = time.time() - max_age
+    return [entry for entry in temp_dir.iterdir() if entry.stat().st_mtime < cutoff]
+
+
+def _legacy_pet_dirs(upload_dir: Path) -> List[Path]:
+    if not upload_dir.is_dir():
+        return []
+    return [
+        entry for entry in upload_dir.iterdir()
+        if entry.is_dir() and entry.name not in RESERVED_DIRS and not entry.name.startswith(".")
+    ]
+
+
+class UploadJanitor:
+    """Tarefa periódica que remove uploads órfãos e temporários expirados"""
+
+    def __init__(
+        self,
+        interval: float = UPLOAD_JANITOR_INTERVAL,
+        startup_delay: float = UPLOAD_JANITOR_STARTUP_DELAY,
+        batch_size: int = UPLOAD_JANITOR_BATCH_SIZE,
+        batch_pause: float = UPLOAD_JANITOR_BATCH_PAUSE,
+        temp_max_age: float = UPLOAD_TEMP_MAX_AGE,
+        session_factory: Callable[[], Any] = AsyncSessionLocal,
+    ):
+        self.interval = interval
+        self.startup_delay = startup_delay
+        self.batch_size = max(1, batch_size)
+        self.batch_pause = batch_pause
+        self.temp_max_age = temp_max_age
+        self.session_factory = session_factory
+        self._task: Optional[asyncio.Task] = None
+
+        # Órfãos vistos na execução anterior (removidos se continuarem órfãos)
+        self._orphan_objects: Set[str] = set()
+        self._orphan_dirs: Set[str] = set()
+
+        # Métricas
+        self._runs = 0
+        self._failures = 0
+        self._deleted = 0
+        self._reclaimed_bytes = 0
+        self._last_run: Optional[Dict[str, Any]] = None
+
+    @property
+    def started(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        """Agenda a tarefa periódica (chamado no lifespan; não aguarda a primeira execução)"""
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+            logger.info(f"Upload janitor scheduled every {self.interval:.0f}s")
+
+    async def stop(self) -> None:
+        """Cancela a tarefa periódica"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("Upload janitor stopped")
+
+    async def _loop(self) -> None:
+        await asyncio.sleep(self.startup_delay)
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._failures += 1
+                logger.error(f"Upload janitor run failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def _load_references(self) -> Tuple[Set[str], Set[str]]:
+        async with self.session_factory() as session:
+            hashes, legacy_paths = await PetRepository(session).get_photo_references()
+        legacy_dirs = {Path(original).parent.name for original in legacy_paths}
+        return hashes, legacy_dirs
+
+    async def _release_object(self, content_hash: str) -> bool:
+        """Remove um objeto órfão em sessão própria (lock, recontagem e exclusão)"""
+        async with self.session_factory() as session:
+            return await PetService(session).release_photo_object(content_hash)
+
+    async def _pause(self, index: int) -> None:
+        if index and index % self.batch_size == 0:
+            await asyncio.sleep(self.batch_pause)
+
+    async def run_once(self) -> Dict[str, Any]:
+        """
+        Executa uma reconciliação completa.
+        Retorna {"temp_files", "orphan_objects", "orphan_dirs", "reclaimed_bytes", "duration_ms"}.
+        """
+        started_at = time.perf_counter()
+        storage = file_service.get_storage()
+        upload_dir = file_service.UPLOAD_DIR
+
+        # Lista antes de consultar o banco: um objeto publicado depois da consulta
+        # não aparece na listagem e não pode ser confundido com órfão
+        object_keys = await run_in_threadpool(
+            lambda: list(storage.list_prefixes(file_service.OBJECTS_DIR))
+        )
+        pet_dirs = await run_in_threadpool(_legacy_pet_dirs, upload_dir)
+        temp_entries = await run_in_threadpool(_expired_temp_entries, upload_dir, self.temp_max_age)
+        hashes, legacy_dirs = await self._load_references()
+
+        orphan_objects = {key for key in object_keys if key.rsplit("/", 1)[-1] not in hashes}
+        orphan_dirs = {entry.name for entry in pet_dirs if entry.name not in legacy_dirs}
+
+        reclaimed = 0
+        removed_objects = 0
+        removed_dirs = 0
+        index = 0
+
+        for entry in temp_entries:
+            await self._pause(index)
+            reclaimed += await run_in_threadpool(_remove_path, entry)
+            index += 1
+
+        for key in sorted(orphan_objects & self._orphan_objects):
+            await self._pause(index)
+            size = await run_in_threadpool(storage.prefix_size, key)
+            if not await self._release_object(key.rsplit("/", 1)[-1]):
+                continue
+            reclaimed += size
+            removed_objects += 1
+            index += 1
+
+        for name in sorted(orphan_dirs & self._orphan_dirs):
+            await self._pause(index)
+            reclaimed += await run_in_threadpool(_remove_path, upload_dir / name)
+            removed_dirs += 1
+            index += 1
+
+        # Órfãos novos ficam para a próxima execução
+        self._orphan_objects = orphan_objects - self._orphan_objects
+        self._orphan_dirs = orphan_dirs - self._orphan_dirs
+
+        report = {
+            "temp_files": len(temp_entries),
+            "orphan_objects": removed_objects,
+            "orphan_dirs": removed_dirs,
+            "pending_orphans": len(self._orphan_objects) + len(self._orphan_dirs),
+            "reclaimed_bytes": reclaimed,
+            "duration_ms": round((time.perf_counter() - started_at) * 1000, 2),
+        }
+        self._runs += 1
+        self._deleted += index
+        self._reclaimed_bytes += reclaimed
+        self._last_run = report
+
+        if index:
+            logger.info(
+                f"Upload janitor removed {index} entries, reclaimed {reclaimed} bytes "
+                f"({report['temp_files']} temp, {removed_objects} objects, {removed_dirs} pet folders)"
+            )
+        return report
+
+    def metrics(self) -> Dict[str, Any]:
+        """Métricas acumuladas das execuções"""
+        return {
+            "started": self.started,
+            "interval_seconds": self.interval,
+            "runs": self._runs,
+            "failures": self._failures,
+            "deleted": self._deleted,
+            "reclaimed_bytes": self._reclaimed_bytes,
+            "last_run": self._last_run,
+        }
+
+
+# Instância compartilhada pela aplicação
+upload_janitor = UploadJanitor()
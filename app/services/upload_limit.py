@@ -0,0 +1,69 @@
+"""
+Limite de tamanho dos envios multipart, aplicado antes do parser de formulário.
+
+O parser multipart do Starlette grava o corpo inteiro em um SpooledTemporaryFile
+antes da rota rodar, então um limite verificado na rota só vale para a cópia.
+Este middleware ASGI recusa com 413 pedidos cujo Content-Length já excede o
+limite e conta os bytes recebidos dos demais (ex: Transfer-Encoding: chunked),
+interrompendo a leitura assim que o limite é ultrapassado.
+"""
+
+from typing import Optional
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config import MAX_FILE_SIZE
+
+# Folga para os demais campos do formulário e os delimitadores multipart
+MULTIPART_OVERHEAD = 1024 * 1024
+
+MAX_UPLOAD_BODY_SIZE = MAX_FILE_SIZE + MULTIPART_OVERHEAD
+
+TOO_LARGE_MESSAGE = f"Arquivo muito grande. Tamanho máximo: {MAX_FILE_SIZE // (1024 * 1024)}MB"
+
+
+class UploadLimitMiddleware:
+    """Recusa corpos multipart acima de `max_body_size` enquanto chegam"""
+
+    def __init__(self, app: ASGIApp, max_body_size: int = MAX_UPLOAD_BODY_SIZE):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        if not headers.get("content-type", "").startswith("multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = self._content_length(headers)
+        if content_length is not None and content_length > self.max_body_size:
+            # Recusa sem ler o corpo
+            response = JSONResponse({"detail": TOO_LARGE_MESSAGE}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    # Propaga pelo parser do formulário até o handler de HTTPException (413)
+                    raise HTTPException(status_code=413, detail=TOO_LARGE_MESSAGE)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    @staticmethod
+    def _content_length(headers: Headers) -> Optional[int]:
+        try:
+            return int(headers["content-length"])
+        except (KeyError, ValueError):
+            return None
@@ -0,0 +1,84 @@
+"""
+Entrega das fotos enviadas (/uploads) com cache de longa duração.
+
+Todas as URLs de upload são únicas por conteúdo (objetos endereçados por hash)
+ou por envio (`{pet_id}_{uuid}` das fotos antigas), então podem ser cacheadas
+como imutáveis. Requisições Range e condicionais (ETag/If-None-Match) são
+atendidas pelo FileResponse; o envio usa `http.response.pathsend` (zero-copy)
+quando o servidor ASGI oferece a extensão. Com UPLOADS_ACCEL_REDIRECT_PREFIX
+configurado, a aplicação só responde os cabeçalhos e delega o arquivo ao proxy
+(nginx) via X-Accel-Redirect.
+"""
+
+import mimetypes
+import os
+from typing import Optional
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+NO_CACHE_CONTROL = "no-store"
+
+# Pasta de arquivos temporários dentro de uploads/ (nunca cacheada)
+TEMP_PREFIX = "temp/"
+
+# Prefixo dos objetos endereçados por conteúdo: objects/{hash[:2]}/{hash}/{arquivo}
+OBJECTS_PREFIX = "objects/"
+
+
+def content_etag(relative_path: str) -> Optional[str]:
+    """
+    ETag forte derivada do hash do objeto (mesma chave = mesmo conteúdo).
+    Retorna None para arquivos fora do armazenamento endereçado por conteúdo.
+    """
+    if not relative_path.startswith(OBJECTS_PREFIX):
+        return None
+    parts = relative_path.split("/")
+    if len(parts) != 4:
+        return None
+    _, _, content_hash, name = parts
+    return f'"{content_hash}-{name}"'
+
+
+class UploadsStaticFiles(StaticFiles):
+    """StaticFiles com Cache-Control imutável, ETag forte e X-Accel-Redirect opcional"""
+    
+    def __init__(self, *args, accel_redirect_prefix: str = "", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.accel_redirect_prefix = accel_redirect_prefix.rstrip("/")
+    
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        root = os.path.realpath(self.directory) if self.directory else ""
+        relative_path = os.path.relpath(full_path, root).replace(os.sep, "/")
+        
+        headers = {
+            "cache-control": NO_CACHE_CONTROL if relative_path.startswith(TEMP_PREFIX) else IMMUTABLE_CACHE_CONTROL,
+        }
+        etag = content_etag(relative_path)
+        if etag:
+            headers["etag"] = etag
+        
+        if self.accel_redirect_prefix:
+            # O proxy entrega o arquivo (incluindo Range); a aplicação só define os cabeçalhos
+            headers["x-accel-redirect"] = f"{self.accel_redirect_prefix}/{relative_path}"
+            headers.setdefault("etag", FileResponse(full_path, stat_result=stat_result).headers["etag"])
+            response = Response(
+                status_code=status_code,
+                headers=headers,
+                media_type=mimetypes.guess_type(relative_path)[0] or "application/octet-stream",
+            )
+        else:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
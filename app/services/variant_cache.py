@@ -0,0 +1,154 @@
+"""
+Cache em disco das variantes de imagem geradas sob demanda (/img).
+
+O cache é limitado em bytes e remove os arquivos menos usados (LRU) quando o
+limite é ultrapassado. O índice fica em memória e é reconstruído na primeira
+utilização a partir da pasta (ordenado pela data de modificação). Requisições
+simultâneas para a mesma variante aguardam uma única geração.
+"""
+
+import asyncio
+import os
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+from starlette.concurrency import run_in_threadpool
+from app import config
+
+
+def _scan_cache(root: Path) -> "OrderedDict[str, int]":
+    entries = []
+    if root.is_dir():
+        for path in root.rglob("*"):
+            if path.is_file() and not path.name.startswith("."):
+                stat = path.stat()
+                entries.append((stat.st_mtime, path.relative_to(root).as_posix(), stat.st_size))
+    entries.sort()
+    return OrderedDict((key, size) for _, key, size in entries)
+
+
+class VariantCache:
+    """Cache LRU em disco com limite de tamanho e coalescência de gerações"""
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._index: Optional["OrderedDict[str, int]"] = None
+        self._index_lock: Optional[asyncio.Lock] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._size = 0
+
+        # Métricas
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    async def _ensure_index(self) -> "OrderedDict[str, int]":
+        if self._index is None:
+            # Criado sob demanda para pertencer ao event loop em execução
+            if self._index_lock is None:
+                self._index_lock = asyncio.Lock()
+            async with self._index_lock:
+                if self._index is None:
+                    index = await run_in_threadpool(_scan_cache, self.root)
+                    self._size = sum(index.values())
+                    self._index = index
+        return self._index
+
+    async def get_or_create(self, key: str, producer: Callable[[Path], Awaitable[None]]) -> Path:
+        """
+        Retorna o caminho da variante `key`, gerando-a com `producer(destino)` se
+        não estiver no cache. O produtor grava em um arquivo temporário, movido
+        para o lugar final só quando completo.
+        """
+        index = await self._ensure_index()
+        path = self.path(key)
+
+        if key in index:
+            if path.exists():
+                index.move_to_end(key)
+                self._hits += 1
+                return path
+            # Removido por fora (ex: limpeza manual)
+            self._size -= index.pop(key)
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            self._coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # A requisição que gerava foi cancelada: tenta gerar novamente
+                return await self.get_or_create(key, producer)
+
+        self._misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = path.with_name(f".{uuid.uuid4().hex}{path.suffix}")
+            try:
+                await producer(temp_path)
+                os.replace(temp_path, path)
+            finally:
+                if temp_path.exists():
+                    temp_path.unlink()
+
+            index[key] = path.stat().st_size
+            self._size += index[key]
+            await self._evict(keep=key)
+            future.set_result(path)
+            return path
+        except Exception as e:
+            future.set_exception(e)
+            # Evita aviso de exceção não lida quando ninguém aguardava
+            future.exception()
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            self._pending.pop(key, None)
+
+    async def _evict(self, keep: str) -> None:
+        index = self._index
+        victims = []
+        while self._size > self.max_bytes and len(index) > 1:
+            key, size = next(iter(index.items()))
+            if key == keep:
+                break
+            index.popitem(last=False)
+            self._size -= size
+            victims.append(key)
+        if victims:
+            self._evictions += len(victims)
+            await run_in_threadpool(self._remove_files, victims)
+
+    def _remove_files(self, keys) -> None:
+        for key in keys:
+            try:
+                self.path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def metrics(self) -> Dict[str, Any]:
+        """Métricas de uso do cache"""
+        return {
+            "entries": len(self._index) if self._index is not None else None,
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+            "coalesced": self._coalesced,
+            "evictions": self._evictions,
+        }
+
+
+# Instância compartilhada pela aplicação
+variant_cache = VariantCache(Path(config.IMAGE_CACHE_DIR), config.IMAGE_CACHE_MAX_BYTES)
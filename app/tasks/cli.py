@@ -0,0 +1,32 @@
+"""
+Utilitários de linha de comando compartilhados pelas tasks agendadas
+"""
+
+import json
+import sys
+from typing import Any, Dict
+
+
+def print_progress(event: Dict[str, Any]):
+    """Imprime o progresso emitido pelo JobRunner"""
+    if event["event"] == "started":
+        resumed = f" (retomando após {event['resumed_from']})" if event.get("resumed_from") else ""
+        if event["total_tutors"] is None:
+            # Leitura em fluxo: o total só é conhecido no final
+            print(f"\n▶️  Execução {event['run_key']}: processando tutores em fluxo{resumed}")
+        else:
+            print(f"\n▶️  Execução {event['run_key']}: {event['pending_tutors']}/{event['total_tutors']} tutores a processar{resumed}")
+    elif event["event"] == "chunk":
+        chunks = f"/{event['chunks']}" if event["chunks"] is not None else ""
+        print(f"   Lote {event['chunk']}{chunks}: {event['tutors_processed']} tutores processados, {event['queued']} emails na fila")
+    sys.stdout.flush()
+
+
+def write_summary_json(result: Dict[str, Any], destination: str):
+    """Grava o resumo da execução em JSON (arquivo ou '-' para a saída padrão)"""
+    content = json.dumps(result, ensure_ascii=False, indent=2, default=str)
+    if destination == "-":
+        print(content)
+    else:
+        with open(destination, "w", encoding="utf-8") as summary_file:
+            summary_file.write(content + "\n")
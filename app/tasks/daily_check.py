@@ -14,12 +14,16 @@ Execução:
 
     # Combinando opções
     uv run python app/tasks/daily_check.py --dry-run --verbose
+
+    # Recuperação de dias perdidos (datas dos tratamentos, até amanhã por padrão)
+    uv run python app/tasks/daily_check.py --from 2026-10-15 --to 2026-10-20
 """
 
 import sys
 import argparse
+import asyncio
 import logging
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from pathlib import Path
 
 # Adiciona o diretório raiz do projeto ao Python path
@@ -27,7 +31,9 @@ project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
 from app.services.notification_service import NotificationService
-from app.database import Database
+from app.database.connection import AsyncSessionLocal, close_db
+from app.services.job_runner import JobRunner, DAILY_JOB
+from app.tasks.cli import print_progress, write_summary_json
 
 
 def setup_logging(verbose: bool = False):
@@ -52,6 +58,14 @@ def setup_logging(verbose: bool = False):
     return logger
 
 
+def parse_date(value: str) -> date:
+    """Converte AAAA-MM-DD (argumentos --from/--to)"""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"data inválida: '{value}' (use AAAA-MM-DD)")
+
+
 def print_summary_table(result: dict):
     """Imprime um resumo formatado dos resultados"""
     print("\n" + "="*60)
@@ -68,12 +82,30 @@ def print_summary_table(result: dict):
     
     # Estatísticas
     print(f"Total de pets com tratamentos: {result['total_pets']}")
+    print(f"Total de tutores: {result.get('total_tutors', 0)}")
     print(f"Emails enviados/simulados: {result['emails_sent']}")
     print(f"Erros encontrados: {len(result.get('errors', []))}")
     
-    # Data alvo
-    tomorrow = datetime.now() + timedelta(days=1)
-    print(f"Data alvo: {tomorrow.strftime('%d/%m/%Y')}")
+    # Data alvo (ou datas recuperadas)
+    if result.get("dates"):
+        print("Datas recuperadas:")
+        for entry in result["dates"]:
+            status = "✅" if entry["success"] else "❌"
+            detail = f"{entry['queued']} emails na fila" if entry["processed"] else "já concluída"
+            print(f"  {status} {entry['run_key']}: {entry['total_tutors']} tutores, {detail}")
+    else:
+        tomorrow = datetime.now() + timedelta(days=1)
+        print(f"Data alvo: {tomorrow.strftime('%d/%m/%Y')}")
+    
+    # Checkpoint (execuções reais)
+    if result.get("resumed_from"):
+        print(f"Retomada após o checkpoint: {result['resumed_from']}")
+    
+    # Shards (execuções com vários workers)
+    shards = result.get("shards", [])
+    if len(shards) > 1:
+        claimed = [shard["run_key"] for shard in shards if shard["claimed"]]
+        print(f"Shards processados por este worker: {len(claimed)}/{len(shards)}")
     
     # Mensagem principal
     print(f"\nMensagem: {result['message']}")
@@ -87,7 +119,7 @@ def print_summary_table(result: dict):
     print("="*60)
 
 
-def print_detailed_treatments(notification_service: NotificationService, verbose: bool):
+async def print_detailed_treatments(notification_service: NotificationService, verbose: bool):
     """Imprime detalhes dos tratamentos encontrados"""
     if not verbose:
         return
@@ -95,7 +127,7 @@ def print_detailed_treatments(notification_service: NotificationService, verbose
     print("\n📋 DETALHES DOS TRATAMENTOS ENCONTRADOS:")
     print("-" * 50)
     
-    success, treatments_data, message = notification_service.get_tomorrow_treatments_with_tutors()
+    success, treatments_data, message = await notification_service.get_tomorrow_treatments_with_tutors()
     
     if not success:
         print(f"❌ Erro ao buscar tratamentos: {message}")
@@ -128,6 +160,22 @@ def print_detailed_treatments(notification_service: NotificationService, verbose
             print(f"     - {tutor['name']} ({tutor['email']})")
 
 
+async def run_task(args) -> dict:
+    """Executa a task pelo JobRunner (lotes com checkpoint, retomando execuções interrompidas)"""
+    try:
+        # Exibe detalhes dos tratamentos se verbose
+        if args.verbose:
+            async with AsyncSessionLocal() as session:
+                await print_detailed_treatments(NotificationService(session), args.verbose)
+        
+        runner = JobRunner(chunk_size=args.chunk_size, progress=print_progress, shards=args.shards)
+        if args.date_from:
+            return await runner.catch_up(DAILY_JOB, args.date_from, args.date_to, restart=args.restart)
+        return await runner.run(DAILY_JOB, dry_run=args.dry_run, restart=args.restart)
+    finally:
+        await close_db()
+
+
 def main():
     """Função principal da task"""
     parser = argparse.ArgumentParser(description='Verificação diária de tratamentos agendados')
@@ -135,9 +183,30 @@ def main():
                        help='Executa em modo simulação (não envia emails)')
     parser.add_argument('--verbose', '-v', action='store_true',
                        help='Exibe logs detalhados')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                       help='Tutores por lote (padrão: JOB_CHUNK_SIZE)')
+    parser.add_argument('--shards', type=int, default=None,
+                       help='Divide os tutores em N shards entre workers (padrão: JOB_SHARDS)')
+    parser.add_argument('--from', dest='date_from', type=parse_date, metavar='AAAA-MM-DD',
+                       help='Recupera dias perdidos: primeira data de tratamentos a notificar')
+    parser.add_argument('--to', dest='date_to', type=parse_date, metavar='AAAA-MM-DD',
+                       help='Última data da recuperação (padrão: amanhã)')
+    parser.add_argument('--restart', action='store_true',
+                       help='Ignora o checkpoint e reprocessa a execução do início')
+    parser.add_argument('--summary-json', metavar='ARQUIVO',
+                       help="Grava o resumo em JSON no arquivo ('-' para a saída padrão)")
     
     args = parser.parse_args()
     
+    if args.date_to and not args.date_from:
+        parser.error("--to exige --from")
+    if args.date_from:
+        if args.dry_run:
+            parser.error("--dry-run não é suportado na recuperação por intervalo (--from/--to)")
+        args.date_to = args.date_to or (datetime.now() + timedelta(days=1)).date()
+        if args.date_to < args.date_from:
+            parser.error("--to deve ser igual ou posterior a --from")
+    
     # Configura logging
     logger = setup_logging(args.verbose)
     
@@ -153,29 +222,12 @@ def main():
         print("🔍 MODO VERBOSE ATIVADO - Logs detalhados")
     
     try:
-        # Conecta ao banco de dados
-        logger.info("Conectando ao banco de dados...")
-        database = Database()
-        database.connect()
-        logger.info("Conexão com banco de dados estabelecida")
+        result = asyncio.run(run_task(args))
         
-        # Inicializa o serviço de notificações
-        logger.info("Inicializando serviço de notificações...")
-        notification_service = NotificationService()
-        
-        # Exibe detalhes dos tratamentos se verbose
-        print_detailed_treatments(notification_service, args.verbose)
-        
-        # Processa as notificações
-        logger.info("Iniciando processamento de notificações...")
-        result = notification_service.process_daily_notifications(dry_run=args.dry_run)
-        
-        # Imprime resumo
+        # Imprime resumo (e o resumo em JSON, se pedido)
         print_summary_table(result)
-        
-        # Fecha conexão com banco
-        database.close()
-        logger.info("Conexão com banco de dados fechada")
+        if args.summary_json:
+            write_summary_json(result, args.summary_json)
         
         # Define código de saída
         exit_code = 0 if result["success"] else 1
@@ -18,6 +18,7 @@ Execução:
 
 import sys
 import argparse
+import asyncio
 import logging
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -27,7 +28,9 @@ project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
 from app.services.monthly_report_service import MonthlyReportService
-from app.database import Database
+from app.database.connection import AsyncSessionLocal, close_db
+from app.services.job_runner import JobRunner, MONTHLY_JOB
+from app.tasks.cli import print_progress, write_summary_json
 
 
 def setup_logging(verbose: bool = False):
@@ -82,6 +85,16 @@ def print_summary_table(result: dict):
     current_month = datetime.now().strftime('%B de %Y')
     print(f"Mês de referência: {current_month}")
     
+    # Checkpoint (execuções reais)
+    if result.get("resumed_from"):
+        print(f"Retomada após o checkpoint: {result['resumed_from']}")
+    
+    # Shards (execuções com vários workers)
+    shards = result.get("shards", [])
+    if len(shards) > 1:
+        claimed = [shard["run_key"] for shard in shards if shard["claimed"]]
+        print(f"Shards processados por este worker: {len(claimed)}/{len(shards)}")
+    
     # Mensagem principal
     print(f"\nMensagem: {result['message']}")
     
@@ -94,7 +107,7 @@ def print_summary_table(result: dict):
     print("="*65)
 
 
-def print_detailed_treatments(report_service: MonthlyReportService, verbose: bool):
+async def print_detailed_treatments(report_service: MonthlyReportService, verbose: bool):
     """Imprime detalhes dos tratamentos encontrados"""
     if not verbose:
         return
@@ -102,7 +115,7 @@ def print_detailed_treatments(report_service: MonthlyReportService, verbose: boo
     print("\n📋 DETALHES DOS TRATAMENTOS ENCONTRADOS:")
     print("-" * 55)
     
-    success, treatments_data, message = report_service.get_monthly_treatments_with_tutors()
+    success, treatments_data, message = await report_service.get_monthly_treatments_with_tutors()
     
     if not success:
         print(f"❌ Erro ao buscar tratamentos: {message}")
@@ -156,6 +169,20 @@ def print_detailed_treatments(report_service: MonthlyReportService, verbose: boo
             print(f"     - {tutor['name']} ({tutor['email']})")
 
 
+async def run_task(args) -> dict:
+    """Executa a task pelo JobRunner (lotes com checkpoint, retomando execuções interrompidas)"""
+    try:
+        # Exibe detalhes dos tratamentos se verbose
+        if args.verbose:
+            async with AsyncSessionLocal() as session:
+                await print_detailed_treatments(MonthlyReportService(session), args.verbose)
+        
+        runner = JobRunner(chunk_size=args.chunk_size, progress=print_progress, shards=args.shards)
+        return await runner.run(MONTHLY_JOB, dry_run=args.dry_run, restart=args.restart)
+    finally:
+        await close_db()
+
+
 def main():
     """Função principal da task"""
     parser = argparse.ArgumentParser(description='Relatório mensal de tratamentos agendados e expirados')
@@ -163,6 +190,14 @@ def main():
                        help='Executa em modo simulação (não envia emails)')
     parser.add_argument('--verbose', '-v', action='store_true',
                        help='Exibe logs detalhados')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                       help='Tutores por lote (padrão: JOB_CHUNK_SIZE)')
+    parser.add_argument('--shards', type=int, default=None,
+                       help='Divide os tutores em N shards entre workers (padrão: JOB_SHARDS)')
+    parser.add_argument('--restart', action='store_true',
+                       help='Ignora o checkpoint e reprocessa a execução do início')
+    parser.add_argument('--summary-json', metavar='ARQUIVO',
+                       help="Grava o resumo em JSON no arquivo ('-' para a saída padrão)")
     
     args = parser.parse_args()
     
@@ -184,29 +219,12 @@ def main():
         print("🔍 MODO VERBOSE ATIVADO - Logs detalhados")
     
     try:
-        # Conecta ao banco de dados
-        logger.info("Conectando ao banco de dados...")
-        database = Database()
-        database.connect()
-        logger.info("Conexão com banco de dados estabelecida")
-        
-        # Inicializa o serviço de relatórios
-        logger.info("Inicializando serviço de relatórios mensais...")
-        report_service = MonthlyReportService()
-        
-        # Exibe detalhes dos tratamentos se verbose
-        print_detailed_treatments(report_service, args.verbose)
-        
-        # Processa os relatórios
-        logger.info("Iniciando processamento de relatórios mensais...")
-        result = report_service.process_monthly_reports(dry_run=args.dry_run)
+        result = asyncio.run(run_task(args))
         
-        # Imprime resumo
+        # Imprime resumo (e o resumo em JSON, se pedido)
         print_summary_table(result)
-        
-        # Fecha conexão com banco
-        database.close()
-        logger.info("Conexão com banco de dados fechada")
+        if args.summary_json:
+            write_summary_json(result, args.summary_json)
         
         # Define código de saída
         exit_code = 0 if result["success"] else 1
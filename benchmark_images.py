@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark do processamento de fotos enviadas (miniatura + variantes responsivas)
+
+Compara a decodificação completa com a decodificação reduzida (`Image.draft`)
+usada por `create_image_variants`. Cada imagem é processada em um processo novo
+para que o pico de memória (RSS) medido seja apenas daquela imagem.
+
+Exemplos:
+    # Corpus próprio (fotos reais de celular, etc.)
+    uv run python benchmark_images.py ~/fotos
+
+    # Sem argumentos: gera 4 fotos sintéticas de 12MP
+    uv run python benchmark_images.py
+
+    # Repetições por imagem
+    uv run python benchmark_images.py ~/fotos --repeat 3
+"""
+
+import argparse
+import multiprocessing
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Adiciona o diretório raiz do projeto ao Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from app.services.image_processing import create_image_variants, available_variant_formats
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+THUMBNAIL_SIZE = (300, 300)
+
+
+def generate_corpus(target_dir: Path, count: int = 4, size=(4032, 3024)) -> list:
+    """Gera fotos JPEG sintéticas do tamanho de uma câmera de celular (12MP)"""
+    from PIL import Image
+
+    paths = []
+    for index in range(count):
+        # Ruído + gradiente: comprime como foto real (não como cor sólida)
+        noise = Image.effect_noise(size, 40 + index * 10).convert("RGB")
+        gradient = Image.linear_gradient("L").resize(size).convert("RGB")
+        image = Image.blend(noise, gradient, 0.5)
+        path = target_dir / f"sintetica_{index}.jpg"
+        image.save(path, "JPEG", quality=90)
+        paths.append(path)
+    return paths
+
+
+def process_image(source: str, draft: bool, formats: tuple) -> dict:
+    """Executa o pipeline em um processo novo e mede tempo e pico de RSS"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_source = Path(work_dir) / Path(source).name
+        work_source.write_bytes(Path(source).read_bytes())
+
+        started_at = time.perf_counter()
+        create_image_variants(
+            str(work_source),
+            str(Path(work_dir) / "thumb.jpg"),
+            THUMBNAIL_SIZE,
+            formats=formats,
+            draft=draft,
+        )
+        elapsed = time.perf_counter() - started_at
+
+    return {"ms": elapsed * 1000, "rss_mb": peak_rss_mb()}
+
+
+def peak_rss_mb() -> float:
+    """Pico de RSS do processo atual em MB"""
+    # VmHWM é zerado no exec; ru_maxrss herdaria o pico do processo pai
+    status = Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    # ru_maxrss é em KB no Linux e em bytes no macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_isolated(pool_context, func, *args):
+    with ProcessPoolExecutor(max_workers=1, mp_context=pool_context) as pool:
+        return pool.submit(func, *args).result()
+
+
+def main():
+    """Função principal do benchmark"""
+    parser = argparse.ArgumentParser(description='Benchmark do processamento de fotos')
+    parser.add_argument('corpus', nargs='?',
+                       help='Pasta com imagens (padrão: gera fotos sintéticas de 12MP)')
+    parser.add_argument('--repeat', type=int, default=1,
+                       help='Execuções por imagem e modo (usa a mediana do tempo)')
+    parser.add_argument('--formats', default=','.join(available_variant_formats()),
+                       help='Formatos das variantes (padrão: todos suportados)')
+    args = parser.parse_args()
+
+    formats = tuple(fmt for fmt in args.formats.split(',') if fmt)
+    context = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        if args.corpus:
+            images = sorted(
+                path for path in Path(args.corpus).iterdir()
+                if path.suffix.lower() in IMAGE_EXTENSIONS
+            )
+        else:
+            print("Gerando corpus sintético (4 fotos 4032x3024)...")
+            images = generate_corpus(Path(corpus_dir))
+
+        if not images:
+            print("❌ Nenhuma imagem encontrada")
+            sys.exit(1)
+
+        base_rss = run_isolated(context, peak_rss_mb)
+        print(f"Formatos: {', '.join(formats) or '-'} | RSS base do processo: {base_rss:.1f} MB\n")
+        print(f"{'imagem':<32} {'modo':<8} {'tempo (ms)':>12} {'pico RSS (MB)':>14}")
+
+        totals = {False: [], True: []}
+        for image in images:
+            for draft in (False, True):
+                runs = [run_isolated(context, process_image, str(image), draft, formats)
+                        for _ in range(max(1, args.repeat))]
+                ms = statistics.median(run["ms"] for run in runs)
+                rss = max(run["rss_mb"] for run in runs)
+                totals[draft].append((ms, rss))
+                mode = "draft" if draft else "completo"
+                print(f"{image.name[:32]:<32} {mode:<8} {ms:>12.1f} {rss:>14.1f}")
+
+        print()
+        for draft, label in ((False, "completo"), (True, "draft")):
+            ms = statistics.mean(t for t, _ in totals[draft])
+            rss = statistics.mean(r for _, r in totals[draft])
+            print(f"Média {label:<9} {ms:>10.1f} ms {rss:>10.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@
 import os
 import sys
 import pytest
+import pytest_asyncio
 import asyncio
 import tempfile
 import shutil
@@ -39,7 +40,7 @@ def event_loop():
     loop.close()
 
 
-@pytest.fixture(scope="function")
+@pytest_asyncio.fixture(scope="function")
 async def db_session():
     """Create fresh database for each test"""
     from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
@@ -12,7 +12,7 @@ Exemplos:
     uv run python monthly_check.py --dry-run --verbose
 """
 
-import subprocess
+import runpy
 import sys
 from pathlib import Path
 
@@ -20,18 +20,9 @@ def main():
     # Caminho para o script real
     script_path = Path(__file__).parent / "app" / "tasks" / "monthly_check.py"
     
-    # Executa o script real com todos os argumentos passados
-    cmd = [sys.executable, str(script_path)] + sys.argv[1:]
-    
-    try:
-        result = subprocess.run(cmd, check=False)
-        sys.exit(result.returncode)
-    except KeyboardInterrupt:
-        print("\n❌ Execução interrompida pelo usuário")
-        sys.exit(1)
-    except Exception as e:
-        print(f"❌ Erro ao executar script: {e}")
-        sys.exit(1)
+    # Executa o script real no mesmo processo (os argumentos são repassados via sys.argv)
+    sys.argv[0] = str(script_path)
+    runpy.run_path(str(script_path), run_name="__main__")
 
 if __name__ == "__main__":
     main()
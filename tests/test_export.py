@@ -0,0 +1,76 @@
+"""Testes para exportação do histórico de tratamentos."""
+
+import csv
+import io
+import json
+
+import pytest
+import pytest_asyncio
+
+from app.services.export_service import ExportService, build_pdf, PDF_LINES_PER_PAGE
+
+
+@pytest.mark.unit
+class TestBuildPdf:
+    """Testes do gerador de PDF paginado."""
+
+    def test_paginates_lines(self):
+        lines = [f"Vacina {i} | Concluído" for i in range(PDF_LINES_PER_PAGE * 2 + 1)]
+        pdf = build_pdf("Histórico (Rex)", lines)
+
+        assert pdf.startswith(b"%PDF-1.4")
+        assert pdf.rstrip().endswith(b"%%EOF")
+        assert b"/Count 3" in pdf
+        assert "Concluído".encode("cp1252") in pdf
+
+
+@pytest.mark.database
+class TestExportService:
+    """Testes de integração da exportação com o banco."""
+
+    @pytest_asyncio.fixture
+    async def seeded_session(self, db_session):
+        from app.database.models import Profile, Pet, PetOwner, Treatment
+
+        db_session.add_all([
+            Profile(id="tutor1", name="Tutor", email="tutor@email.com"),
+            Pet(id="pet-a", name="Rex", breed="SRD", birth_date="2024-01-01", pet_type="dog"),
+            Pet(id="pet-b", name="Mia", breed="SRD", birth_date="2024-01-01", pet_type="cat"),
+        ])
+        await db_session.flush()
+        db_session.add_all([
+            PetOwner(pet_id="pet-a", profile_id="tutor1"),
+            PetOwner(pet_id="pet-b", profile_id="tutor1"),
+            Treatment(id="t1", pet_id="pet-a", category="Vacinas", name="V10",
+                      date="2025-01-10", done=True, applier_type="Tutor"),
+            Treatment(id="t2", pet_id="pet-a", category="Vermífugo", name="Drontal",
+                      date="2025-02-10", done=False, applier_type="Tutor"),
+            Treatment(id="t3", pet_id="pet-b", category="Vacinas", name="V4",
+                      date="2025-03-01", done=False, applier_type="Tutor"),
+        ])
+        await db_session.flush()
+        return db_session
+
+    @pytest.mark.asyncio
+    async def test_stream_csv_for_account(self, seeded_session):
+        service = ExportService(seeded_session)
+        pet_ids = await service.resolve_pet_ids("tutor1")
+
+        content = b"".join([chunk async for chunk in service.stream_csv(pet_ids)])
+        rows = list(csv.DictReader(io.StringIO(content.decode("utf-8"))))
+
+        assert [(r["pet_name"], r["name"]) for r in rows] == [
+            ("Mia", "V4"), ("Rex", "V10"), ("Rex", "Drontal")
+        ]
+
+    @pytest.mark.asyncio
+    async def test_stream_ndjson_for_single_pet(self, seeded_session):
+        service = ExportService(seeded_session)
+        pet_ids = await service.resolve_pet_ids("tutor1", "pet-a")
+        assert await service.resolve_pet_ids("outro", "pet-a") == []
+
+        content = b"".join([chunk async for chunk in service.stream_ndjson(pet_ids)])
+        records = [json.loads(line) for line in content.decode("utf-8").splitlines()]
+
+        assert [r["id"] for r in records] == ["t1", "t2"]
+        assert records[0]["done"] is True
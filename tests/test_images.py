@@ -0,0 +1,648 @@
+"""Testes para o processamento de imagens enviadas."""
+
+import asyncio
+import io
+import time
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+from app.services.image_executor import ImageExecutor, ImageExecutorBusy
+
+
+def _upload(filename="foto.jpg", size=(800, 600), fmt="JPEG"):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color="red").save(buffer, format=fmt)
+    buffer.seek(0)
+    return UploadFile(file=buffer, filename=filename)
+
+
+@pytest.mark.unit
+class TestImageExecutor:
+    """Testes do executor de imagens."""
+
+    @pytest.mark.asyncio
+    async def test_rejects_when_queue_is_full(self):
+        executor = ImageExecutor(max_workers=1, max_queue=0, queue_timeout=0.05)
+
+        first = asyncio.create_task(executor.run(time.sleep, 0.3))
+        await asyncio.sleep(0.01)
+        with pytest.raises(ImageExecutorBusy):
+            await executor.run(time.sleep, 0)
+        await first
+
+        metrics = executor.metrics()
+        assert metrics["completed"] == 1
+        assert metrics["rejected"] == 1
+        assert metrics["in_flight"] == 0
+        assert metrics["max_processing_ms"] >= 300
+
+
+@pytest.mark.unit
+class TestSaveImage:
+    """Testes do salvamento de imagens com miniatura."""
+
+    @pytest.mark.asyncio
+    async def test_saves_original_and_thumbnail(self, temp_upload_dir):
+        from app.services.file_service import FileService, THUMBNAIL_SIZE
+
+        photo = await FileService.save_image_with_thumbnail(_upload())
+
+        with Image.open(temp_upload_dir / photo["thumbnail"]) as thumb:
+            assert thumb.size[0] <= THUMBNAIL_SIZE[0]
+            assert thumb.size[1] <= THUMBNAIL_SIZE[1]
+        assert photo["key"] == f"objects/{photo['hash'][:2]}/{photo['hash']}"
+        assert (photo["width"], photo["height"]) == (800, 600)
+
+        # Larguras menores que o original + o próprio original no lugar de 1280
+        webp = photo["variants"]["webp"]
+        assert sorted(webp, key=int) == ["160", "320", "640", "800"]
+        with Image.open(temp_upload_dir / photo["key"] / webp["320"]) as variant:
+            assert variant.format == "WEBP"
+            assert variant.size == (320, 240)
+
+        sources = FileService.photo_sources("pet-a", photo)
+        assert sources["webp"].startswith(f"/uploads/{photo['key']}/{webp['160']} 160w, ")
+        assert FileService.photo_sources("pet-a", {"filename": "antiga.jpg"}) == {}
+        assert FileService.photo_url("pet-a", {"filename": "antiga.jpg"}) == "/uploads/pet-a/thumb_antiga.jpg"
+
+    def test_large_jpeg_decoded_at_reduced_scale(self, tmp_path):
+        from app.services.image_processing import create_image_variants
+
+        source = tmp_path / "grande.jpg"
+        Image.new("RGB", (4000, 3000), color="blue").save(source, "JPEG")
+
+        result = create_image_variants(str(source), str(tmp_path / "thumb.jpg"), (300, 300), formats=("webp",))
+
+        # Dimensões do original, mesmo decodificando em 1/2 (2000x1500)
+        assert (result["width"], result["height"]) == (4000, 3000)
+        with Image.open(tmp_path / result["variants"]["webp"]["1280"]) as variant:
+            assert variant.size == (1280, 960)
+        with Image.open(tmp_path / "thumb.jpg") as thumb:
+            assert thumb.size == (300, 225)
+
+    @pytest.mark.asyncio
+    async def test_duplicate_upload_reuses_object(self, temp_upload_dir):
+        from app.services.file_service import FileService
+
+        first = await FileService.save_image_with_thumbnail(_upload("a.jpg"))
+        second = await FileService.save_image_with_thumbnail(_upload("b.jpg"))
+
+        assert second == first
+        assert len(list((temp_upload_dir / "objects").glob("*/*"))) == 1
+        assert list((temp_upload_dir / "temp").iterdir()) == []
+
+    @pytest.mark.asyncio
+    async def test_invalid_image_is_removed(self, temp_upload_dir):
+        from app.services.file_service import FileService
+
+        upload = UploadFile(file=io.BytesIO(b"not an image"), filename="foto.jpg")
+        with pytest.raises(HTTPException) as exc:
+            await FileService.save_image_with_thumbnail(upload)
+
+        assert exc.value.status_code == 400
+        assert list((temp_upload_dir / "temp").iterdir()) == []
+        assert list((temp_upload_dir / "objects").rglob("*.*")) == []
+
+    @pytest.mark.asyncio
+    async def test_stream_upload_aborts_when_too_large(self, tmp_path):
+        from app.services.file_service import FileService, FileTooLargeError, UPLOAD_CHUNK_SIZE
+
+        upload = UploadFile(file=io.BytesIO(b"x" * (UPLOAD_CHUNK_SIZE * 5)), filename="foto.jpg")
+        destination = tmp_path / "foto.jpg"
+        with pytest.raises(FileTooLargeError):
+            await FileService.stream_upload_to_file(upload, destination, max_size=UPLOAD_CHUNK_SIZE * 2)
+
+        assert list(tmp_path.iterdir()) == []
+        # Aborta no bloco que ultrapassou o limite, sem consumir o restante
+        assert upload.file.tell() == UPLOAD_CHUNK_SIZE * 3
+
+
+@pytest.mark.database
+class TestPhotoReferences:
+    """Testes da contagem de referências de fotos compartilhadas."""
+
+    @pytest.mark.asyncio
+    async def test_object_removed_only_after_last_reference(self, db_session, temp_upload_dir):
+        from app.database.models import Pet
+        from app.services import PetService
+        from app.services.file_service import FileService
+
+        photo = await FileService.save_image_with_thumbnail(_upload())
+        rex = Pet(id="pet-a", name="Rex", breed="SRD", birth_date="2024-01-01", pet_type="dog", photo=photo)
+        bob = Pet(id="pet-b", name="Bob", breed="SRD", birth_date="2024-01-01", pet_type="dog", photo=photo)
+        db_session.add_all([rex, bob])
+        await db_session.flush()
+
+        service = PetService(db_session)
+        object_dir = temp_upload_dir / FileService.photo_object_key(photo["hash"])
+
+        rex.soft_delete()
+        await db_session.flush()
+        assert await service.release_photo("pet-a", photo) is False
+        assert object_dir.exists()
+
+        bob.photo = None
+        await db_session.flush()
+        assert await service.release_photo("pet-b", photo) is True
+        assert not object_dir.exists()
+
+    def test_delete_route_removes_object_after_commit(self, temp_upload_dir, tmp_path, monkeypatch):
+        """A liberação em background (outra sessão) já vê o pet excluído pela rota"""
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+        from sqlalchemy.pool import NullPool
+        import app.services.pet_service as pet_service_module
+        from app.database.base import Base
+        from app.database.connection import get_db
+        from app.database.models import Pet, PetOwner, Profile
+        from app.routes.auth_routes import get_current_user_from_session
+        from app.routes.pet_routes import router
+        from app.services.file_service import FileService
+
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'pets.db'}", poolclass=NullPool)
+        session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+        async def setup():
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            photo = await FileService.save_image_with_thumbnail(_upload())
+            async with session_factory() as session:
+                session.add(Profile(id="tutor1", name="Tutor", email="tutor@email.com"))
+                session.add(Pet(id="pet-a", name="Rex", breed="SRD", birth_date="2024-01-01", pet_type="dog", photo=photo))
+                session.add(PetOwner(pet_id="pet-a", profile_id="tutor1"))
+                await session.commit()
+            return photo
+
+        photo = asyncio.run(setup())
+        object_dir = temp_upload_dir / FileService.photo_object_key(photo["hash"])
+        assert object_dir.exists()
+
+        async def test_get_db():
+            # Mesmo comportamento de get_db: commit só depois da resposta e das background tasks
+            async with session_factory() as session:
+                yield session
+                await session.commit()
+
+        monkeypatch.setattr(pet_service_module, "AsyncSessionLocal", session_factory)
+        app = FastAPI()
+        app.include_router(router)
+        app.dependency_overrides[get_db] = test_get_db
+        app.dependency_overrides[get_current_user_from_session] = lambda: {"id": "tutor1", "info": {"name": "Tutor"}}
+
+        response = TestClient(app).post("/pets/pet-a/delete", follow_redirects=False)
+
+        assert response.status_code == 303
+        assert not object_dir.exists()
+        asyncio.run(engine.dispose())
+
+    @pytest.mark.asyncio
+    async def test_release_locks_object_before_counting(self, db_session, temp_upload_dir, monkeypatch):
+        """Contagem e remoção acontecem sob o lock exclusivo do hash; o upload reserva o hash"""
+        from app.repositories.pet_repository import PetRepository
+        from app.services import PetService
+        from app.services.file_service import FileService
+
+        calls = []
+
+        async def lock(self, content_hash, shared=False):
+            calls.append(("lock_shared" if shared else "lock", content_hash))
+
+        original_count = PetRepository.count_photo_references
+
+        async def count(self, content_hash):
+            calls.append(("count", content_hash))
+            return await original_count(self, content_hash)
+
+        monkeypatch.setattr(PetRepository, "lock_photo_object", lock)
+        monkeypatch.setattr(PetRepository, "count_photo_references", count)
+        service = PetService(db_session)
+
+        photo = await FileService.save_image_with_thumbnail(_upload(), reserve=service.reserve_photo)
+        assert await service.release_photo("pet-a", photo) is True
+
+        assert calls == [("lock_shared", photo["hash"]), ("lock", photo["hash"]), ("count", photo["hash"])]
+
+    @pytest.mark.asyncio
+    async def test_photo_lock_uses_transaction_advisory_lock_on_postgresql(self):
+        from unittest.mock import AsyncMock, MagicMock
+        from app.repositories.pet_repository import PetRepository, photo_lock_key
+
+        session = MagicMock()
+        session.bind.dialect.name = "postgresql"
+        session.execute = AsyncMock()
+        repo = PetRepository(session)
+
+        await repo.lock_photo_object("ab" * 32, shared=True)
+        await repo.lock_photo_object("ab" * 32)
+
+        statements = [str(call.args[0]) for call in session.execute.await_args_list]
+        assert statements == ["SELECT pg_advisory_xact_lock_shared(:key)", "SELECT pg_advisory_xact_lock(:key)"]
+        assert session.execute.await_args_list[0].args[1] == {"key": photo_lock_key("ab" * 32)}
+
+    @pytest.mark.asyncio
+    async def test_pet_created_with_final_photo_in_single_write(self, db_session, temp_upload_dir):
+        from app.database.models import Profile
+        from app.services import PetService
+        from app.services.file_service import FileService
+
+        db_session.add(Profile(id="tutor1", name="Tutor", email="tutor@email.com"))
+        await db_session.flush()
+
+        photo = await FileService.save_image_with_thumbnail(_upload())
+        service = PetService(db_session)
+        success, _, pet_id = await service.create_pet(
+            {"name": "Rex", "breed": "SRD", "birth_date": "2024-01-01", "pet_type": "dog", "photo": photo},
+            "tutor1",
+        )
+
+        assert success
+        assert await service.get_pet_photo(pet_id, "tutor1") == photo
+        assert await service.get_pet_photo(pet_id, "outro") is None
+        assert (temp_upload_dir / photo["original"]).exists()
+        assert not any((temp_upload_dir / "temp").glob("*"))
+
+
+class FakeS3Client:
+    """Stand-in em memória da API S3 usada pelo S3Storage (estilo MinIO local)."""
+
+    def __init__(self):
+        self.objects = {}
+
+    def list_objects_v2(self, Bucket, Prefix, MaxKeys=1000):
+        keys = sorted(k for k in self.objects if k.startswith(Prefix))[:MaxKeys]
+        return {"KeyCount": len(keys), "Contents": [{"Key": k} for k in keys]}
+
+    def upload_file(self, filename, bucket, key, ExtraArgs=None):
+        with open(filename, "rb") as f:
+            self.objects[key] = (f.read(), ExtraArgs)
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            error = Exception("NoSuchKey")
+            error.response = {"Error": {"Code": "NoSuchKey"}}
+            raise error
+        return {"Body": io.BytesIO(self.objects[Key][0])}
+
+    def get_paginator(self, name):
+        client = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                yield client.list_objects_v2(Bucket, Prefix)
+
+        return Paginator()
+
+    def delete_objects(self, Bucket, Delete):
+        for item in Delete["Objects"]:
+            self.objects.pop(item["Key"], None)
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://s3.local/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+
+@pytest.mark.unit
+class TestS3Storage:
+    """Testes do backend S3 com cliente em memória."""
+
+    @pytest.mark.asyncio
+    async def test_upload_dedup_and_release(self, temp_upload_dir, monkeypatch):
+        import app.services.file_service as file_service_module
+        from app.services.file_service import FileService
+        from app.services.storage import S3Storage
+
+        client = FakeS3Client()
+        storage = S3Storage(bucket="pets", client=client, url_expires=60)
+        monkeypatch.setattr(file_service_module, "get_storage", lambda: storage)
+
+        photo = await FileService.save_image_with_thumbnail(_upload())
+        again = await FileService.save_image_with_thumbnail(_upload())
+
+        assert again == photo
+        assert f"{photo['key']}/photo.json" in client.objects
+        assert client.objects[f"{photo['key']}/thumb.jpg"][1]["ContentType"] == "image/jpeg"
+        assert list(storage.list_prefixes("objects")) == [photo["key"]]
+        assert FileService.photo_url("pet-a", photo) == f"https://s3.local/pets/{photo['key']}/thumb.jpg?expires=60"
+        assert list((temp_upload_dir / "temp").iterdir()) == []
+
+        assert await FileService.delete_photo_object(photo["hash"]) is True
+        assert client.objects == {}
+
+    def test_backend_interface_is_abstract(self):
+        from app.services.storage import StorageBackend
+
+        class Partial(StorageBackend):
+            def url(self, key):
+                return key
+
+        with pytest.raises(TypeError):
+            Partial()
+
+    def test_unknown_backend_is_rejected(self, monkeypatch):
+        import app.services.file_service as file_service_module
+
+        monkeypatch.setattr(file_service_module.config, "STORAGE_BACKEND", "s4")
+        with pytest.raises(ValueError):
+            file_service_module.get_storage()
+
+    def test_config_rejects_invalid_storage_backend(self):
+        import os
+        import subprocess
+        import sys
+
+        for env, message in (
+            ({"STORAGE_BACKEND": "s4"}, "STORAGE_BACKEND"),
+            ({"STORAGE_BACKEND": "s3", "S3_BUCKET": ""}, "S3_BUCKET"),
+        ):
+            result = subprocess.run(
+                [sys.executable, "-c", "import app.config"],
+                env={**os.environ, **env},
+                capture_output=True,
+                text=True,
+            )
+            assert result.returncode != 0
+            assert message in result.stderr
+
+
+@pytest.mark.unit
+class TestUploadsServing:
+    """Testes da entrega de /uploads com cache imutável."""
+
+    @pytest.fixture
+    def uploads_root(self, tmp_path):
+        object_dir = tmp_path / "objects" / "ab" / ("ab" + "0" * 62)
+        object_dir.mkdir(parents=True)
+        (object_dir / "thumb.jpg").write_bytes(b"0123456789")
+        (tmp_path / "temp").mkdir()
+        (tmp_path / "temp" / "upload.jpg").write_bytes(b"x")
+        return tmp_path
+
+    def _client(self, root, **kwargs):
+        from starlette.applications import Starlette
+        from starlette.routing import Mount
+        from starlette.testclient import TestClient
+        from app.services.upload_serving import UploadsStaticFiles
+
+        app = Starlette(routes=[Mount("/uploads", UploadsStaticFiles(directory=str(root), **kwargs))])
+        return TestClient(app)
+
+    def test_immutable_cache_etag_and_range(self, uploads_root):
+        client = self._client(uploads_root)
+        url = f"/uploads/objects/ab/ab{'0' * 62}/thumb.jpg"
+
+        response = client.get(url)
+        assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+        assert response.headers["etag"] == f'"ab{"0" * 62}-thumb.jpg"'
+
+        assert client.get(url, headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+        partial = client.get(url, headers={"Range": "bytes=2-5"})
+        assert partial.status_code == 206
+        assert partial.content == b"2345"
+
+        assert client.get("/uploads/temp/upload.jpg").headers["cache-control"] == "no-store"
+
+    def test_accel_redirect_delegates_body_to_proxy(self, uploads_root):
+        client = self._client(uploads_root, accel_redirect_prefix="/protected-uploads/")
+
+        response = client.get(f"/uploads/objects/ab/ab{'0' * 62}/thumb.jpg")
+        assert response.headers["x-accel-redirect"] == f"/protected-uploads/objects/ab/ab{'0' * 62}/thumb.jpg"
+        assert response.headers["content-type"] == "image/jpeg"
+        assert response.content == b""
+
+
+@pytest.mark.database
+class TestUploadJanitor:
+    """Testes da limpeza periódica de uploads."""
+
+    @pytest.mark.asyncio
+    async def test_removes_expired_temp_and_confirmed_orphans(self, db_session, temp_upload_dir):
+        import os
+        from contextlib import asynccontextmanager
+        from app.database.models import Pet
+        from app.services.file_service import FileService
+        from app.services.upload_janitor import UploadJanitor
+
+        used = await FileService.save_image_with_thumbnail(_upload())
+        orphan = await FileService.save_image_with_thumbnail(_upload(size=(640, 480)))
+        (temp_upload_dir / "pet-legacy").mkdir()
+        (temp_upload_dir / "pet-legacy" / "foto.jpg").write_bytes(b"legacy")
+        (temp_upload_dir / "pet-removido").mkdir()
+        (temp_upload_dir / "pet-removido" / "foto.jpg").write_bytes(b"removed")
+        stale = temp_upload_dir / "temp" / "abandonado.jpg"
+        stale.write_bytes(b"x" * 10)
+        os.utime(stale, (time.time() - 7200, time.time() - 7200))
+
+        db_session.add_all([
+            Pet(id="pet-a", name="Rex", breed="SRD", birth_date="2024-01-01", pet_type="dog", photo=used),
+            Pet(id="pet-legacy", name="Mia", breed="SRD", birth_date="2024-01-01", pet_type="cat",
+                photo={"original": "uploads/pet-legacy/foto.jpg", "thumbnail": "uploads/pet-legacy/thumb.jpg"}),
+        ])
+        await db_session.flush()
+
+        @asynccontextmanager
+        async def session_factory():
+            yield db_session
+
+        janitor = UploadJanitor(batch_size=1, batch_pause=0, session_factory=session_factory)
+
+        first = await janitor.run_once()
+        assert first["temp_files"] == 1
+        assert first["reclaimed_bytes"] == 10
+        assert first["pending_orphans"] == 2
+        assert (temp_upload_dir / orphan["key"]).exists()
+
+        second = await janitor.run_once()
+        assert second["orphan_objects"] == 1
+        assert second["orphan_dirs"] == 1
+        assert second["reclaimed_bytes"] > len(b"removed")
+        assert not (temp_upload_dir / orphan["key"]).exists()
+        assert not (temp_upload_dir / "pet-removido").exists()
+        assert (temp_upload_dir / used["key"]).exists()
+        assert (temp_upload_dir / "pet-legacy" / "foto.jpg").exists()
+        assert janitor.metrics()["deleted"] == 3
+
+    @pytest.mark.asyncio
+    async def test_keeps_orphan_referenced_between_runs(self, db_session, temp_upload_dir):
+        """Um pet que passa a usar o objeto entre as execuções impede a remoção"""
+        from contextlib import asynccontextmanager
+        from app.database.models import Pet
+        from app.services.file_service import FileService
+        from app.services.upload_janitor import UploadJanitor
+
+        photo = await FileService.save_image_with_thumbnail(_upload())
+
+        @asynccontextmanager
+        async def session_factory():
+            yield db_session
+
+        janitor = UploadJanitor(batch_size=1, batch_pause=0, session_factory=session_factory)
+
+        first = await janitor.run_once()
+        assert first["pending_orphans"] == 1
+
+        load_references = janitor._load_references
+
+        async def reference_after_snapshot():
+            # O pet é gravado depois da consulta das referências: a recontagem sob o lock o vê
+            references = await load_references()
+            db_session.add(Pet(id="pet-a", name="Rex", breed="SRD", birth_date="2024-01-01",
+                               pet_type="dog", photo=photo))
+            await db_session.flush()
+            return references
+
+        janitor._load_references = reference_after_snapshot
+        second = await janitor.run_once()
+        assert second["orphan_objects"] == 0
+        assert second["reclaimed_bytes"] == 0
+        assert (temp_upload_dir / photo["key"]).exists()
+
+
+@pytest.mark.unit
+class TestImageVariants:
+    """Testes das variantes sob demanda (/img) e do cache em disco."""
+
+    @pytest.fixture
+    def cache(self, tmp_path, monkeypatch):
+        import app.services.file_service as file_service_module
+        from app.services.variant_cache import VariantCache
+
+        cache = VariantCache(tmp_path / "cache", max_bytes=10 * 1024 * 1024)
+        monkeypatch.setattr(file_service_module, "variant_cache", cache)
+        return cache
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_render_once(self, temp_upload_dir, cache):
+        from app.services.file_service import FileService
+
+        photo = await FileService.save_image_with_thumbnail(_upload())
+        paths = await asyncio.gather(*[
+            FileService.render_photo_variant("pet-a", photo, (160, 160), "webp") for _ in range(5)
+        ])
+
+        assert len(set(paths)) == 1
+        with Image.open(paths[0]) as variant:
+            assert (variant.format, variant.size) == ("WEBP", (160, 160))
+        metrics = cache.metrics()
+        assert (metrics["misses"], metrics["coalesced"]) == (1, 4)
+
+        await FileService.render_photo_variant("pet-a", photo, (160, 160), "webp")
+        assert cache.metrics()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_evicts_least_recently_used(self, tmp_path):
+        from app.services.variant_cache import VariantCache
+
+        cache = VariantCache(tmp_path, max_bytes=250)
+
+        def producer(size):
+            async def write(target):
+                target.write_bytes(b"x" * size)
+            return write
+
+        first = await cache.get_or_create("a.jpg", producer(100))
+        await cache.get_or_create("b.jpg", producer(100))
+        await cache.get_or_create("a.jpg", producer(100))
+        await cache.get_or_create("c.jpg", producer(100))
+
+        assert first.exists()
+        assert not (tmp_path / "b.jpg").exists()
+        assert cache.metrics()["bytes"] == 200
+        assert cache.metrics()["evictions"] == 1
+
+    def test_route_whitelist_and_cache_headers(self, temp_upload_dir, cache, monkeypatch):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from app.database.connection import get_db
+        from app.repositories.pet_repository import PetRepository
+        from app.routes.image_routes import router
+        from app.services.file_service import FileService
+
+        photo = asyncio.run(FileService.save_image_with_thumbnail(_upload()))
+
+        async def get_photo(self, pet_id):
+            return photo if pet_id == "pet-a" else None
+
+        monkeypatch.setattr(PetRepository, "get_active_pet_photo", get_photo)
+        app = FastAPI()
+        app.include_router(router)
+        app.dependency_overrides[get_db] = lambda: None
+        client = TestClient(app)
+
+        url = FileService.photo_variant_url("pet-a", photo, 160, 160)
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/jpeg"
+        assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+        assert client.get(url, headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+        assert client.get("/img/pet-a/160x160.jpg").headers["cache-control"] == "public, max-age=300"
+        short = f"/img/pet-a/160x160.jpg?v={photo['hash'][:1]}"
+        assert client.get(short).headers["cache-control"] == "public, max-age=300"
+        assert client.get("/img/pet-a/161x161.jpg").status_code == 404
+        assert client.get("/img/pet-b/160x160.jpg").status_code == 404
+
+
+@pytest.mark.unit
+class TestUploadLimit:
+    """Testes do limite de tamanho aplicado antes do parser multipart."""
+
+    @pytest.fixture
+    def client(self):
+        from fastapi import FastAPI, File
+        from fastapi.testclient import TestClient
+        from app.services.upload_limit import UploadLimitMiddleware
+
+        app = FastAPI()
+        app.add_middleware(UploadLimitMiddleware, max_body_size=64 * 1024)
+        app.state.handled = []
+
+        @app.post("/upload")
+        async def upload(photo: UploadFile = File(...)):
+            app.state.handled.append(photo.filename)
+            return {"size": photo.size}
+
+        return TestClient(app)
+
+    def test_small_upload_passes(self, client):
+        response = client.post("/upload", files={"photo": ("foto.jpg", b"x" * 1024, "image/jpeg")})
+        assert response.status_code == 200
+        assert response.json() == {"size": 1024}
+
+    def test_content_length_over_limit_is_rejected_before_parsing(self, client):
+        response = client.post("/upload", files={"photo": ("foto.jpg", b"x" * 128 * 1024, "image/jpeg")})
+        assert response.status_code == 413
+        assert client.app.state.handled == []
+
+    def test_body_without_content_length_stops_at_limit(self):
+        from starlette.exceptions import HTTPException as StarletteHTTPException
+        from app.services.upload_limit import UploadLimitMiddleware
+
+        chunks_read = []
+
+        async def receive():
+            chunks_read.append(1)
+            return {"type": "http.request", "body": b"x" * 16 * 1024, "more_body": True}
+
+        async def app(scope, receive, send):
+            while True:
+                await receive()
+
+        async def send(message):
+            pass
+
+        scope = {
+            "type": "http",
+            "method": "POST",
+            "path": "/upload",
+            "headers": [(b"content-type", b"multipart/form-data; boundary=x")],
+        }
+        middleware = UploadLimitMiddleware(app, max_body_size=64 * 1024)
+
+        with pytest.raises(StarletteHTTPException) as error:
+            asyncio.run(middleware(scope, receive, send))
+
+        assert error.value.status_code == 413
+        assert len(chunks_read) == 5
@@ -0,0 +1,339 @@
+import asyncio
+import threading
+import pytest
+import pytest_asyncio
+from datetime import date, timedelta
+from unittest.mock import patch, AsyncMock
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+
+from app.database.base import Base
+from app.database.models import JobRun, EmailOutbox
+from app.repositories import JobRunRepository
+from app.services.email_outbox_service import MONTHLY_REPORT, outbox_record
+from app.services.email_templates import EmailRenderer
+from app.services.job_runner import JobRunner, DAILY_JOB, MONTHLY_JOB, shard_of, shard_run_key
+from app.services.monthly_report_service import MonthlyReportService
+from app.services.notification_service import NotificationService
+
+
+def _treatments_data():
+    """Três tutores; Ana tem dois pets"""
+    return [
+        {
+            "pet": {"id": "pet1", "name": "Rex", "nickname": "rex_1234"},
+            "treatments": [{"name": "Vacina"}],
+            "tutors": [{"id": "u1", "email": "ana@email.com", "name": "Ana"}, {"id": "u2", "email": "bia@email.com", "name": "Bia"}]
+        },
+        {
+            "pet": {"id": "pet2", "name": "Mia", "nickname": "mia_5678"},
+            "treatments": [{"name": "Vermífugo"}],
+            "tutors": [{"id": "u1", "email": "ana@email.com", "name": "Ana"}, {"id": "u3", "email": "caio@email.com", "name": "Caio"}]
+        },
+    ]
+
+
+class TestJobRunner:
+    """Testes do executor das tasks em lotes com checkpoint"""
+    
+    @pytest_asyncio.fixture
+    async def session_factory(self):
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        await engine.dispose()
+    
+    @pytest.fixture
+    def smtp_pool(self):
+        with patch('app.services.email_outbox_service.SMTPTransportPool') as mock_pool, \
+             patch('app.config.validate_gmail_config', return_value=(True, "ok")), \
+             patch.object(NotificationService, 'get_tomorrow_treatments_with_tutors', new_callable=AsyncMock) as mock_get:
+            mock_pool.return_value.metrics.return_value = {}
+            mock_get.return_value = (True, _treatments_data(), "Tratamentos encontrados")
+            yield mock_pool.return_value
+    
+    @pytest.mark.asyncio
+    async def test_resumes_from_last_checkpoint(self, session_factory, smtp_pool):
+        """Depois de uma falha, a próxima execução continua do último lote gravado"""
+        original_build = NotificationService.build_outbox_records
+        calls = []
+        
+        def build_failing_on_second_chunk(service, tutor_groups):
+            calls.append([group["key"] for group in tutor_groups])
+            if len(calls) == 2:
+                raise RuntimeError("queda no meio da execução")
+            return original_build(service, tutor_groups)
+        
+        events = []
+        runner = JobRunner(chunk_size=2, session_factory=session_factory, progress=events.append)
+        
+        with patch.object(NotificationService, 'build_outbox_records', build_failing_on_second_chunk):
+            first = await runner.run(DAILY_JOB)
+        
+        assert first["success"] is False
+        assert "queda no meio da execução" in first["message"]
+        assert first["queued"] == 2
+        # O lote confirmado antes da falha já foi enviado
+        assert first["emails_sent"] == 2
+        
+        second = await runner.run(DAILY_JOB)
+        
+        assert second["success"] is True
+        assert second["resumed_from"] == "bia@email.com"
+        assert second["chunks"] == 1
+        assert second["queued"] == 3
+        assert second["emails_sent"] == 1
+        assert calls[-1] == ["caio@email.com"]
+        assert [event["event"] for event in events].count("chunk") == 2
+        
+        async with session_factory() as session:
+            run = (await session.execute(select(JobRun))).scalar_one()
+            assert (run.status, run.attempts, run.chunks_done) == ("completed", 2, 2)
+            
+            outbox = (await session.execute(select(EmailOutbox))).scalars().all()
+            assert sorted(entry.recipient for entry in outbox) == ["ana@email.com", "bia@email.com", "caio@email.com"]
+            assert {entry.status for entry in outbox} == {"sent"}
+    
+    @pytest.mark.asyncio
+    async def test_dry_run_does_not_checkpoint(self, session_factory, smtp_pool):
+        """Dry-run não grava execução, fila nem envia"""
+        result = await JobRunner(session_factory=session_factory).run(DAILY_JOB, dry_run=True)
+        
+        assert result["success"] is True
+        assert result["emails_sent"] == 3
+        assert result["dry_run"] is True
+        smtp_pool.send_message.assert_not_called()
+        
+        async with session_factory() as session:
+            assert (await session.execute(select(JobRun))).first() is None
+            assert (await session.execute(select(EmailOutbox))).first() is None
+    
+    @pytest.mark.asyncio
+    async def test_shards_are_split_between_workers(self, session_factory, smtp_pool):
+        """Cada worker processa só os shards que reservou; reservas expiradas são retomadas"""
+        reference = NotificationService(None).reference_date().isoformat()
+        held_key = shard_run_key(reference, 1, 2)
+        async with session_factory() as session:
+            # Outro worker reservou o shard 2 (reserva já expirada)
+            await JobRunRepository(session).claim_run("daily", held_key, "worker-b", lease_seconds=-1)
+            await session.commit()
+        
+        worker_a = JobRunner(session_factory=session_factory, shards=2, worker_id="worker-a")
+        first = await worker_a.run(DAILY_JOB)
+        
+        assert first["success"] is True
+        # Shard 2 expirado: worker-a também o processa
+        assert [shard["claimed"] for shard in first["shards"]] == [True, True]
+        assert first["queued"] == 3
+        
+        async with session_factory() as session:
+            runs = (await session.execute(select(JobRun).order_by(JobRun.run_key))).scalars().all()
+            assert [run.run_key for run in runs] == [shard_run_key(reference, 0, 2), held_key]
+            assert {run.status for run in runs} == {"completed"}
+            assert {run.owner for run in runs} == {None}
+        
+        # Nova execução: nada a reservar, apenas a fila é enviada
+        second = await JobRunner(session_factory=session_factory, shards=2, worker_id="worker-b").run(DAILY_JOB)
+        assert second["success"] is True
+        assert not any(shard["claimed"] for shard in second["shards"])
+        assert second["queued"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_shard_leased_by_other_worker_is_skipped(self, session_factory, smtp_pool):
+        """Um shard com reserva válida de outro worker não é processado"""
+        reference = NotificationService(None).reference_date().isoformat()
+        emails = ["ana@email.com", "bia@email.com", "caio@email.com"]
+        async with session_factory() as session:
+            await JobRunRepository(session).claim_run("daily", shard_run_key(reference, 0, 2), "worker-b", lease_seconds=600)
+            await session.commit()
+        
+        result = await JobRunner(session_factory=session_factory, shards=2, worker_id="worker-a").run(DAILY_JOB)
+        
+        expected = [email for email in emails if shard_of(email, 2) == 1]
+        assert result["shards"][0] == {"run_key": shard_run_key(reference, 0, 2), "claimed": False, "status": "running", "owner": "worker-b"}
+        assert result["queued"] == len(expected)
+        
+        async with session_factory() as session:
+            outbox = (await session.execute(select(EmailOutbox))).scalars().all()
+            assert sorted(entry.recipient for entry in outbox) == expected
+    
+    @pytest.mark.asyncio
+    async def test_checkpoint_and_finish_require_lease_owner(self, session_factory):
+        """Checkpoint e conclusão de um worker que perdeu a reserva não são gravados"""
+        async with session_factory() as session:
+            runs = JobRunRepository(session)
+            run = await runs.claim_run("daily", "2026-10-20", "worker-a", lease_seconds=-1)
+            # Reserva expirada: worker-b assume a execução
+            assert await runs.claim_run("daily", "2026-10-20", "worker-b", lease_seconds=600) is not None
+            
+            assert await runs.checkpoint(run["id"], "worker-a", "bia@email.com", {"queued": 2}) is False
+            assert await runs.finish_run(run["id"], "worker-a", {"queued": 2}) is False
+            assert await runs.checkpoint(run["id"], "worker-b", "ana@email.com", {"queued": 1}, lease_seconds=600) is True
+            await session.commit()
+            
+            current = await runs.get_run("daily", "2026-10-20")
+            assert (current["owner"], current["status"], current["cursor"]) == ("worker-b", "running", "ana@email.com")
+    
+    @pytest.mark.asyncio
+    async def test_lost_lease_stops_shard(self, session_factory, smtp_pool):
+        """Se outro worker assumiu o shard, o lote não é confirmado nem enviado"""
+        from sqlalchemy import update
+        from app.repositories.email_outbox_repository import EmailOutboxRepository
+        
+        original_enqueue = EmailOutboxRepository.enqueue
+        
+        async def enqueue_while_lease_is_taken(repo, records):
+            await repo.session.execute(update(JobRun).values(owner="worker-b"))
+            return await original_enqueue(repo, records)
+        
+        events = []
+        runner = JobRunner(chunk_size=2, session_factory=session_factory, worker_id="worker-a", progress=events.append)
+        with patch.object(EmailOutboxRepository, 'enqueue', enqueue_while_lease_is_taken):
+            result = await runner.run(DAILY_JOB)
+        
+        assert result["shards"][0]["lease_lost"] is True
+        assert result["queued"] == 0
+        assert result["emails_sent"] == 0
+        assert "lease_lost" in [event["event"] for event in events]
+        smtp_pool.send_message.assert_not_called()
+        
+        async with session_factory() as session:
+            run = (await session.execute(select(JobRun))).scalar_one()
+            assert (run.status, run.chunks_done) == ("running", 0)
+            assert (await session.execute(select(EmailOutbox))).first() is None
+    
+    @pytest.mark.asyncio
+    async def test_monthly_streams_and_sends_each_chunk(self, session_factory, smtp_pool):
+        """Relatório mensal em fluxo: cada lote é enviado antes de ler os próximos tutores"""
+        sent_before_read = []
+        
+        async def stream(service, after_key=None, shard=0, shards=1):
+            for index, name in enumerate(["ana", "bia", "caio"], 1):
+                key = f"{name}@email.com|u{index}"
+                if after_key is None or key > after_key:
+                    sent_before_read.append(smtp_pool.send_message.call_count)
+                    yield {
+                        "key": key,
+                        "tutor": {"id": f"u{index}", "email": f"{name}@email.com", "name": name.title()},
+                        "pets": [{"pet": {"id": f"pet{index}"}}],
+                    }
+        
+        def build(service, tutor_groups):
+            records = [
+                outbox_record(MONTHLY_REPORT, group["tutor"]["email"], service.reference_date(), ["pet"], "Relatório", "<p>ok</p>")
+                for group in tutor_groups
+            ]
+            return records, [], {"total_current_treatments": len(records), "total_expired_treatments": 0}
+        
+        events = []
+        runner = JobRunner(chunk_size=2, session_factory=session_factory, progress=events.append)
+        with patch.object(MonthlyReportService, 'iter_tutor_reports', stream), \
+             patch.object(MonthlyReportService, 'build_outbox_records', build):
+            result = await runner.run(MONTHLY_JOB)
+        
+        assert result["success"] is True
+        assert sent_before_read == [0, 0, 2]
+        assert (result["total_tutors"], result["total_pets"], result["chunks"]) == (3, 3, 2)
+        assert result["emails_sent"] == 3
+        assert result["total_current_treatments"] == 3
+        assert result["shards"][0]["tutors"] == 3
+        assert events[0]["total_tutors"] is None
+        
+        async with session_factory() as session:
+            run = (await session.execute(select(JobRun))).scalar_one()
+            assert (run.status, run.cursor) == ("completed", "caio@email.com|u3")
+    
+    @pytest.mark.asyncio
+    async def test_rendered_sections_bounded_by_chunk(self, session_factory, smtp_pool):
+        """Os blocos de pets guardados pelo renderer são descartados a cada lote"""
+        async def stream(service, after_key=None, shard=0, shards=1):
+            for index in range(6):
+                key = f"tutor{index}@email.com|u{index}"
+                if after_key is None or key > after_key:
+                    yield {
+                        "key": key,
+                        "tutor": {"id": f"u{index}", "email": f"tutor{index}@email.com", "name": f"Tutor {index}"},
+                        "pets": [{
+                            "pet": {"id": f"pet{index}", "name": f"Pet {index}", "nickname": f"pet_{index}"},
+                            "current_month_treatments": [{"name": "Vacina", "date": "2026-10-25"}],
+                            "expired_treatments": [],
+                        }],
+                    }
+        
+        peak = []
+        original_render_section = EmailRenderer.render_section
+        
+        def render_section(renderer, template_name, key, **context):
+            section = original_render_section(renderer, template_name, key, **context)
+            peak.append(len(renderer._sections))
+            return section
+        
+        with patch.object(MonthlyReportService, 'iter_tutor_reports', stream), \
+             patch.object(EmailRenderer, 'render_section', render_section):
+            result = await JobRunner(chunk_size=2, session_factory=session_factory).run(MONTHLY_JOB)
+        
+        assert result["success"] is True
+        assert result["queued"] == 6
+        assert len(peak) == 6
+        assert max(peak) == 2
+    
+    @pytest.mark.asyncio
+    async def test_chunks_rendered_off_event_loop(self, session_factory, smtp_pool):
+        """A renderização dos lotes roda em uma thread, não no event loop"""
+        original_build = NotificationService.build_outbox_records
+        threads = []
+        
+        def build_in_thread(service, tutor_groups):
+            threads.append(threading.current_thread())
+            return original_build(service, tutor_groups)
+        
+        with patch.object(NotificationService, 'build_outbox_records', build_in_thread):
+            result = await JobRunner(chunk_size=2, session_factory=session_factory).run(DAILY_JOB)
+        
+        assert result["success"] is True
+        assert threads and threading.main_thread() not in threads
+    
+    def test_shard_of_is_stable(self):
+        assert shard_of("ana@email.com", 1) == 0
+        assert shard_of("ana@email.com", 8) == shard_of("ana@email.com", 8)
+        assert {shard_of(f"tutor{i}@email.com", 4) for i in range(100)} == {0, 1, 2, 3}
+    
+    @pytest.mark.asyncio
+    async def test_catch_up_processes_each_date_once(self, session_factory, smtp_pool):
+        """Recuperação: uma busca para o intervalo, uma execução concluída por data"""
+        first_day = date(2026, 10, 10)
+        data = _treatments_data()
+        by_date = {first_day: data[:1], first_day + timedelta(days=2): data[1:]}
+        
+        with patch.object(NotificationService, 'get_treatments_with_tutors_by_date', new_callable=AsyncMock) as mock_range:
+            mock_range.return_value = (True, by_date, "Tratamentos encontrados")
+            runner = JobRunner(session_factory=session_factory)
+            result = await runner.catch_up(DAILY_JOB, first_day, first_day + timedelta(days=2))
+            
+            assert mock_range.await_count == 1
+            assert result["success"] is True
+            assert [entry["run_key"] for entry in result["dates"]] == ["2026-10-10", "2026-10-11", "2026-10-12"]
+            # Ana e Bia no dia 10; Ana e Caio no dia 12 (outro email para Ana, outra data)
+            assert result["queued"] == 4
+            assert result["emails_sent"] == 4
+            
+            # Datas concluídas são puladas numa nova recuperação
+            again = await runner.catch_up(DAILY_JOB, first_day, first_day + timedelta(days=2))
+            assert not any(entry["processed"] for entry in again["dates"])
+            assert again["queued"] == 0
+        
+        async with session_factory() as session:
+            runs = (await session.execute(select(JobRun).order_by(JobRun.run_key))).scalars().all()
+            assert [(run.run_key, run.status) for run in runs] == [
+                ("2026-10-10", "completed"), ("2026-10-11", "completed"), ("2026-10-12", "completed")
+            ]
+            outbox = (await session.execute(select(EmailOutbox))).scalars().all()
+            assert {entry.reference_date for entry in outbox} == {first_day, first_day + timedelta(days=2)}
+            ana = next(entry for entry in outbox if entry.recipient == "ana@email.com" and entry.reference_date == first_day)
+            assert "10/10/2026" in ana.html_body
+    
+    def test_catch_up_requires_range_support(self):
+        from app.services.job_runner import MONTHLY_JOB
+        with pytest.raises(ValueError):
+            asyncio.run(JobRunner().catch_up(MONTHLY_JOB, date(2026, 10, 1), date(2026, 10, 2)))
@@ -1,6 +1,7 @@
 import pytest
+import pytest_asyncio
 from unittest.mock import Mock, patch, MagicMock, AsyncMock
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 import smtplib
 import tempfile
@@ -89,6 +90,22 @@ class TestNotificationService:
         assert len(data[0]["tutors"]) == 2
         assert "1 pets com tratamentos agendados" in message
     
+    @pytest.mark.asyncio
+    async def test_get_tomorrow_treatments_fetches_tutors_once(self, notification_service, mock_pet_data, mock_tutor_data):
+        """Testa que os tutores de todos os pets são buscados em uma única consulta"""
+        second_pet = dict(mock_pet_data[0], _id="pet2", name="Mia", nickname="mia_5678", users=["user2", "user3"])
+        notification_service.pet_repo.get_tomorrow_scheduled_treatments = AsyncMock(
+            return_value=mock_pet_data + [second_pet]
+        )
+        notification_service.user_repo.get_user_emails_by_ids = AsyncMock(return_value=mock_tutor_data)
+        
+        success, data, message = await notification_service.get_tomorrow_treatments_with_tutors()
+        
+        assert success is True
+        notification_service.user_repo.get_user_emails_by_ids.assert_awaited_once_with(["user1", "user2", "user3"])
+        assert [t["id"] for t in data[0]["tutors"]] == ["user1", "user2"]
+        assert [t["id"] for t in data[1]["tutors"]] == ["user2"]
+    
     @pytest.mark.asyncio
     async def test_get_tomorrow_treatments_no_treatments(self, notification_service):
         """Testa quando não há tratamentos para amanhã"""
@@ -153,100 +170,21 @@ class TestNotificationService:
         tomorrow = (datetime.now() + timedelta(days=1)).strftime("%d/%m/%Y")
         assert formatted["date"] == tomorrow
     
-    def test_send_email_notification_dry_run(self, notification_service):
-        """Testa envio de email em modo dry-run"""
-        email_data = {
-            "pet_name": "Rex",
-            "pet_nickname": "rex_1234",
-            "date": "09/11/2025",
-            "treatments": [],
-            "total_treatments": 0
-        }
-        
-        # Mock do template
-        with patch.object(notification_service.jinja_env, 'get_template') as mock_template:
-            mock_template.return_value.render.return_value = "<html>Test</html>"
-            
-            success, message = notification_service.send_email_notification(
-                "test@email.com", "Teste", email_data, dry_run=True
+    def test_preview_consolidated_reminder(self, notification_service):
+        """Dry-run renderiza o lembrete sem abrir conexão SMTP"""
+        reminder_data = notification_service.format_consolidated_reminder_for_email([
+            {"pet": {"name": "Rex", "nickname": "rex_1234"}, "treatments": [{"name": "Vacina"}]},
+        ])
+        
+        with patch('app.services.mail_transport.smtplib.SMTP') as mock_smtp:
+            success, message = notification_service.preview_consolidated_reminder(
+                "test@email.com", "Teste", reminder_data
             )
         
         assert success is True
         assert "[DRY RUN]" in message
         assert "test@email.com" in message
-    
-    @patch('app.services.notification_service.validate_gmail_config')
-    @patch('app.services.notification_service.smtplib.SMTP')
-    def test_send_email_notification_real_success(self, mock_smtp, mock_validate, notification_service):
-        """Testa envio real de email com sucesso"""
-        # Mock da validação
-        mock_validate.return_value = (True, "Gmail configurado")
-        
-        # Mock do SMTP
-        mock_server = Mock()
-        mock_smtp.return_value.__enter__.return_value = mock_server
-        
-        # Mock do template
-        with patch.object(notification_service.jinja_env, 'get_template') as mock_template:
-            mock_template.return_value.render.return_value = "<html>Test</html>"
-            
-            email_data = {
-                "pet_name": "Rex",
-                "pet_nickname": "rex_1234", 
-                "date": "09/11/2025",
-                "treatments": [],
-                "total_treatments": 0
-            }
-            
-            success, message = notification_service.send_email_notification(
-                "test@email.com", "Teste", email_data, dry_run=False
-            )
-        
-        assert success is True
-        assert "Email enviado para test@email.com" in message
-        mock_server.starttls.assert_called_once()
-        mock_server.send_message.assert_called_once()
-    
-    @patch('app.services.notification_service.validate_gmail_config')
-    def test_send_email_notification_invalid_config(self, mock_validate, notification_service):
-        """Testa envio com configuração inválida do Gmail"""
-        mock_validate.return_value = (False, "Gmail não configurado")
-        
-        with patch.object(notification_service.jinja_env, 'get_template') as mock_template:
-            mock_template.return_value.render.return_value = "<html>Test</html>"
-            
-            success, message = notification_service.send_email_notification(
-                "test@email.com", "Teste", {}, dry_run=False
-            )
-        
-        assert success is False
-        assert message == "Gmail não configurado"
-    
-    @patch('app.services.notification_service.validate_gmail_config')
-    @patch('app.services.notification_service.smtplib.SMTP')
-    def test_send_email_notification_smtp_error(self, mock_smtp, mock_validate, notification_service):
-        """Testa erro no SMTP"""
-        mock_validate.return_value = (True, "Gmail configurado")
-        mock_smtp.side_effect = Exception("SMTP Error")
-        
-        # Dados completos para evitar KeyError
-        email_data = {
-            "pet_name": "Rex",
-            "pet_nickname": "rex_1234",
-            "date": "09/11/2025", 
-            "treatments": [],
-            "total_treatments": 0
-        }
-        
-        with patch.object(notification_service.jinja_env, 'get_template') as mock_template:
-            mock_template.return_value.render.return_value = "<html>Test</html>"
-            
-            success, message = notification_service.send_email_notification(
-                "test@email.com", "Teste", email_data, dry_run=False
-            )
-        
-        assert success is False
-        assert "SMTP Error" in message
+        mock_smtp.assert_not_called()
     
     @pytest.mark.asyncio
     async def test_process_daily_notifications_no_treatments(self, notification_service):
@@ -287,8 +225,8 @@ class TestNotificationService:
         }]
         
         with patch.object(notification_service, 'get_tomorrow_treatments_with_tutors', new_callable=AsyncMock) as mock_get, \
-             patch.object(notification_service, 'format_treatments_for_email') as mock_format, \
-             patch.object(notification_service, 'send_email_notification') as mock_send:
+             patch.object(notification_service, 'format_consolidated_reminder_for_email') as mock_format, \
+             patch.object(notification_service, 'preview_consolidated_reminder') as mock_send:
             
             mock_get.return_value = (True, treatments_data, "Tratamentos encontrados")
             mock_format.return_value = {"formatted": "data"}
@@ -314,15 +252,15 @@ class TestNotificationService:
             ]
         }]
         
-        def mock_send_side_effect(email, name, data, dry_run):
+        def mock_send_side_effect(email, name, data):
             if "success" in email:
                 return (True, "Email enviado")
             else:
                 return (False, "Erro no envio")
         
         with patch.object(notification_service, 'get_tomorrow_treatments_with_tutors', new_callable=AsyncMock) as mock_get, \
-             patch.object(notification_service, 'format_treatments_for_email') as mock_format, \
-             patch.object(notification_service, 'send_email_notification') as mock_send:
+             patch.object(notification_service, 'format_consolidated_reminder_for_email') as mock_format, \
+             patch.object(notification_service, 'preview_consolidated_reminder') as mock_send:
             
             mock_get.return_value = (True, treatments_data, "Tratamentos encontrados")
             mock_format.return_value = {"formatted": "data"}
@@ -335,6 +273,441 @@ class TestNotificationService:
         assert result["emails_sent"] == 1  # Só um sucesso
         assert len(result["errors"]) == 1  # Um erro
         assert "Erro no envio" in result["errors"][0]
+    
+    @pytest.mark.asyncio
+    async def test_process_daily_notifications_fetches_target_date(self, notification_service):
+        """Com target_date, busca os tratamentos desse dia (o mesmo gravado nos emails)"""
+        from datetime import date
+        
+        target = date(2026, 10, 25)
+        notification_service.target_date = target
+        treatments_data = [{
+            "pet": {"id": "pet1", "name": "Rex", "nickname": "rex_1234"},
+            "treatments": [{"name": "Vacina"}],
+            "tutors": [{"email": "ana@email.com", "name": "Ana"}]
+        }]
+        
+        with patch.object(notification_service, 'get_tomorrow_treatments_with_tutors', new_callable=AsyncMock) as mock_tomorrow, \
+             patch.object(notification_service, 'get_treatments_with_tutors_by_date', new_callable=AsyncMock) as mock_by_date, \
+             patch('app.services.notification_service.EmailOutboxService') as mock_outbox:
+            mock_by_date.return_value = (True, {target: treatments_data}, "Tratamentos encontrados")
+            mock_outbox.return_value.deliver = AsyncMock(return_value={
+                "deliveries": [], "errors": [], "queued": 1, "already_queued": 0
+            })
+            
+            result = await notification_service.process_daily_notifications()
+        
+        mock_tomorrow.assert_not_called()
+        mock_by_date.assert_awaited_once_with(target, target)
+        records = mock_outbox.return_value.deliver.call_args.args[0]
+        assert [record["reference_date"] for record in records] == [target]
+        assert result["total_pets"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_process_daily_notifications_one_email_per_tutor(self, notification_service):
+        """Tutor com vários pets recebe um único lembrete com todos eles"""
+        treatments_data = [
+            {
+                "pet": {"id": "pet1", "name": "Rex", "nickname": "rex_1234"},
+                "treatments": [{"name": "Vacina"}],
+                "tutors": [{"email": "ana@email.com", "name": "Ana"}, {"email": "bia@email.com", "name": "Bia"}]
+            },
+            {
+                "pet": {"id": "pet2", "name": "Mia", "nickname": "mia_5678"},
+                "treatments": [{"name": "Vermífugo"}, {"name": "Banho"}],
+                "tutors": [{"email": "ana@email.com", "name": "Ana"}]
+            },
+        ]
+        
+        with patch.object(notification_service, 'get_tomorrow_treatments_with_tutors', new_callable=AsyncMock) as mock_get, \
+             patch.object(notification_service, 'preview_consolidated_reminder') as mock_send:
+            
+            mock_get.return_value = (True, treatments_data, "Tratamentos encontrados")
+            mock_send.return_value = (True, "Email enviado")
+            
+            result = await notification_service.process_daily_notifications(dry_run=True)
+        
+        assert result["total_pets"] == 2
+        assert result["total_tutors"] == 2
+        assert result["emails_sent"] == 2
+        
+        sent = {call.args[0]: call.args[2] for call in mock_send.call_args_list}
+        assert [pet["pet_name"] for pet in sent["ana@email.com"]["pets"]] == ["Rex", "Mia"]
+        assert sent["ana@email.com"]["total_treatments"] == 3
+        assert sent["bia@email.com"]["total_pets"] == 1
+    
+    def test_consolidated_reminder_rendering(self, notification_service):
+        """O template consolidado lista cada pet com seus tratamentos"""
+        reminder_data = notification_service.format_consolidated_reminder_for_email([
+            {"pet": {"name": "Rex", "nickname": "rex_1234"}, "treatments": [{"name": "Vacina"}]},
+            {"pet": {"name": "Mia", "nickname": "mia_5678"}, "treatments": [{"name": "Vermífugo"}]},
+        ])
+        
+        html = notification_service.render_consolidated_reminder("Ana", reminder_data)
+        
+        assert "Ana" in html
+        assert "Rex" in html and "Vacina" in html
+        assert "Mia" in html and "Vermífugo" in html
+        assert notification_service.reminder_subject(reminder_data) == (
+            "🐾 Lembrete: 2 tratamentos agendados para 2 pets amanhã"
+        )
+    
+    def test_pet_sections_rendered_once_per_run(self, notification_service):
+        """O bloco de um pet é renderizado uma vez e reaproveitado para cada tutor"""
+        reminder_data = notification_service.format_consolidated_reminder_for_email([
+            {"pet": {"id": "pet1", "name": "Rex", "nickname": "rex_1234"}, "treatments": [{"name": "Vacina"}]},
+        ])
+        
+        html_ana = notification_service.render_consolidated_reminder("Ana", reminder_data)
+        html_bia = notification_service.render_consolidated_reminder("Bia", reminder_data)
+        
+        assert "Ana" in html_ana and "Bia" in html_bia
+        assert "Vacina" in html_bia
+        assert notification_service.renderer.metrics() == {"sections_rendered": 1, "sections_reused": 1}
+        
+        # Environment (e templates compilados) compartilhado entre instâncias do serviço
+        from app.services.email_templates import email_environment
+        assert notification_service.renderer.environment is email_environment
+
+
+class TestSMTPTransport:
+    """Testes do transporte SMTP com conexão reaproveitada"""
+    
+    @staticmethod
+    def _message(to):
+        msg = MIMEMultipart('alternative')
+        msg['To'] = to
+        return msg
+    
+    @patch('app.services.mail_transport.smtplib.SMTP')
+    def test_reuses_connection_for_batch(self, mock_smtp):
+        """Testa que vários emails usam a mesma conexão autenticada"""
+        from app.services.mail_transport import SMTPTransport
+        
+        with SMTPTransport(username="a@gmail.com", password="x", rate_limit=0) as transport:
+            for i in range(3):
+                transport.send_message(self._message(f"tutor{i}@email.com"))
+        
+        mock_smtp.assert_called_once()
+        mock_smtp.return_value.login.assert_called_once_with("a@gmail.com", "x")
+        assert mock_smtp.return_value.send_message.call_count == 3
+        mock_smtp.return_value.quit.assert_called_once()
+    
+    @patch('app.services.mail_transport.smtplib.SMTP')
+    def test_reconnects_when_server_drops(self, mock_smtp):
+        """Testa reconexão e reenvio quando o servidor encerra a conexão"""
+        from app.services.mail_transport import SMTPTransport
+        
+        dropped, fresh = Mock(), Mock()
+        dropped.send_message.side_effect = smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        mock_smtp.side_effect = [dropped, fresh]
+        
+        transport = SMTPTransport(username="a@gmail.com", password="x", rate_limit=0)
+        transport.send_message(self._message("tutor@email.com"))
+        
+        fresh.send_message.assert_called_once()
+        assert transport.metrics() == {"connections": 2, "reconnects": 1, "messages_sent": 1}
+    
+    @patch('app.services.mail_transport.smtplib.SMTP')
+    def test_does_not_retry_rejected_recipient(self, mock_smtp):
+        """Testa que recusas do servidor não geram reconexão"""
+        from app.services.mail_transport import SMTPTransport
+        
+        mock_smtp.return_value.send_message.side_effect = smtplib.SMTPRecipientsRefused({})
+        transport = SMTPTransport(username="a@gmail.com", password="x", rate_limit=0)
+        
+        with pytest.raises(smtplib.SMTPRecipientsRefused):
+            transport.send_message(self._message("invalido@email.com"))
+        mock_smtp.assert_called_once()
+    
+    @patch('app.services.mail_transport.smtplib.SMTP')
+    def test_renews_connection_after_message_limit(self, mock_smtp):
+        """Testa troca de conexão ao atingir o limite de mensagens por conexão"""
+        from app.services.mail_transport import SMTPTransport
+        
+        with SMTPTransport(username="a@gmail.com", password="x", rate_limit=0,
+                           max_messages_per_connection=2) as transport:
+            for i in range(5):
+                transport.send_message(self._message(f"tutor{i}@email.com"))
+        
+        assert mock_smtp.call_count == 3
+    
+    def test_smtp_socket_timeout_bounds_each_send(self):
+        """O tempo máximo do envio é o timeout do socket SMTP"""
+        from app.services.mail_transport import SMTPTransport
+        
+        with patch('app.services.mail_transport.smtplib.SMTP') as mock_smtp, \
+             patch('app.config.SMTP_TIMEOUT', 7.0):
+            SMTPTransport(rate_limit=0).send_message(self._message("tutor@email.com"))
+        
+        assert mock_smtp.call_args.kwargs["timeout"] == 7.0
+
+
+class TestMailDispatcher:
+    """Testes do disparo concorrente de emails"""
+    
+    @pytest.mark.asyncio
+    async def test_bounded_parallelism_and_ordered_outcomes(self):
+        """Testa limite de envios simultâneos e resultados na ordem dos envios"""
+        import threading
+        import time
+        from app.services.mail_dispatcher import MailDispatcher, MailJob
+        
+        lock = threading.Lock()
+        state = {"running": 0, "peak": 0}
+        
+        def send(email):
+            with lock:
+                state["running"] += 1
+                state["peak"] = max(state["peak"], state["running"])
+            time.sleep(0.05)
+            with lock:
+                state["running"] -= 1
+            return True, f"Email enviado para {email}"
+        
+        jobs = [MailJob(f"tutor{i}@email.com", send, (f"tutor{i}@email.com",)) for i in range(8)]
+        started = time.perf_counter()
+        outcomes = await MailDispatcher(concurrency=4).run(jobs)
+        
+        assert outcomes == [(True, f"Email enviado para tutor{i}@email.com") for i in range(8)]
+        assert state["peak"] == 4
+        assert time.perf_counter() - started < 0.05 * 8
+    
+    @pytest.mark.asyncio
+    async def test_slow_send_awaited_and_exception_becomes_error(self):
+        """Envio lento tem o resultado aguardado (sem reenvio duplicado); exceções viram erro"""
+        import time
+        from app.services.mail_dispatcher import MailDispatcher, MailJob
+        
+        def slow():
+            time.sleep(0.1)
+            return True, "Email enviado para lento@email.com"
+        
+        def broken():
+            raise RuntimeError("falha")
+        
+        outcomes = await MailDispatcher(concurrency=2).run([
+            MailJob("lento@email.com", slow),
+            MailJob("quebrado@email.com", broken),
+        ])
+        
+        assert outcomes[0] == (True, "Email enviado para lento@email.com")
+        assert outcomes[1] == (False, "Erro ao enviar email para quebrado@email.com: falha")
+
+
+class TestEmailOutbox:
+    """Testes da fila durável de emails"""
+    
+    @staticmethod
+    def _records(recipients, pet_ids=("pet1",)):
+        from datetime import date
+        from app.services.email_outbox_service import outbox_record, DAILY_REMINDER
+        
+        return [
+            outbox_record(DAILY_REMINDER, email, date(2026, 10, 20), pet_ids, "Lembrete", "<html>Oi</html>")
+            for email in recipients
+        ]
+    
+    @pytest.mark.asyncio
+    async def test_enqueue_is_idempotent(self, db_session):
+        """Reexecutar o job não duplica emails na fila"""
+        from app.services.email_outbox_service import EmailOutboxService
+        
+        service = EmailOutboxService(db_session)
+        
+        assert await service.enqueue(self._records(["a@email.com", "b@email.com"])) == (2, 0)
+        # Mesmo conjunto de pets em outra ordem é o mesmo email
+        assert await service.enqueue(self._records(["a@email.com"], ("pet1", "pet1"))) == (0, 1)
+        assert await service.enqueue(self._records(["a@email.com"], ("pet1", "pet2"))) == (1, 0)
+        
+        counts = await service.outbox_repo.count_by_status()
+        assert counts == {"pending": 3}
+    
+    @pytest.mark.asyncio
+    @patch('app.services.email_outbox_service.SMTPTransportPool')
+    async def test_drain_marks_sent_and_schedules_retry(self, mock_pool, db_session):
+        """Sucessos ficam como enviados; falhas voltam para a fila com backoff"""
+        from app.services.email_outbox_service import EmailOutboxService
+        
+        def send_message(msg):
+            if msg['To'] == "erro@email.com":
+                raise smtplib.SMTPRecipientsRefused({msg['To']: (550, b"no")})
+        
+        mock_pool.return_value.send_message.side_effect = send_message
+        mock_pool.return_value.metrics.return_value = {}
+        
+        service = EmailOutboxService(db_session)
+        await service.enqueue(self._records(["ok@email.com", "erro@email.com"]))
+        
+        deliveries = await service.drain()
+        
+        assert [d["success"] for d in deliveries] == [True, False]
+        assert "tentativa 1" in deliveries[1]["message"]
+        assert deliveries[1]["retry_at"] > datetime.now(timezone.utc)
+        assert await service.outbox_repo.count_by_status() == {"sent": 1, "pending": 1}
+        
+        # A nova tentativa ainda não venceu: nada a enviar agora
+        assert await service.drain() == []
+    
+    @pytest.mark.asyncio
+    @patch('app.services.email_outbox_service.SMTPTransportPool')
+    async def test_drain_gives_up_after_max_attempts(self, mock_pool, db_session):
+        """Depois de OUTBOX_MAX_ATTEMPTS o email fica como falha definitiva"""
+        from app.services.email_outbox_service import EmailOutboxService
+        
+        mock_pool.return_value.send_message.side_effect = smtplib.SMTPDataError(554, b"rejeitado")
+        mock_pool.return_value.metrics.return_value = {}
+        
+        service = EmailOutboxService(db_session)
+        await service.enqueue(self._records(["erro@email.com"]))
+        
+        with patch('app.config.OUTBOX_MAX_ATTEMPTS', 1):
+            deliveries = await service.drain()
+        
+        assert deliveries[0]["success"] is False
+        assert deliveries[0]["retry_at"] is None
+        assert await service.outbox_repo.count_by_status() == {"failed": 1}
+    
+    @pytest.mark.asyncio
+    async def test_expired_lease_is_reclaimed(self, db_session):
+        """Emails reservados por uma execução que caiu voltam a ser enviados"""
+        from app.services.email_outbox_service import EmailOutboxService
+        
+        service = EmailOutboxService(db_session)
+        await service.enqueue(self._records(["a@email.com"]))
+        
+        claimed = await service.outbox_repo.claim_batch(10, lease_seconds=600)
+        assert len(claimed) == 1
+        assert await service.outbox_repo.claim_batch(10, lease_seconds=600) == []
+        
+        reclaimed = await service.outbox_repo.claim_batch(10, lease_seconds=-1)
+        assert [entry["attempts"] for entry in reclaimed] == [2]
+
+
+class TestMonthlyReportQuery:
+    """Testes da consulta única do relatório mensal (linhas por tutor, pet e bucket)"""
+    
+    @pytest_asyncio.fixture
+    async def seeded_session(self, db_session):
+        from app.database.models import Profile, Pet, PetOwner, Treatment
+        
+        def treatment(id, pet_id, date, **overrides):
+            data = dict(id=id, pet_id=pet_id, category="Vacinas", name=id, date=date, done=False, applier_type="Tutor")
+            data.update(overrides)
+            return Treatment(**data)
+        
+        db_session.add_all([
+            Profile(id="t1", name="Ana", email="ana@email.com"),
+            Profile(id="t2", name="Bia", email="bia@email.com"),
+            Profile(id="t3", name="Caio", email="caio@email.com"),
+            Pet(id="pet-a", name="Rex", breed="SRD", birth_date="2024-01-01", pet_type="dog"),
+            Pet(id="pet-b", name="Mia", breed="SRD", birth_date="2024-01-01", pet_type="cat"),
+        ])
+        await db_session.flush()
+        removed_owner = PetOwner(pet_id="pet-b", profile_id="t3")
+        removed_owner.soft_delete()
+        db_session.add_all([
+            PetOwner(pet_id="pet-a", profile_id="t1"),
+            PetOwner(pet_id="pet-a", profile_id="t2"),
+            PetOwner(pet_id="pet-b", profile_id="t1"),
+            removed_owner,
+            treatment("vacina-marco", "pet-a", "2025-03-20"),
+            treatment("vacina-inicio-marco", "pet-a", "2025-03-12"),
+            treatment("vacina-fevereiro", "pet-a", "2025-02-01"),
+            treatment("vacina-feita", "pet-a", "2025-03-05", done=True),
+            treatment("serie", "pet-b", "2025-01-10", recurrence_rule="FREQ=MONTHLY"),
+        ])
+        await db_session.flush()
+        db_session.add(treatment("serie-fev", "pet-b", "2025-02-10", done=True, series_id="serie"))
+        await db_session.flush()
+        return db_session
+    
+    @pytest.mark.asyncio
+    async def test_rows_grouped_by_tutor_with_buckets(self, seeded_session):
+        from datetime import date
+        from app.repositories import PetRepository
+        
+        groups = [
+            group async for group in PetRepository(seeded_session).stream_monthly_report(
+                date(2025, 3, 1), date(2025, 3, 31), date(2025, 3, 14), tutors_per_page=1
+            )
+        ]
+        
+        assert [group["key"] for group in groups] == ["ana@email.com|t1", "bia@email.com|t2"]
+        assert [pet["pet"]["id"] for pet in groups[0]["pets"]] == ["pet-a", "pet-b"]
+        
+        rex = groups[0]["pets"][0]
+        assert [t["_id"] for t in rex["current_month_treatments"]] == ["vacina-inicio-marco", "vacina-marco"]
+        assert [t["_id"] for t in rex["expired_treatments"]] == ["vacina-fevereiro", "vacina-inicio-marco"]
+        assert groups[1]["pets"] == [rex]
+        
+        # Série mensal: a ocorrência de fevereiro já foi materializada (feita)
+        mia = groups[0]["pets"][1]
+        assert [t["_id"] for t in mia["current_month_treatments"]] == ["serie@2025-03-10"]
+        # Das ocorrências perdidas da série, só a mais recente
+        assert [t["date"] for t in mia["expired_treatments"]] == ["2025-03-10"]
+    
+    @pytest.mark.asyncio
+    async def test_resumes_after_key(self, seeded_session):
+        from datetime import date
+        from app.repositories import PetRepository
+        
+        groups = [
+            group async for group in PetRepository(seeded_session).stream_monthly_report(
+                date(2025, 3, 1), date(2025, 3, 31), date(2025, 3, 14), after_key="ana@email.com|t1"
+            )
+        ]
+        
+        assert [group["key"] for group in groups] == ["bia@email.com|t2"]
+        assert [pet["pet"]["id"] for pet in groups[0]["pets"]] == ["pet-a"]
+    
+    @pytest.mark.asyncio
+    async def test_shard_filter_reads_only_shard_tutors(self, seeded_session):
+        from datetime import date
+        from app.repositories import PetRepository
+        from app.repositories.pet_repository import shard_of
+        
+        keys_by_shard = {}
+        for shard in range(3):
+            keys_by_shard[shard] = [
+                group["key"] async for group in PetRepository(seeded_session).stream_monthly_report(
+                    date(2025, 3, 1), date(2025, 3, 31), date(2025, 3, 14), tutors_per_page=1, shard=shard, shards=3
+                )
+            ]
+        
+        assert sorted(key for keys in keys_by_shard.values() for key in keys) == ["ana@email.com|t1", "bia@email.com|t2"]
+        assert all(shard_of(key, 3) == shard for shard, keys in keys_by_shard.items() for key in keys)
+    
+    def test_shard_sql_matches_python_hash(self):
+        """shard_of_sql usa os mesmos 60 bits do sha256 que shard_of"""
+        import hashlib
+        from sqlalchemy import literal
+        from sqlalchemy.dialects import postgresql
+        from app.repositories.pet_repository import shard_of, shard_of_sql
+        
+        sql = str(shard_of_sql(literal("ana@email.com|t1"), 4).compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        ))
+        assert "sha256(convert_to('ana@email.com|t1', 'UTF8'))" in sql
+        assert "AS BIT(60)) AS BIGINT), 4)" in sql
+        
+        key = "ana@email.com|t1"
+        hex_prefix = hashlib.sha256(key.encode()).hexdigest()[:15]
+        assert int(hex_prefix, 16) % 4 == shard_of(key, 4)
+    
+    @pytest.mark.asyncio
+    async def test_service_regroups_pets_with_tutors(self, seeded_session):
+        from app.services.monthly_report_service import MonthlyReportService
+        
+        service = MonthlyReportService(seeded_session)
+        with patch.object(MonthlyReportService, 'report_window', return_value=(
+            datetime(2025, 3, 1).date(), datetime(2025, 3, 31).date(), datetime(2025, 3, 14).date()
+        )):
+            success, pets, _ = await service.get_monthly_treatments_with_tutors()
+        
+        assert success is True
+        tutors_by_pet = {pet["pet"]["id"]: [tutor["id"] for tutor in pet["tutors"]] for pet in pets}
+        assert tutors_by_pet == {"pet-a": ["t1", "t2"], "pet-b": ["t1"]}
 
 
 class TestNotificationTemplate:
@@ -384,23 +757,19 @@ class TestNotificationTemplate:
             template_file = template_dir / "treatment_reminder.html"
             template_file.write_text(template_content)
             
-            # Mock do diretório de templates
-            with patch('app.services.notification_service.Path') as mock_path:
-                mock_path.return_value.parent = template_dir
-                
-                # Recria o serviço com o novo diretório
-                from jinja2 import Environment, FileSystemLoader
-                template_service.jinja_env = Environment(loader=FileSystemLoader(template_dir))
-                
-                template = template_service.jinja_env.get_template("treatment_reminder.html")
-                rendered = template.render(tutor_name="João", **email_data)
-                
-                assert "Lembrete para João" in rendered
-                assert "Pet: Rex (rex_1234)" in rendered
-                assert "Data: 09/11/2025" in rendered
-                assert "Total de tratamentos: 2" in rendered
-                assert "Vacina - Vacinas" in rendered
-                assert "Vermífugo - Vermífugo" in rendered
+            # Recria o ambiente com o diretório temporário
+            from jinja2 import Environment, FileSystemLoader
+            template_service.jinja_env = Environment(loader=FileSystemLoader(template_dir))
+            
+            template = template_service.jinja_env.get_template("treatment_reminder.html")
+            rendered = template.render(tutor_name="João", **email_data)
+            
+            assert "Lembrete para João" in rendered
+            assert "Pet: Rex (rex_1234)" in rendered
+            assert "Data: 09/11/2025" in rendered
+            assert "Total de tratamentos: 2" in rendered
+            assert "Vacina - Vacinas" in rendered
+            assert "Vermífugo - Vermífugo" in rendered
 
 
 class TestConfigValidation:
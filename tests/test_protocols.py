@@ -0,0 +1,185 @@
+"""Testes para aplicação de protocolos vacinais em lote."""
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+
+from app.services.protocol_service import ProtocolService, expand_schedule_offsets
+
+
+@pytest.mark.unit
+class TestExpandScheduleOffsets:
+    """Testes para interpretação de `cronograma_vacinal`."""
+
+    def test_boosters_until_age_limit(self):
+        """Reforços a cada N dias até a idade limite, a partir da primeira dose."""
+        text = "Primeira dose aos 45 dias, reforços a cada 21-30 dias até 16 semanas"
+        assert expand_schedule_offsets(text, "filhote") == [0, 21, 42, 63]
+
+    def test_boosters_in_weeks(self):
+        text = "Primeira dose às 8 semanas, reforços a cada 3-4 semanas até 16 semanas"
+        assert expand_schedule_offsets(text, "filhote") == [0, 21, 42]
+
+    def test_fixed_number_of_doses(self):
+        text = "A partir de 8 semanas, 2 doses com intervalo de 2-4 semanas"
+        assert expand_schedule_offsets(text, "filhote") == [0, 14]
+
+    def test_single_dose(self):
+        assert expand_schedule_offsets("Dose única a partir dos 4 meses", "filhote") == [0]
+
+    def test_annual_booster_schedules_next_year(self):
+        assert expand_schedule_offsets("Reforço anual obrigatório", "adulto") == [0, 365]
+
+    def test_unknown_text_is_single_application(self):
+        assert expand_schedule_offsets("Consultar veterinário", "adulto") == [0]
+        assert expand_schedule_offsets(None, "filhote") == [0]
+
+
+@pytest.mark.database
+class TestApplyVaccineProtocol:
+    """Testes de integração do protocolo com o banco."""
+
+    @pytest_asyncio.fixture
+    async def seeded_session(self, db_session):
+        from app.database.models import Profile, Pet, PetOwner, Vaccine
+
+        db_session.add_all([
+            Profile(id="vet1", name="Dra. Ana", email="ana@vet.com", is_vet=True),
+            Profile(id="tutor1", name="Tutor", email="tutor@email.com"),
+            Pet(id="pet-a", name="Rex", breed="SRD", birth_date="2024-01-01", pet_type="dog"),
+            Pet(id="pet-b", name="Bob", breed="SRD", birth_date="2024-01-01", pet_type="dog"),
+            Pet(id="pet-c", name="Mia", breed="SRD", birth_date="2024-01-01", pet_type="cat"),
+            Vaccine(
+                id=1,
+                nome_vacina="V10",
+                especie_alvo="Cão",
+                tipo_vacina="Múltipla",
+                cronograma_vacinal={
+                    "filhote": "Primeira dose aos 45 dias, reforços a cada 21-30 dias até 16 semanas",
+                    "adulto": "Reforço anual",
+                },
+            ),
+        ])
+        await db_session.flush()
+        db_session.add_all([
+            PetOwner(pet_id="pet-a", profile_id="vet1"),
+            PetOwner(pet_id="pet-b", profile_id="vet1"),
+            PetOwner(pet_id="pet-c", profile_id="tutor1"),
+        ])
+        await db_session.flush()
+        return db_session
+
+    @pytest.mark.asyncio
+    async def test_bulk_inserts_doses_for_accessible_pets(self, seeded_session):
+        from app.database.models import Treatment
+
+        service = ProtocolService(seeded_session)
+        success, message, created = await service.apply_vaccine_protocol(
+            vaccine_id=1,
+            pet_ids=["pet-a", "pet-b", "pet-c"],
+            phase="filhote",
+            start_date="2025-03-01",
+            applier={"id": "vet1", "name": "Dra. Ana"},
+        )
+
+        assert success is True
+        assert created == 8  # 4 doses x 2 pets acessíveis
+        assert "1 pets ignorados" in message
+
+        result = await seeded_session.execute(
+            select(Treatment).where(Treatment.pet_id == "pet-a").order_by(Treatment.date)
+        )
+        dates = [t.date for t in result.scalars().all()]
+        assert dates == ["2025-03-01", "2025-03-22", "2025-04-12", "2025-05-03"]
+
+    @pytest.mark.asyncio
+    async def test_rejects_when_no_pet_is_accessible(self, seeded_session):
+        service = ProtocolService(seeded_session)
+        success, _, created = await service.apply_vaccine_protocol(
+            vaccine_id=1,
+            pet_ids=["pet-c"],
+            phase="adulto",
+            start_date="2025-03-01",
+            applier={"id": "vet1", "name": "Dra. Ana"},
+        )
+
+        assert success is False
+        assert created == 0
+
+    @pytest.mark.asyncio
+    async def test_applier_type_comes_from_profile(self, seeded_session):
+        from app.database.models import Treatment
+
+        service = ProtocolService(seeded_session)
+        await service.apply_vaccine_protocol(
+            vaccine_id=1,
+            pet_ids=["pet-a"],
+            phase="adulto",
+            start_date="2025-03-01",
+            applier={"id": "vet1", "name": "Dra. Ana", "is_vet": True},
+        )
+
+        result = await seeded_session.execute(select(Treatment.applier_type).where(Treatment.pet_id == "pet-a"))
+        assert set(result.scalars().all()) == {"Veterinarian"}
+
+    @pytest.mark.asyncio
+    async def test_failed_insert_rolls_back(self, seeded_session, monkeypatch):
+        from app.repositories import PetRepository
+
+        async def failing_insert(self, treatments):
+            raise RuntimeError("falha no insert")
+
+        monkeypatch.setattr(PetRepository, "bulk_add_treatments", failing_insert)
+        rollbacks = []
+        original_rollback = seeded_session.rollback
+
+        async def tracking_rollback():
+            rollbacks.append(True)
+            await original_rollback()
+
+        monkeypatch.setattr(seeded_session, "rollback", tracking_rollback)
+
+        success, message, created = await ProtocolService(seeded_session).apply_vaccine_protocol(
+            vaccine_id=1,
+            pet_ids=["pet-a"],
+            phase="adulto",
+            start_date="2025-03-01",
+            applier={"id": "vet1", "name": "Dra. Ana", "is_vet": True},
+        )
+
+        assert (success, created) == (False, 0)
+        assert "falha no insert" in message
+        assert rollbacks == [True]
+
+
+class TestProtocolRoute:
+    """Testes da rota de aplicação de protocolos."""
+
+    def test_rejects_non_vet(self, monkeypatch):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from app.database.connection import get_db
+        from app.routes.auth_routes import get_current_user_from_session
+        from app.routes.vet_routes import router
+        from app.services import UserService
+
+        async def not_a_vet(self, vet_id):
+            return False, None, "Veterinário não encontrado."
+
+        async def must_not_run(self, *args, **kwargs):
+            raise AssertionError("protocolo aplicado por não veterinário")
+
+        monkeypatch.setattr(UserService, "validate_veterinarian", not_a_vet)
+        monkeypatch.setattr(ProtocolService, "apply_vaccine_protocol", must_not_run)
+        app = FastAPI()
+        app.include_router(router)
+        app.dependency_overrides[get_db] = lambda: None
+        app.dependency_overrides[get_current_user_from_session] = lambda: {"id": "tutor1", "info": {"name": "Tutor"}}
+
+        response = TestClient(app).post(
+            "/vet-dashboard/protocols",
+            data={"vaccine_id": 1, "pet_ids": ["pet-c"], "phase": "adulto", "start_date": "2025-03-01"},
+        )
+
+        assert response.status_code == 403
+        assert response.json()["success"] is False
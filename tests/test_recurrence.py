@@ -0,0 +1,129 @@
+"""Testes para tratamentos recorrentes (RRULE expandida sob demanda)."""
+
+from datetime import date
+
+import pytest
+import pytest_asyncio
+
+from app.database.models.treatment import Treatment, expand_treatments
+from app.services.pet_service import build_recurrence_rule
+
+
+def _series(**overrides):
+    data = dict(
+        id="serie-1",
+        pet_id="pet-a",
+        category="Vermífugo",
+        name="Vermífugo mensal",
+        date="2025-01-10",
+        done=False,
+        applier_type="Tutor",
+        recurrence_rule="FREQ=MONTHLY",
+    )
+    data.update(overrides)
+    return Treatment(**data)
+
+
+@pytest.mark.unit
+class TestRecurrenceExpansion:
+    """Testes da expansão de séries em ocorrências virtuais."""
+
+    def test_build_recurrence_rule(self):
+        assert build_recurrence_rule(None) is None
+        assert build_recurrence_rule("quarterly") == "FREQ=MONTHLY;INTERVAL=3"
+        assert build_recurrence_rule("yearly", "2026-01-31") == "FREQ=YEARLY;UNTIL=20260131"
+        with pytest.raises(ValueError):
+            build_recurrence_rule("daily")
+
+    def test_occurrence_dates_within_window(self):
+        series = _series()
+        dates = series.occurrence_dates(date(2025, 3, 1), date(2025, 5, 31))
+        assert dates == ["2025-03-10", "2025-04-10", "2025-05-10"]
+
+    def test_occurrence_dates_respect_until_and_exclusions(self):
+        series = _series(recurrence_rule="FREQ=MONTHLY;UNTIL=20250410")
+        dates = series.occurrence_dates(
+            None, date(2025, 12, 31), exclude={"2025-02-10"}, missed_until=date(2025, 1, 1)
+        )
+        assert dates == ["2025-01-10", "2025-03-10", "2025-04-10"]
+
+    def test_open_window_keeps_only_latest_missed_occurrence(self):
+        """Uma série antiga não gera uma ocorrência pendente por mês desde o início"""
+        series = _series(date="2023-01-10")
+        dates = series.occurrence_dates(None, date(2025, 5, 31), missed_until=date(2025, 3, 15))
+        assert dates == ["2025-03-10", "2025-04-10", "2025-05-10"]
+
+    def test_materialized_occurrence_settles_earlier_missed_ones(self):
+        """Uma ocorrência posterior já materializada (concluída) encerra as perdidas anteriores"""
+        series = _series(date="2023-01-10")
+        expired = series.occurrence_dates(None, date(2025, 3, 14), exclude={"2025-03-10"})
+        assert expired == []
+
+        expired = series.occurrence_dates(None, date(2025, 4, 14), exclude={"2025-03-10"})
+        assert expired == ["2025-04-10"]
+
+    def test_materialized_occurrence_replaces_virtual_one(self):
+        series = _series()
+        done = _series(id="occ-1", recurrence_rule=None, series_id="serie-1", date="2025-02-10", done=True)
+        removed = _series(id="occ-2", recurrence_rule=None, series_id="serie-1", date="2025-03-10")
+        removed.soft_delete()
+
+        results = expand_treatments(
+            [series, done, removed], date(2025, 2, 1), date(2025, 4, 30), pending_only=True
+        )
+
+        assert [(t["_id"], t["date"]) for t in results] == [("serie-1@2025-04-10", "2025-04-10")]
+        assert results[0]["is_occurrence"] is True
+
+
+@pytest.mark.database
+class TestRecurringTreatmentRepository:
+    """Testes de integração das ocorrências com o banco."""
+
+    @pytest_asyncio.fixture
+    async def seeded_session(self, db_session):
+        from app.database.models import Profile, Pet, PetOwner
+
+        db_session.add_all([
+            Profile(id="tutor1", name="Tutor", email="tutor@email.com"),
+            Pet(id="pet-a", name="Rex", breed="SRD", birth_date="2024-01-01", pet_type="dog"),
+        ])
+        await db_session.flush()
+        db_session.add_all([
+            PetOwner(pet_id="pet-a", profile_id="tutor1"),
+            _series(),
+        ])
+        await db_session.flush()
+        return db_session
+
+    @pytest.mark.asyncio
+    async def test_marking_occurrence_done_materializes_it(self, seeded_session):
+        from app.repositories import PetRepository
+
+        repo = PetRepository(seeded_session)
+        assert await repo.update_treatment("pet-a", "tutor1", "serie-1@2025-02-10", {"done": True})
+
+        pets = await repo.get_pending_treatments_in_window(date(2025, 2, 1), date(2025, 3, 31))
+        assert [t["date"] for t in pets[0]["treatments"]] == ["2025-03-10"]
+
+    @pytest.mark.asyncio
+    async def test_deleting_occurrence_skips_only_that_date(self, seeded_session):
+        from app.repositories import PetRepository
+
+        repo = PetRepository(seeded_session)
+        assert await repo.delete_treatment("pet-a", "tutor1", "serie-1@2025-03-10")
+        assert not await repo.delete_treatment("pet-a", "tutor1", "serie-1@2025-03-11")
+
+        pets = await repo.get_pending_treatments_in_window(date(2025, 3, 1), date(2025, 4, 30))
+        assert [t["_id"] for t in pets[0]["treatments"]] == ["serie-1@2025-04-10"]
+
+    @pytest.mark.asyncio
+    async def test_scheduled_treatments_by_date_splits_range(self, seeded_session):
+        from app.repositories import PetRepository
+
+        repo = PetRepository(seeded_session)
+        by_date = await repo.get_scheduled_treatments_by_date(date(2025, 2, 1), date(2025, 4, 30))
+
+        assert sorted(by_date) == [date(2025, 2, 10), date(2025, 3, 10), date(2025, 4, 10)]
+        assert [t["date"] for t in by_date[date(2025, 3, 10)][0]["treatments"]] == ["2025-03-10"]
+        assert by_date[date(2025, 3, 10)][0]["users"] == ["tutor1"]
@@ -0,0 +1,113 @@
+"""Testes para o agendador em processo (expressões cron e execução das tarefas)."""
+
+import asyncio
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock
+
+from app.services.scheduler import CronSchedule, Scheduler, ScheduledJob, advisory_lock_key
+
+
+class TestCronSchedule:
+    """Testes das expressões cron do agendador"""
+    
+    def test_daily_time(self):
+        schedule = CronSchedule("0 8 * * *")
+        assert schedule.next_after(datetime(2026, 10, 19, 7, 59, 30)) == datetime(2026, 10, 19, 8, 0)
+        assert schedule.next_after(datetime(2026, 10, 19, 8, 0)) == datetime(2026, 10, 20, 8, 0)
+    
+    def test_first_day_of_month(self):
+        schedule = CronSchedule("0 9 1 * *")
+        assert schedule.next_after(datetime(2026, 12, 15, 10, 0)) == datetime(2027, 1, 1, 9, 0)
+    
+    def test_steps_lists_and_ranges(self):
+        schedule = CronSchedule("*/15 9-17 * * 1-5")
+        # Sábado: pula para segunda-feira
+        assert schedule.next_after(datetime(2026, 10, 17, 12, 0)) == datetime(2026, 10, 19, 9, 0)
+        assert schedule.next_after(datetime(2026, 10, 19, 9, 0)) == datetime(2026, 10, 19, 9, 15)
+        assert CronSchedule("0 0 * * 7").weekdays == {0}
+        assert CronSchedule("5,35 * * * *").minutes == {5, 35}
+    
+    def test_day_of_month_or_weekday(self):
+        # Com os dois campos restritos, basta um deles (regra do cron)
+        schedule = CronSchedule("0 0 13 * 5")
+        assert schedule.next_after(datetime(2026, 10, 19, 0, 0)) == datetime(2026, 10, 23, 0, 0)
+    
+    @pytest.mark.parametrize("expression", ["0 8 * *", "60 * * * *", "0 8 * * 8", "*/0 * * * *", "0 8 31 2 *"])
+    def test_invalid_expressions(self, expression):
+        with pytest.raises(ValueError):
+            CronSchedule(expression).next_after(datetime(2026, 10, 19))
+
+
+class TestScheduler:
+    """Testes da execução das tarefas agendadas"""
+    
+    @pytest.mark.asyncio
+    async def test_run_job_records_metrics(self):
+        run = AsyncMock()
+        scheduler = Scheduler([ScheduledJob("daily_notifications", "0 8 * * *", run)])
+        
+        assert await scheduler.run_job(scheduler.jobs[0]) is True
+        run.assert_awaited_once()
+        metrics = scheduler.metrics()["jobs"]["daily_notifications"]
+        assert metrics["runs"] == 1
+        assert metrics["last_run"]["status"] == "success"
+    
+    @pytest.mark.asyncio
+    async def test_failing_job_is_recorded(self):
+        run = AsyncMock(side_effect=RuntimeError("SMTP fora do ar"))
+        scheduler = Scheduler([ScheduledJob("monthly_reports", "0 9 1 * *", run)])
+        
+        await scheduler.run_job(scheduler.jobs[0])
+        metrics = scheduler.metrics()["jobs"]["monthly_reports"]
+        assert metrics["failures"] == 1
+        assert "SMTP fora do ar" in metrics["last_run"]["status"]
+    
+    @pytest.mark.asyncio
+    async def test_skips_when_another_instance_holds_lock(self):
+        run = AsyncMock()
+        scheduler = Scheduler([ScheduledJob("daily_notifications", "0 8 * * *", run)])
+        
+        class _Busy:
+            async def __aenter__(self):
+                return False
+            
+            async def __aexit__(self, *exc_info):
+                return False
+        
+        scheduler._job_lock = lambda job: _Busy()
+        assert await scheduler.run_job(scheduler.jobs[0]) is False
+        run.assert_not_awaited()
+        assert scheduler.metrics()["jobs"]["daily_notifications"]["skipped_locked"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_does_not_overlap_running_job(self):
+        release = asyncio.Event()
+        
+        async def slow_job():
+            await release.wait()
+        
+        scheduler = Scheduler([ScheduledJob("upload_janitor", "* * * * *", slow_job)])
+        job = scheduler.jobs[0]
+        scheduler._dispatch(job)
+        scheduler._dispatch(job)
+        assert scheduler.metrics()["jobs"]["upload_janitor"]["skipped_running"] == 1
+        
+        release.set()
+        await scheduler._running["upload_janitor"]
+        await scheduler.stop()
+    
+    @pytest.mark.asyncio
+    async def test_start_and_stop(self):
+        scheduler = Scheduler([ScheduledJob("daily_notifications", "0 8 * * *", AsyncMock())])
+        scheduler.start()
+        assert scheduler.metrics()["enabled"] is True
+        assert scheduler.metrics()["jobs"]["daily_notifications"]["next_run"] is not None
+        await scheduler.stop()
+        assert scheduler.metrics()["enabled"] is False
+    
+    def test_lock_key_is_stable_bigint(self):
+        key = advisory_lock_key("daily_notifications")
+        assert key == advisory_lock_key("daily_notifications")
+        assert key != advisory_lock_key("monthly_reports")
+        assert -2**63 <= key < 2**63
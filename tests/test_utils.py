@@ -158,41 +158,6 @@ class TestPetNameGeneration:
 class TestFileUtilities:
     """Testes para utilitários de arquivo."""
 
-    def test_cleanup_temp_images(self, temp_upload_dir):
-        """Testa limpeza de imagens temporárias."""
-        from app.services.file_service import FileService
-        import time
-        
-        # Cria diretório temp
-        temp_dir = temp_upload_dir / "temp"
-        temp_dir.mkdir(exist_ok=True)
-        
-        # Cria arquivo recente
-        recent_file = temp_dir / "recent.jpg"
-        recent_file.touch()
-        
-        # Cria arquivo antigo (simula modificando timestamp)
-        old_file = temp_dir / "old.jpg"
-        old_file.touch()
-        
-        # Modifica timestamp do arquivo antigo para mais de 1 hora atrás
-        old_timestamp = time.time() - 7200  # 2 horas atrás
-        import os
-        os.utime(old_file, (old_timestamp, old_timestamp))
-        
-        FileService.cleanup_temp_images()
-        
-        # Arquivo recente deve existir, antigo deve ter sido removido
-        assert recent_file.exists()
-        assert not old_file.exists()
-
-    def test_cleanup_temp_images_no_temp_dir(self, temp_upload_dir):
-        """Testa limpeza quando diretório temp não existe."""
-        from app.services.file_service import FileService
-        
-        # Não deve dar erro mesmo sem diretório temp
-        FileService.cleanup_temp_images()  # Não deve lançar exceção
-
     def test_allowed_extensions_configuration(self):
         """Testa configuração de extensões permitidas."""
         from app.services.file_service import ALLOWED_EXTENSIONS, BASE_EXTENSIONS